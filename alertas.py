@@ -0,0 +1,166 @@
+"""Alerta temprana: detección incremental de estudiantes en riesgo por bimestre"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+BIMESTRES = ["Bim1", "Bim2", "Bim3", "Bim4"]
+NOTA_MAXIMA = 20
+
+REGLAS = {
+    "Irrecuperable": "No alcanza el mínimo aunque obtenga 20 en lo que resta",
+    "Proyeccion": "Promedio final proyectado bajo el mínimo",
+    "Inasistencia": "Asistencia bajo el mínimo requerido",
+    "Tendencia": "Notas en descenso entre bimestres"
+}
+
+# Peso de cada regla en el puntaje de riesgo
+PESOS = {"Irrecuperable": 3.0, "Proyeccion": 2.0, "Inasistencia": 1.5, "Tendencia": 1.0}
+
+
+def huella_columna(valores):
+    """
+    Hash del contenido de una columna, sensible al orden de las filas.
+
+    Los acumulados del motor son posicionales: reordenar la nómina o
+    intercambiar notas entre estudiantes debe cambiar la huella.
+    """
+    hashes = pd.util.hash_pandas_object(pd.Series(valores), index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+class MotorAlertas:
+    """
+    Mantiene estadísticas acumuladas por estudiante y las actualiza bimestre a bimestre.
+
+    Por cada bimestre cargado solo se suman sus notas a los acumulados
+    (suma, cantidad y términos de la regresión lineal de la tendencia), sin
+    volver a recorrer los bimestres anteriores. Los umbrales se aplican al
+    evaluar, así que mover los sliders no reconstruye el estado.
+    """
+
+    def __init__(self, dni):
+        self.huella_dni = huella_columna(np.asarray(dni))
+        self.clave = None  # identificador de la nómina con la que se actualizó por última vez
+        n = len(dni)
+        self.huellas = {}  # bimestre -> huella de sus notas
+        self.k = np.zeros(n)
+        self.suma = np.zeros(n)
+        self.suma_t = np.zeros(n)
+        self.suma_t2 = np.zeros(n)
+        self.suma_tx = np.zeros(n)
+
+    def agregar_bimestre(self, bimestre, notas, huella=None):
+        """Incorpora las notas de un bimestre nuevo a los acumulados"""
+        t = BIMESTRES.index(bimestre) + 1
+        notas = np.asarray(notas, dtype=float)
+        presente = ~np.isnan(notas)
+        x = np.where(presente, notas, 0.0)
+        self.k += presente
+        self.suma += x
+        self.suma_t += presente * t
+        self.suma_t2 += presente * t * t
+        self.suma_tx += x * t
+        self.huellas[bimestre] = huella_columna(notas) if huella is None else huella
+
+    def pendientes(self):
+        """Números de los bimestres que aún no se han cargado"""
+        return [i + 1 for i, b in enumerate(BIMESTRES) if b not in self.huellas]
+
+    def evaluar(self, nota_minima, asistencia, asistencia_minima, caida_minima=1.0):
+        """
+        Aplica las reglas de alerta a toda la nómina en una sola pasada vectorizada.
+
+        Devuelve un DataFrame alineado con la nómina con el promedio actual, la
+        pendiente (puntos por bimestre), el promedio proyectado, una columna
+        booleana por regla y el puntaje de riesgo.
+        """
+        nota_minima = np.broadcast_to(np.asarray(nota_minima, dtype=float), self.k.shape)
+        asistencia = np.asarray(asistencia, dtype=float)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            promedio = self.suma / self.k
+            denominador = self.k * self.suma_t2 - self.suma_t ** 2
+            pendiente = np.where(
+                self.k >= 2,
+                (self.k * self.suma_tx - self.suma_t * self.suma) / denominador,
+                0.0
+            )
+            t_medio = self.suma_t / self.k
+
+        # Proyección: los bimestres pendientes siguen la recta de tendencia del estudiante
+        pendientes = self.pendientes()
+        total_bimestres = self.k + len(pendientes)
+        suma_proyectada = self.suma.copy()
+        for t in pendientes:
+            suma_proyectada += np.clip(promedio + pendiente * (t - t_medio), 0, NOTA_MAXIMA)
+        proyectado = suma_proyectada / total_bimestres
+
+        # Nota promedio necesaria en lo que resta para llegar al mínimo
+        restantes = total_bimestres - self.k
+        with np.errstate(invalid="ignore", divide="ignore"):
+            necesaria = np.where(restantes > 0, (nota_minima * total_bimestres - self.suma) / restantes, np.nan)
+
+        alertas = pd.DataFrame({
+            "Promedio_Actual": np.round(promedio, 1),
+            "Pendiente": np.round(pendiente, 2),
+            "Proyectado": np.round(proyectado, 1),
+            "Nota_Necesaria": np.round(necesaria, 1),
+            "Irrecuperable": necesaria > NOTA_MAXIMA,
+            "Proyeccion": proyectado < nota_minima,
+            "Inasistencia": np.nan_to_num(asistencia, nan=0.0) < asistencia_minima,
+            "Tendencia": pendiente <= -caida_minima
+        })
+
+        puntaje = sum(alertas[regla] * peso for regla, peso in PESOS.items())
+        # Entre estudiantes con las mismas alertas, pesa más la distancia al mínimo
+        alertas["Puntaje"] = np.round(puntaje + np.clip(nota_minima - proyectado, 0, None) / NOTA_MAXIMA, 2)
+        return alertas
+
+
+def actualizar_motor(motor, df, clave=None):
+    """
+    Devuelve un motor al día con los bimestres cargados en la nómina.
+
+    `clave` identifica el contenido de la nómina (la clave del registro
+    compartido): si es la misma de la última actualización, el motor se
+    devuelve sin volver a calcular las huellas. Si el motor corresponde a la
+    misma nómina (mismos DNI en el mismo orden) y los bimestres ya procesados
+    no cambiaron, solo se agregan los nuevos; en cualquier otro caso se
+    reconstruye desde cero.
+    """
+    if motor is not None and clave is not None and motor.clave == clave:
+        return motor
+    cargados = [b for b in BIMESTRES if b in df.columns and df[b].notna().any()]
+    huellas = {b: huella_columna(df[b].to_numpy(dtype=float)) for b in cargados}
+
+    if (motor is None
+            or motor.huella_dni != huella_columna(df["DNI"].to_numpy())
+            or any(huellas.get(b) != h for b, h in motor.huellas.items())):
+        motor = MotorAlertas(df["DNI"].to_numpy())
+
+    for bimestre in cargados:
+        if bimestre not in motor.huellas:
+            motor.agregar_bimestre(bimestre, df[bimestre].to_numpy(dtype=float), huellas[bimestre])
+    motor.clave = clave
+    return motor
+
+
+def ranking_riesgo(df, alertas, solo_alertas=True):
+    """Lista de estudiantes ordenada por puntaje de riesgo, con las alertas en texto"""
+    columnas = [c for c in ["Estudiante", "DNI", "Grado", "Seccion", "Asistencia"] if c in df.columns]
+    ranking = pd.concat([df[columnas].reset_index(drop=True), alertas.reset_index(drop=True)], axis=1)
+    activas = ranking[list(REGLAS)].to_numpy()
+    if solo_alertas:
+        filtro = activas.any(axis=1)
+        ranking, activas = ranking[filtro], activas[filtro]
+    # Cada combinación de reglas se codifica como bits para armar el texto sin recorrer fila por fila
+    nombres = list(REGLAS)
+    etiquetas = np.array([
+        ", ".join(n for i, n in enumerate(nombres) if codigo >> i & 1)
+        for codigo in range(2 ** len(nombres))
+    ], dtype=object)
+    codigos = activas.astype(np.int64) @ (1 << np.arange(len(nombres)))
+    ranking = ranking.assign(Alertas=etiquetas[codigos])
+    return ranking.sort_values("Puntaje", ascending=False, kind="stable").reset_index(drop=True)
+
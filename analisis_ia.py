@@ -0,0 +1,515 @@
+"""Análisis pedagógico con la API de Claude (directo o por lotes con Message Batches)"""
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import requests
+
+from trabajos import EnEspera
+
+# ANTHROPIC_BASE_URL permite apuntar a la API simulada local (api_simulada.py)
+API_BASE = os.environ.get("ANTHROPIC_BASE_URL", "https://api.anthropic.com").rstrip("/")
+API_URL = f"{API_BASE}/v1/messages"
+BATCHES_URL = f"{API_BASE}/v1/messages/batches"
+MODELO = "claude-3-haiku-20240307"
+MAX_TOKENS = 2000
+
+# La API admite hasta 100 000 solicitudes por lote; lotes más chicos terminan antes
+MAX_SOLICITUDES_LOTE = 10_000
+
+
+class ErrorAPIClaude(Exception):
+    """La API respondió con un código distinto de 200"""
+
+    def __init__(self, codigo):
+        super().__init__(f"Error al conectar con la API de Claude. Código: {codigo}")
+        self.codigo = codigo
+
+
+def construir_prompt(datos):
+    """Arma el prompt de análisis pedagógico a partir de la fila de un estudiante"""
+    return f"""
+    Eres un especialista pedagógico del Ministerio de Educación del Perú.
+    Analiza el rendimiento del siguiente estudiante y propone recomendaciones concretas.
+
+    Estudiante: {datos['Estudiante']}
+    Grado: {datos['Grado']}
+    Notas bimestrales (0-20): Bim1={datos['Bim1']}, Bim2={datos['Bim2']}, Bim3={datos['Bim3']}, Bim4={datos['Bim4']}
+    Promedio: {datos['Promedio']:.1f} | Escala: {datos['Letra']}
+    Asistencia: {datos['Asistencia']}% | Estado: {datos['Estado']}
+    Conducta: {datos.get('Conducta', 'No registrada')}
+
+    Responde en español con: 1) diagnóstico breve, 2) fortalezas, 3) áreas de mejora
+    y 4) tres estrategias de apoyo para el docente y la familia.
+    """
+
+
+def cabeceras(api_key):
+    """Cabeceras HTTP de la API de Anthropic"""
+    return {
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+        "content-type": "application/json"
+    }
+
+
+def parametros_mensaje(prompt):
+    """Cuerpo de una solicitud a /v1/messages (el mismo que va dentro de cada elemento de un lote)"""
+    return {
+        "model": MODELO,
+        "max_tokens": MAX_TOKENS,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+
+
+def huella_prompt(prompt):
+    """Identifica un análisis por modelo y prompt: si cambian las notas, cambia la huella"""
+    return hashlib.sha1(f"{MODELO}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def solicitar_analisis(api_key, prompt, timeout=30):
+    """Envía un prompt a Claude y devuelve el texto de la respuesta"""
+    response = requests.post(API_URL, headers=cabeceras(api_key), json=parametros_mensaje(prompt), timeout=timeout)
+    if response.status_code != 200:
+        raise ErrorAPIClaude(response.status_code)
+    return response.json()["content"][0]["text"]
+
+
+def trabajo_analisis_lote(progreso, api_key, df, almacen=None):
+    """Analiza a cada estudiante del DataFrame y devuelve un informe en Markdown para la cola de trabajos"""
+    secciones = []
+    for n, (_, datos) in enumerate(df.iterrows(), 1):
+        prompt = construir_prompt(datos)
+        try:
+            analisis = solicitar_analisis(api_key, prompt)
+            if almacen is not None:
+                almacen.guardar([(str(datos["DNI"]), huella_prompt(prompt), datos["Estudiante"], analisis, "directo")])
+        except Exception as e:
+            analisis = f"_No se pudo generar el análisis: {e}_"
+        secciones.append(f"## {datos['Estudiante']} ({datos['Grado']})\n\n{analisis}\n")
+        progreso(n / len(df), f"{n}/{len(df)} estudiantes")
+
+    informe = "# Análisis Pedagógico con IA\n\n" + "\n".join(secciones)
+    nombre = f"analisis_ia_{datetime.datetime.now().strftime('%Y%m%d')}.md"
+    return informe.encode("utf-8"), nombre, "text/markdown"
+
+
+# --- Almacén persistente de análisis ---
+_ESQUEMA_ANALISIS = """
+CREATE TABLE IF NOT EXISTS analisis (
+    dni TEXT NOT NULL,
+    huella TEXT NOT NULL,
+    estudiante TEXT,
+    texto TEXT NOT NULL,
+    origen TEXT,
+    creado REAL NOT NULL,
+    PRIMARY KEY (dni, huella)
+)
+"""
+
+
+# Un envío agrupa los lotes de una misma solicitud de análisis (un trabajo de la cola)
+_ESQUEMA_ENVIOS = """
+CREATE TABLE IF NOT EXISTS envios (
+    id TEXT PRIMARY KEY,
+    clave TEXT NOT NULL,
+    estudiantes TEXT NOT NULL,
+    reutilizados INTEGER NOT NULL,
+    generados INTEGER NOT NULL DEFAULT 0,
+    fallidos INTEGER NOT NULL DEFAULT 0,
+    estado TEXT NOT NULL,
+    creado REAL NOT NULL
+)
+"""
+
+_ESQUEMA_LOTES = """
+CREATE TABLE IF NOT EXISTS lotes (
+    id TEXT PRIMARY KEY,
+    envio TEXT NOT NULL,
+    solicitudes TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    leido INTEGER NOT NULL DEFAULT 0,
+    creado REAL NOT NULL
+)
+"""
+
+
+class AlmacenAnalisis:
+    """
+    Guarda en SQLite los análisis generados, por DNI y huella del prompt.
+
+    Un análisis se reutiliza mientras los datos del estudiante no cambien,
+    tanto en la pestaña individual como en los lotes posteriores. También
+    guarda los lotes de Message Batches en curso (id del lote y a qué
+    estudiante corresponde cada solicitud) para retomarlos tras un reinicio.
+    """
+
+    def __init__(self, ruta_db="analisis.db"):
+        self.ruta_db = ruta_db
+        with self._conexion() as con:
+            con.execute(_ESQUEMA_ANALISIS)
+            con.execute(_ESQUEMA_ENVIOS)
+            con.execute(_ESQUEMA_LOTES)
+
+    @contextmanager
+    def _conexion(self):
+        con = sqlite3.connect(self.ruta_db, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def guardar(self, filas):
+        """Inserta o reemplaza análisis: filas (dni, huella, estudiante, texto, origen)"""
+        ahora = time.time()
+        with self._conexion() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO analisis (dni, huella, estudiante, texto, origen, creado) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*fila, ahora) for fila in filas]
+            )
+
+    def buscar(self, pares):
+        """Textos guardados para los pares (dni, huella) indicados: {(dni, huella): texto}"""
+        encontrados = {}
+        pares = list(pares)
+        with self._conexion() as con:
+            # SQLite limita la cantidad de parámetros por consulta
+            for i in range(0, len(pares), 400):
+                bloque = pares[i:i + 400]
+                condicion = " OR ".join(["(dni = ? AND huella = ?)"] * len(bloque))
+                for dni, huella, texto in con.execute(
+                    f"SELECT dni, huella, texto FROM analisis WHERE {condicion}",
+                    [valor for par in bloque for valor in par]
+                ):
+                    encontrados[(dni, huella)] = texto
+        return encontrados
+
+    def registrar_envio(self, envio_id, clave, estudiantes, reutilizados):
+        """
+        Registra un envío por lotes: clave es la huella de la API Key y estudiantes [(dni, nombre, grado, huella)].
+
+        El envío queda "enviando" (el seguidor no lo consulta) hasta que
+        `cerrar_envio` lo pasa a "en_curso" con todos sus lotes creados.
+        """
+        with self._conexion() as con:
+            con.execute(
+                "INSERT INTO envios (id, clave, estudiantes, reutilizados, estado, creado) VALUES (?, ?, ?, ?, 'enviando', ?)",
+                (envio_id, clave, json.dumps(estudiantes, ensure_ascii=False), reutilizados, time.time())
+            )
+
+    def registrar_lote(self, lote_id, envio_id, solicitudes):
+        """Guarda un lote recién creado en la API con su mapa {custom_id: [dni, nombre, huella]}"""
+        with self._conexion() as con:
+            con.execute(
+                "INSERT INTO lotes (id, envio, solicitudes, total, creado) VALUES (?, ?, ?, ?, ?)",
+                (lote_id, envio_id, json.dumps(solicitudes, ensure_ascii=False), len(solicitudes), time.time())
+            )
+
+    def envios_en_curso(self):
+        """Envíos cuyos lotes aún no se terminaron de leer"""
+        with self._conexion() as con:
+            filas = con.execute(
+                "SELECT id, clave, estudiantes, reutilizados, generados, fallidos FROM envios "
+                "WHERE estado = 'en_curso' ORDER BY creado"
+            ).fetchall()
+        columnas = ["id", "clave", "estudiantes", "reutilizados", "generados", "fallidos"]
+        return [dict(zip(columnas, fila), estudiantes=json.loads(fila[2])) for fila in filas]
+
+    def lotes_sin_leer(self, envio_id):
+        """Lotes de un envío cuyos resultados aún no se guardaron: [(lote_id, solicitudes)]"""
+        with self._conexion() as con:
+            filas = con.execute(
+                "SELECT id, solicitudes FROM lotes WHERE envio = ? AND leido = 0 ORDER BY creado", (envio_id,)
+            ).fetchall()
+        return [(lote_id, json.loads(solicitudes)) for lote_id, solicitudes in filas]
+
+    def marcar_leido(self, lote_id, envio_id, generados, fallidos):
+        """Marca un lote como leído y suma sus resultados al envío (en una sola transacción)"""
+        with self._conexion() as con:
+            con.execute("UPDATE lotes SET leido = 1 WHERE id = ?", (lote_id,))
+            con.execute(
+                "UPDATE envios SET generados = generados + ?, fallidos = fallidos + ? WHERE id = ?",
+                (generados, fallidos, envio_id)
+            )
+
+    def cerrar_envio(self, envio_id, estado="terminado"):
+        """Cambia el estado de un envío ("en_curso", "terminado" o "error")"""
+        with self._conexion() as con:
+            con.execute("UPDATE envios SET estado = ? WHERE id = ?", (estado, envio_id))
+
+    def resultado_envio(self, envio_id):
+        """(generados, fallidos) de un envío"""
+        with self._conexion() as con:
+            return con.execute("SELECT generados, fallidos FROM envios WHERE id = ?", (envio_id,)).fetchone()
+
+
+# --- Message Batches ---
+def crear_lote(api_key, solicitudes, timeout=60):
+    """Envía un lote de solicitudes [(custom_id, prompt)] y devuelve el lote creado"""
+    cuerpo = {"requests": [{"custom_id": cid, "params": parametros_mensaje(prompt)} for cid, prompt in solicitudes]}
+    response = requests.post(BATCHES_URL, headers=cabeceras(api_key), json=cuerpo, timeout=timeout)
+    if response.status_code != 200:
+        raise ErrorAPIClaude(response.status_code)
+    return response.json()
+
+
+def consultar_lote(api_key, lote_id, timeout=30):
+    """Estado actual de un lote (processing_status, request_counts, results_url)"""
+    response = requests.get(f"{BATCHES_URL}/{lote_id}", headers=cabeceras(api_key), timeout=timeout)
+    if response.status_code != 200:
+        raise ErrorAPIClaude(response.status_code)
+    return response.json()
+
+
+def leer_resultados(api_key, results_url, timeout=60):
+    """
+    Recorre los resultados de un lote terminado sin descargarlos completos.
+
+    El archivo es JSONL (una línea por solicitud, en cualquier orden); por
+    cada línea devuelve (custom_id, texto) o (custom_id, None) si falló.
+    """
+    with requests.get(results_url, headers=cabeceras(api_key), stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise ErrorAPIClaude(response.status_code)
+        for linea in response.iter_lines():
+            if not linea:
+                continue
+            resultado = json.loads(linea)
+            if resultado["result"]["type"] == "succeeded":
+                yield resultado["custom_id"], resultado["result"]["message"]["content"][0]["text"]
+            else:
+                yield resultado["custom_id"], None
+
+
+def error_transitorio(error):
+    """Si conviene reintentar tras un error de la API: límite de uso, sobrecarga o falla del servidor"""
+    return error.codigo in (408, 409, 429) or error.codigo >= 500
+
+
+def huella_clave(api_key):
+    """Identifica una API Key sin guardarla"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def informe_por_lotes(almacen, estudiantes, generados, fallidos, reutilizados):
+    """
+    Informe en Markdown de un envío por lotes, armado desde el almacén.
+
+    `estudiantes` es la lista [(dni, nombre, grado, huella)] del envío, así
+    que incluye también los análisis reutilizados.
+    """
+    guardados = almacen.buscar((dni, huella) for dni, _, _, huella in estudiantes)
+    secciones = [
+        f"## {nombre} ({grado})\n\n{guardados.get((dni, huella), '_No se pudo generar el análisis en el lote_')}\n"
+        for dni, nombre, grado, huella in estudiantes
+    ]
+    informe = (
+        "# Análisis Pedagógico con IA\n\n"
+        f"_{generados} generados por lotes, {reutilizados} reutilizados, {fallidos} con error_\n\n"
+        + "\n".join(secciones)
+    )
+    nombre = f"analisis_ia_{datetime.datetime.now().strftime('%Y%m%d')}.md"
+    return informe.encode("utf-8"), nombre, "text/markdown"
+
+
+class SeguidorLotes:
+    """
+    Hilo dedicado que sigue los lotes de Message Batches hasta guardar sus resultados.
+
+    Enviar un lote es rápido, pero la API puede tardar horas en procesarlo:
+    en lugar de ocupar un trabajador de la cola mientras tanto, los lotes se
+    registran en el almacén y este hilo los consulta cada `intervalo`
+    segundos. Como los lotes quedan en SQLite, tras un reinicio se retoman.
+    La API Key no se guarda: se recuerda en memoria por su huella, y un envío
+    retomado espera a que alguna sesión vuelva a ingresar la misma clave. Al
+    terminar un envío su informe se entrega al trabajo de la cola con el
+    mismo identificador (si hay cola).
+    """
+
+    def __init__(self, almacen, cola=None, intervalo=30, iniciar=True, avisar=None):
+        self.almacen = almacen
+        self.cola = cola
+        self.intervalo = intervalo
+        # avisar(envio_id, fraccion, mensaje): por defecto actualiza el trabajo de la cola
+        self.avisar = avisar or (cola.avanzar if cola is not None else (lambda envio_id, fraccion, mensaje: None))
+        self._claves = {}  # huella de la API Key -> API Key
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        if iniciar:
+            threading.Thread(target=self._bucle, name="seguidor-lotes", daemon=True).start()
+
+    def recordar_clave(self, api_key):
+        """Guarda en memoria la API Key con la que se retoman los envíos hechos con ella"""
+        if api_key:
+            with self._lock:
+                self._claves[huella_clave(api_key)] = api_key
+
+    def enviar(self, api_key, estudiantes, envio_id, progreso=None):
+        """
+        Envía a la API los análisis que faltan en el almacén y registra los lotes.
+
+        `estudiantes` es una lista de (dni, nombre, grado, prompt); los que ya
+        tienen un análisis con la misma huella no se vuelven a enviar.
+        Devuelve (lotes enviados, reutilizados); con 0 lotes no queda nada en curso.
+        """
+        progreso = progreso or (lambda fraccion, mensaje=None: None)
+        huellas = [(dni, huella_prompt(prompt)) for dni, _, _, prompt in estudiantes]
+        guardados = self.almacen.buscar(huellas)
+        pendientes = [(e, h) for e, h in zip(estudiantes, huellas) if h not in guardados]
+        reutilizados = len(estudiantes) - len(pendientes)
+        if not pendientes:
+            return 0, reutilizados
+
+        self.recordar_clave(api_key)
+        self.almacen.registrar_envio(
+            envio_id, huella_clave(api_key),
+            [(dni, nombre, grado, huella) for (dni, nombre, grado, _), (_, huella) in zip(estudiantes, huellas)],
+            reutilizados
+        )
+        # El custom_id solo admite letras, números, - y _: se usa la posición en la lista
+        solicitudes = [(f"e{i}", dni, nombre, huella, prompt) for i, ((dni, nombre, _, prompt), (_, huella)) in enumerate(pendientes)]
+        lotes = 0
+        try:
+            for i in range(0, len(solicitudes), MAX_SOLICITUDES_LOTE):
+                bloque = solicitudes[i:i + MAX_SOLICITUDES_LOTE]
+                lote = crear_lote(api_key, [(cid, prompt) for cid, _, _, _, prompt in bloque])
+                # Se registra apenas existe en la API: un lote ya pagado no debe perderse
+                self.almacen.registrar_lote(lote["id"], envio_id, {cid: [dni, nombre, huella] for cid, dni, nombre, huella, _ in bloque})
+                lotes += 1
+                progreso(0.05 * (i + len(bloque)) / len(solicitudes), f"{lotes} lote(s) enviados")
+        except Exception:
+            # El trabajo de la cola falla con esta excepción: el envío no debe quedar para el seguidor
+            self.almacen.cerrar_envio(envio_id, "error")
+            raise
+        self.almacen.cerrar_envio(envio_id, "en_curso")
+        self._despertar.set()
+        return lotes, reutilizados
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.revisar()
+            except (requests.RequestException, sqlite3.OperationalError):
+                # La red o la base (bloqueada) fallaron antes de llegar a un envío: se reintenta en la próxima vuelta
+                pass
+
+    def revisar(self):
+        """Una pasada por los envíos en curso; devuelve cuántos siguen en curso"""
+        en_curso = 0
+        for envio in self.almacen.envios_en_curso():
+            with self._lock:
+                api_key = self._claves.get(envio["clave"])
+            if api_key is None:
+                self.avisar(envio["id"], 0.05, "En espera: ingrese la misma API Key para retomar el lote")
+                en_curso += 1
+                continue
+            try:
+                en_curso += not self._revisar_envio(envio, api_key)
+            except (requests.RequestException, sqlite3.OperationalError):
+                en_curso += 1
+            except ErrorAPIClaude as e:
+                if error_transitorio(e):
+                    en_curso += 1
+                else:
+                    # La clave ya no es válida o el lote no existe: no tiene sentido reintentar
+                    self._fallar(envio["id"], str(e))
+            except Exception as e:
+                # Un resultado que no corresponde al envío (custom_id desconocido, línea corrupta) no se arregla reintentando
+                self._fallar(envio["id"], f"Error al leer los resultados del lote: {type(e).__name__}: {e}")
+        return en_curso
+
+    def _fallar(self, envio_id, error):
+        self.almacen.cerrar_envio(envio_id, "error")
+        if self.cola is not None:
+            self.cola.fallar(envio_id, error)
+
+    def _revisar_envio(self, envio, api_key):
+        """Consulta y lee los lotes de un envío; devuelve True si el envío terminó"""
+        pendientes = self.almacen.lotes_sin_leer(envio["id"])
+        total = sum(len(solicitudes) for _, solicitudes in pendientes)
+        procesando = sin_terminar = 0
+        generados, fallidos = envio["generados"], envio["fallidos"]
+        for lote_id, solicitudes in pendientes:
+            estado = consultar_lote(api_key, lote_id)
+            if estado["processing_status"] != "ended":
+                procesando += estado["request_counts"]["processing"]
+                sin_terminar += 1
+                continue
+            filas, errores = [], 0
+            for custom_id, texto in leer_resultados(api_key, estado["results_url"]):
+                if texto is None:
+                    errores += 1
+                    continue
+                dni, nombre, huella = solicitudes[custom_id]
+                filas.append((dni, huella, nombre, texto, f"lote:{lote_id}"))
+                if len(filas) >= 500:
+                    self.almacen.guardar(filas)
+                    filas = []
+            self.almacen.guardar(filas)
+            self.almacen.marcar_leido(lote_id, envio["id"], len(solicitudes) - errores, errores)
+            generados, fallidos = generados + len(solicitudes) - errores, fallidos + errores
+
+        if sin_terminar:
+            self.avisar(envio["id"], 0.05 + 0.9 * (1 - procesando / max(total, 1)), f"Procesando en la API: {procesando} pendientes")
+            return False
+
+        if self.cola is not None:
+            self.cola.completar(envio["id"], *informe_por_lotes(
+                self.almacen, envio["estudiantes"], generados, fallidos, envio["reutilizados"]
+            ))
+        self.almacen.cerrar_envio(envio["id"])
+        return True
+
+
+def analizar_por_lotes(api_key, estudiantes, almacen, progreso=None, intervalo=30):
+    """
+    Genera los análisis que faltan en el almacén y espera los resultados (uso desde la consola).
+
+    `estudiantes` es una lista de (dni, nombre, prompt). En la aplicación el
+    seguimiento lo hace el hilo de `SeguidorLotes`; aquí se consulta en el
+    mismo hilo hasta que termina. Devuelve (generados, fallidos, reutilizados).
+    """
+    progreso = progreso or (lambda fraccion, mensaje=None: None)
+    seguidor = SeguidorLotes(
+        almacen, intervalo=intervalo, iniciar=False,
+        avisar=lambda envio_id, fraccion, mensaje: progreso(fraccion, mensaje)
+    )
+    envio_id = uuid.uuid4().hex
+    lotes, reutilizados = seguidor.enviar(api_key, [(dni, nombre, "", prompt) for dni, nombre, prompt in estudiantes], envio_id, progreso)
+    if not lotes:
+        return 0, 0, reutilizados
+    progreso(0.05, f"{lotes} lote(s) enviados con {len(estudiantes) - reutilizados} solicitudes")
+    while seguidor.revisar():
+        time.sleep(intervalo)
+    generados, fallidos = almacen.resultado_envio(envio_id)
+    return generados, fallidos, reutilizados
+
+
+def trabajo_analisis_batches(progreso, api_key, df, seguidor):
+    """
+    Versión por lotes de `trabajo_analisis_lote` para la cola de trabajos.
+
+    Solo envía los lotes: el trabajo queda en espera sin ocupar un hilo de la
+    cola y `seguidor` le entrega el informe cuando la API termina. Si todos
+    los análisis ya estaban guardados, el informe se arma de inmediato.
+    """
+    estudiantes = [
+        (str(datos["DNI"]), datos["Estudiante"], datos["Grado"], construir_prompt(datos))
+        for _, datos in df.iterrows()
+    ]
+    lotes, reutilizados = seguidor.enviar(api_key, estudiantes, progreso.trabajo_id, progreso)
+    if lotes:
+        return EnEspera(f"{lotes} lote(s) enviados con {len(estudiantes) - reutilizados} solicitudes", 0.05)
+    return informe_por_lotes(
+        seguidor.almacen, [(dni, nombre, grado, huella_prompt(prompt)) for dni, nombre, grado, prompt in estudiantes],
+        0, 0, reutilizados
+    )
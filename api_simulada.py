@@ -0,0 +1,181 @@
+"""
+API simulada de Claude (Messages y Message Batches) para desarrollo y pruebas sin costo.
+
+Uso:
+    python api_simulada.py --puerto 8503 --demora 10
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8503 streamlit run gestion_escolar.py
+    python -m pytest tests/test_analisis_ia.py
+
+Endpoints:
+    POST /v1/messages                      respuesta inmediata
+    POST /v1/messages/batches              crea un lote (termina tras `--demora` segundos)
+    GET  /v1/messages/batches/{id}         estado y conteos del lote
+    GET  /v1/messages/batches/{id}/results resultados en JSONL
+"""
+import argparse
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RUTA_LOTE = re.compile(r"^/v1/messages/batches/([\w-]+)(/results)?$")
+
+
+def respuesta_simulada(params):
+    """Mensaje con el mismo formato que /v1/messages y un texto derivado del prompt"""
+    prompt = params["messages"][-1]["content"]
+    estudiante = re.search(r"Estudiante: (.+)", prompt)
+    estudiante = estudiante.group(1).strip() if estudiante else "el estudiante"
+    texto = (
+        f"1) Diagnóstico: análisis simulado para {estudiante}.\n"
+        "2) Fortalezas: participación y constancia.\n"
+        "3) Áreas de mejora: hábitos de estudio.\n"
+        "4) Estrategias: tutoría semanal, metas por bimestre y comunicación con la familia."
+    )
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model"),
+        "content": [{"type": "text", "text": texto}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(texto) // 4}
+    }
+
+
+class LotesSimulados:
+    """Lotes en memoria: cada uno pasa de in_progress a ended al cumplirse la demora"""
+
+    def __init__(self, demora=5.0, tasa_error=0.0):
+        self.demora = demora
+        self.tasa_error = tasa_error
+        self._lock = threading.Lock()
+        self._lotes = {}
+
+    def crear(self, solicitudes):
+        lote_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self._lotes[lote_id] = {"creado": time.time(), "solicitudes": solicitudes}
+        return lote_id
+
+    def estado(self, lote_id, base_url):
+        with self._lock:
+            lote = self._lotes.get(lote_id)
+        if lote is None:
+            return None
+        total = len(lote["solicitudes"])
+        avance = 1.0 if self.demora <= 0 else min((time.time() - lote["creado"]) / self.demora, 1.0)
+        terminado = avance >= 1.0
+        procesadas = total if terminado else int(total * avance)
+        errores = int(procesadas * self.tasa_error)
+        creado = datetime.datetime.fromtimestamp(lote["creado"], datetime.timezone.utc)
+        return {
+            "id": lote_id,
+            "type": "message_batch",
+            "processing_status": "ended" if terminado else "in_progress",
+            "request_counts": {
+                "processing": total - procesadas, "succeeded": procesadas - errores,
+                "errored": errores, "canceled": 0, "expired": 0
+            },
+            "created_at": creado.isoformat(),
+            "expires_at": (creado + datetime.timedelta(hours=24)).isoformat(),
+            "ended_at": datetime.datetime.now(datetime.timezone.utc).isoformat() if terminado else None,
+            "results_url": f"{base_url}/v1/messages/batches/{lote_id}/results" if terminado else None
+        }
+
+    def resultados(self, lote_id):
+        """Líneas JSONL de un lote terminado (errores al azar según `tasa_error`)"""
+        with self._lock:
+            lote = self._lotes.get(lote_id)
+        azar = random.Random(lote_id)
+        for solicitud in lote["solicitudes"]:
+            if azar.random() < self.tasa_error:
+                resultado = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": "Error simulado"}}}
+            else:
+                resultado = {"type": "succeeded", "message": respuesta_simulada(solicitud["params"])}
+            yield json.dumps({"custom_id": solicitud["custom_id"], "result": resultado}, ensure_ascii=False)
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _autorizado(self):
+        if self.headers.get("x-api-key"):
+            return True
+        self._responder(401, {"type": "error", "error": {"type": "authentication_error", "message": "Falta x-api-key"}})
+        return False
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        cuerpo = json.loads(self.rfile.read(largo) or b"{}")
+        if not self._autorizado():
+            return
+        if self.path == "/v1/messages":
+            self._responder(200, respuesta_simulada(cuerpo))
+        elif self.path == "/v1/messages/batches":
+            lote_id = self.server.lotes.crear(cuerpo["requests"])
+            self._responder(200, self.server.lotes.estado(lote_id, self.server.base_url))
+        else:
+            self._responder(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+    def do_GET(self):
+        ruta = _RUTA_LOTE.match(self.path)
+        if not self._autorizado():
+            return
+        estado = ruta and self.server.lotes.estado(ruta.group(1), self.server.base_url)
+        if not estado:
+            self._responder(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+        elif not ruta.group(2):
+            self._responder(200, estado)
+        elif estado["processing_status"] != "ended":
+            self._responder(400, {"type": "error", "error": {"type": "invalid_request_error", "message": "El lote no ha terminado"}})
+        else:
+            # Resultados en partes (chunked) para ejercitar la lectura en streaming del cliente
+            self.send_response(200)
+            self.send_header("Content-Type", "application/binary")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for linea in self.server.lotes.resultados(ruta.group(1)):
+                datos = (linea + "\n").encode("utf-8")
+                self.wfile.write(f"{len(datos):X}\r\n".encode() + datos + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+
+def crear_servidor(host="127.0.0.1", puerto=8503, demora=5.0, tasa_error=0.0):
+    """Servidor HTTP de la API simulada (aún sin iniciar)"""
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorAPI)
+    servidor.daemon_threads = True
+    servidor.lotes = LotesSimulados(demora, tasa_error)
+    servidor.base_url = f"http://{host}:{servidor.server_address[1]}"
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API simulada de Claude (Messages y Message Batches)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8503)
+    parser.add_argument("--demora", type=float, default=5.0, help="Segundos que tarda cada lote en terminar")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Fracción de solicitudes que fallan")
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.host, args.puerto, args.demora, args.tasa_error)
+    print(f"API simulada en {servidor.base_url} (ANTHROPIC_BASE_URL={servidor.base_url})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.shutdown()
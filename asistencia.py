@@ -0,0 +1,251 @@
+"""
+Asistencia calculada desde el registro diario (una fila por estudiante por día).
+
+El registro se lee por bloques y se agrega sin conservar los eventos: la
+memoria depende del número de estudiantes (y de los días lectivos del
+calendario), no del número de filas del archivo.
+
+Uso:
+    python asistencia.py registro_diario.csv --anio 2025 -o asistencia.csv
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from calificacion import normalizar_dni
+
+BIMESTRES = ["Bim1", "Bim2", "Bim3", "Bim4"]
+COLUMNAS_REGISTRO = ["DNI", "Fecha", "Estado"]
+
+# Estado del día por estudiante (0 = sin registro)
+SIN_REGISTRO, PRESENTE, TARDANZA, JUSTIFICADA, FALTA = range(5)
+
+# Códigos aceptados en la columna Estado del registro diario
+CODIGOS = {
+    "P": PRESENTE, "PRESENTE": PRESENTE, "ASISTIO": PRESENTE,
+    "T": TARDANZA, "TARDANZA": TARDANZA,
+    "J": JUSTIFICADA, "FJ": JUSTIFICADA, "JUSTIFICADA": JUSTIFICADA,
+    "F": FALTA, "FI": FALTA, "FALTA": FALTA, "INASISTENCIA": FALTA, "AUSENTE": FALTA
+}
+
+# Códigos que unos registros usan para "Asistió" y otros para "Ausente": el archivo se rechaza
+CODIGOS_AMBIGUOS = {"A"}
+
+
+def _pascua(anio):
+    """Domingo de Pascua (algoritmo anónimo gregoriano)"""
+    a, b, c = anio % 19, anio // 100, anio % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    mes = (h + l - 7 * m + 90) // 25
+    dia = (h + l - 7 * m + 33 * mes + 19) % 32
+    return datetime.date(anio, mes, dia)
+
+
+def feriados_peru(anio):
+    """Feriados nacionales del Perú (incluye Jueves y Viernes Santo)"""
+    fijos = [(1, 1), (5, 1), (6, 7), (6, 29), (7, 23), (7, 28), (7, 29), (8, 6),
+             (8, 30), (10, 8), (11, 1), (12, 8), (12, 9), (12, 25)]
+    pascua = _pascua(anio)
+    return {datetime.date(anio, mes, dia) for mes, dia in fijos} | {
+        pascua - datetime.timedelta(days=3), pascua - datetime.timedelta(days=2)
+    }
+
+
+class CalendarioEscolar:
+    """
+    Días lectivos del año: lunes a viernes dentro de cada bimestre, sin feriados
+    ni días no laborables.
+
+    Cada día lectivo recibe un número de columna consecutivo; los días que no
+    son lectivos quedan en -1 y sus registros se descartan.
+    """
+
+    def __init__(self, bimestres, no_laborables=()):
+        self.anio = bimestres[0][0].year
+        self.inicio = datetime.date(self.anio, 1, 1)
+        dias_anio = (datetime.date(self.anio + 1, 1, 1) - self.inicio).days
+        excluidos = {(d - self.inicio).days for d in no_laborables if d.year == self.anio}
+
+        self.columna_de_dia = np.full(dias_anio, -1, dtype=np.int32)
+        self.rangos = []  # (primera, última + 1) columna de cada bimestre
+        columna = 0
+        for inicio, fin in bimestres:
+            primera = columna
+            for dia in range((inicio - self.inicio).days, (fin - self.inicio).days + 1):
+                if dia not in excluidos and (self.inicio + datetime.timedelta(days=dia)).weekday() < 5:
+                    self.columna_de_dia[dia] = columna
+                    columna += 1
+            self.rangos.append((primera, columna))
+        self.dias_lectivos = columna
+
+    @classmethod
+    def por_defecto(cls, anio, no_laborables=()):
+        """Calendario referencial de cuatro bimestres con los feriados nacionales"""
+        d = lambda mes, dia: datetime.date(anio, mes, dia)
+        bimestres = [(d(3, 16), d(5, 15)), (d(5, 25), d(7, 24)), (d(8, 10), d(10, 9)), (d(10, 19), d(12, 18))]
+        return cls(bimestres, feriados_peru(anio) | set(no_laborables))
+
+    def columnas(self, fechas):
+        """Columna de día lectivo para cada fecha (-1 si no es lectivo o es de otro año)"""
+        dias = (fechas.to_numpy(dtype="datetime64[D]") - np.datetime64(self.inicio, "D")).astype(np.int64)
+        fuera = (dias < 0) | (dias >= len(self.columna_de_dia)) | pd.isna(fechas).to_numpy()
+        return np.where(fuera, -1, self.columna_de_dia[np.clip(dias, 0, len(self.columna_de_dia) - 1)])
+
+
+class AgregadorAsistencia:
+    """
+    Acumula el registro diario bloque a bloque.
+
+    Guarda un estado por estudiante y día lectivo (un byte), de modo que los
+    registros duplicados o corregidos más adelante en el archivo reemplazan al
+    anterior en lugar de contarse dos veces. Las faltas justificadas cuentan
+    como asistencia; los días sin registro no entran al cálculo.
+    """
+
+    def __init__(self, calendario):
+        self.calendario = calendario
+        self._ids = {}  # DNI -> fila
+        self._dnis = []
+        self.estado = np.zeros((0, calendario.dias_lectivos), dtype=np.int8)
+        self.filas_leidas = 0
+        self.descartadas = 0  # fechas no lectivas o inválidas, o sin DNI
+        self.codigos_invalidos = 0
+
+    def _filas(self, dni):
+        """Fila de cada DNI distinto, registrando a los estudiantes nuevos"""
+        ids = np.empty(len(dni), dtype=np.int64)
+        for i, valor in enumerate(dni):
+            fila = self._ids.get(valor)
+            if fila is None:
+                fila = self._ids[valor] = len(self._dnis)
+                self._dnis.append(valor)
+            ids[i] = fila
+        # La matriz crece al doble para que agregar estudiantes sea amortizado
+        if len(self._dnis) > len(self.estado):
+            nueva = np.zeros((max(len(self._dnis), 2 * len(self.estado)), self.calendario.dias_lectivos), dtype=np.int8)
+            nueva[:len(self.estado)] = self.estado
+            self.estado = nueva
+        return ids
+
+    def agregar(self, bloque):
+        """Incorpora un bloque del registro con columnas DNI, Fecha y Estado"""
+        self.filas_leidas += len(bloque)
+        # Los valores se repiten mucho (pocas fechas y códigos, un DNI por estudiante):
+        # se normalizan solo los valores distintos del bloque
+        codigos_fecha, fechas = pd.factorize(bloque["Fecha"])
+        fechas = pd.Series(fechas)
+        fechas_iso = pd.to_datetime(fechas, format="%Y-%m-%d", errors="coerce")
+        fechas = fechas_iso.fillna(pd.to_datetime(fechas, dayfirst=True, errors="coerce", format="mixed"))
+        columnas = np.append(self.calendario.columnas(fechas), -1)[codigos_fecha]
+
+        codigos_estado, estados = pd.factorize(bloque["Estado"])
+        estados = pd.Series(estados).astype(str).str.strip().str.upper()
+        ambiguos = sorted(CODIGOS_AMBIGUOS.intersection(estados))
+        if ambiguos:
+            raise ValueError(f"Código de asistencia ambiguo en el registro diario: {', '.join(ambiguos)} "
+                             "(puede ser Asistió o Ausente); use P para presente y F para falta")
+        estados = estados.map(CODIGOS).fillna(SIN_REGISTRO)
+        estado = np.append(estados.to_numpy(dtype=np.int8), SIN_REGISTRO)[codigos_estado]
+
+        con_dni = bloque["DNI"].notna().to_numpy()
+        validas = (columnas >= 0) & (estado != SIN_REGISTRO) & con_dni
+        self.descartadas += int(((columnas < 0) | ~con_dni).sum())
+        self.codigos_invalidos += int(((columnas >= 0) & (estado == SIN_REGISTRO)).sum())
+
+        codigos_dni, dnis = pd.factorize(bloque["DNI"][validas])
+        filas = self._filas(normalizar_dni(dnis).to_numpy())[codigos_dni]
+        self.estado[filas, columnas[validas]] = estado[validas]
+
+    def resultado(self):
+        """Una fila por DNI con el porcentaje anual, por bimestre y los conteos"""
+        n = len(self._dnis)
+        estado = self.estado[:n]
+        resultado = {"DNI": np.array(self._dnis, dtype=object)}
+        totales = {nombre: np.zeros(n, dtype=np.int64) for nombre in ("registrados", "asistidos", "T", "J", "F")}
+
+        for bimestre, (primera, ultima) in zip(BIMESTRES, self.calendario.rangos):
+            bloque = estado[:, primera:ultima]
+            registrados = (bloque != SIN_REGISTRO).sum(axis=1)
+            asistidos = ((bloque == PRESENTE) | (bloque == TARDANZA) | (bloque == JUSTIFICADA)).sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                resultado[f"Asistencia_{bimestre}"] = np.round(np.where(registrados > 0, asistidos / registrados * 100, np.nan), 1)
+            totales["registrados"] += registrados
+            totales["asistidos"] += asistidos
+            totales["T"] += (bloque == TARDANZA).sum(axis=1)
+            totales["J"] += (bloque == JUSTIFICADA).sum(axis=1)
+            totales["F"] += (bloque == FALTA).sum(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resultado["Asistencia"] = np.round(
+                np.where(totales["registrados"] > 0, totales["asistidos"] / totales["registrados"] * 100, np.nan), 1
+            )
+        resultado["Dias_Registrados"] = totales["registrados"]
+        resultado["Tardanzas"] = totales["T"]
+        resultado["Faltas_Justificadas"] = totales["J"]
+        resultado["Faltas"] = totales["F"]
+        return pd.DataFrame(resultado)
+
+
+def agregar_registro(archivo, calendario, tamano_bloque=500_000, progreso=None):
+    """
+    Lee un registro diario en CSV por bloques y devuelve la asistencia por estudiante.
+
+    Devuelve el DataFrame de `AgregadorAsistencia.resultado` y el agregador
+    (para informar filas leídas, descartadas y códigos inválidos).
+    """
+    agregador = AgregadorAsistencia(calendario)
+    lector = pd.read_csv(archivo, usecols=lambda c: c.strip() in COLUMNAS_REGISTRO,
+                         dtype=str, chunksize=tamano_bloque)
+    for bloque in lector:
+        bloque.columns = bloque.columns.str.strip()
+        faltantes = [col for col in COLUMNAS_REGISTRO if col not in bloque.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el registro diario: {', '.join(faltantes)}")
+        agregador.agregar(bloque)
+        if progreso:
+            progreso(agregador.filas_leidas)
+    return agregador.resultado(), agregador
+
+
+def aplicar_asistencia(df, asistencia):
+    """
+    Reemplaza la columna Asistencia de la nómina con la calculada desde el registro.
+
+    Agrega además Asistencia_Bim1..Bim4. Los estudiantes sin registros diarios
+    conservan el valor que traía la nómina (o quedan vacíos si no lo tenía).
+    """
+    df = df.copy()
+    anterior = df["Asistencia"] if "Asistencia" in df.columns else pd.Series(np.nan, index=df.index)
+    columnas = ["Asistencia", *[f"Asistencia_{b}" for b in BIMESTRES]]
+    valores = asistencia.set_index("DNI")[columnas].reindex(normalizar_dni(df["DNI"]).to_numpy())
+    for col in columnas:
+        df[col] = valores[col].to_numpy()
+    df["Asistencia"] = df["Asistencia"].fillna(anterior)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asistencia por estudiante y bimestre desde el registro diario")
+    parser.add_argument("registro", help="CSV con columnas DNI, Fecha (AAAA-MM-DD) y Estado (P/T/J/F)")
+    parser.add_argument("--anio", type=int, default=datetime.date.today().year)
+    parser.add_argument("--no-laborables", default="", help="Fechas adicionales separadas por comas (AAAA-MM-DD)")
+    parser.add_argument("--tamano-bloque", type=int, default=500_000)
+    parser.add_argument("-o", "--salida", default="asistencia.csv")
+    args = parser.parse_args()
+
+    no_laborables = {datetime.date.fromisoformat(f.strip()) for f in args.no_laborables.split(",") if f.strip()}
+    calendario = CalendarioEscolar.por_defecto(args.anio, no_laborables)
+    inicio = time.perf_counter()
+    asistencia, agregador = agregar_registro(args.registro, calendario, args.tamano_bloque)
+    asistencia.to_csv(args.salida, index=False)
+    print(f"{agregador.filas_leidas} filas, {len(asistencia)} estudiantes, "
+          f"{agregador.descartadas} en días no lectivos, {agregador.codigos_invalidos} con código inválido "
+          f"({time.perf_counter() - inicio:.1f} s) -> {args.salida}")
@@ -0,0 +1,98 @@
+"""Reglas de calificación MINEDU (promedio, nota mínima, estado y escala de letras) y normalización del DNI"""
+import numpy as np
+import pandas as pd
+
+BIMESTRES = ["Bim1", "Bim2", "Bim3", "Bim4"]
+
+# Valores por defecto de los sliders del panel de parámetros
+NOTA_MINIMA_PRIM = 11
+NOTA_MINIMA_SEC = 10
+ASISTENCIA_MINIMA = 80
+
+
+def convertir_a_letras(nota, nivel, usar_letras_sec=False):
+    """Convierte nota numérica a letras según escala MINEDU"""
+    # Mismo sistema para Primaria y Secundaria cuando está activado
+    if nivel == "Secundaria" and not usar_letras_sec:
+        return "-"
+
+    if nota <= 10: return "C"
+    elif 11 <= nota <= 13: return "B"
+    elif 14 <= nota <= 17: return "A"
+    elif nota >= 18: return "AD"
+    else: return "-"
+
+
+def letras(promedio, es_primaria, usar_letras_sec=False):
+    """Versión vectorizada de `convertir_a_letras` para una columna de promedios"""
+    promedio = np.asarray(promedio, dtype=float)
+    resultado = np.select(
+        [promedio <= 10, (promedio >= 11) & (promedio <= 13), (promedio >= 14) & (promedio <= 17), promedio >= 18],
+        ["C", "B", "A", "AD"],
+        default="-"
+    ).astype(object)
+    if not usar_letras_sec:
+        resultado[~np.asarray(es_primaria, dtype=bool)] = "-"
+    return resultado
+
+
+def calificar_arrays(grados, notas, asistencia, nota_minima_prim=NOTA_MINIMA_PRIM, nota_minima_sec=NOTA_MINIMA_SEC,
+                     asistencia_minima=ASISTENCIA_MINIMA, usar_letras_sec=False):
+    """
+    Núcleo vectorizado de las reglas sobre arreglos NumPy.
+
+    `notas` es una matriz (estudiantes × bimestres) con NaN en los bimestres
+    no evaluados. Devuelve un diccionario con Promedio, Nota_Minima, Estado y Letra.
+    """
+    notas = np.asarray(notas, dtype=float)
+    asistencia = np.asarray(asistencia, dtype=float)
+    es_primaria = np.array(["Primaria" in str(g) for g in grados], dtype=bool)
+
+    evaluados = (~np.isnan(notas)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        promedio = np.round(np.nansum(notas, axis=1) / evaluados, 1)
+    nota_minima = np.where(es_primaria, nota_minima_prim, nota_minima_sec)
+    estado = np.where(
+        (promedio >= nota_minima) & (asistencia >= asistencia_minima),
+        "Aprobado", "Desaprobado"
+    ).astype(object)
+    return {
+        "Promedio": promedio,
+        "Nota_Minima": nota_minima,
+        "Estado": estado,
+        "Letra": letras(promedio, es_primaria, usar_letras_sec)
+    }
+
+
+def calificar(df, nota_minima_prim=NOTA_MINIMA_PRIM, nota_minima_sec=NOTA_MINIMA_SEC,
+              asistencia_minima=ASISTENCIA_MINIMA, usar_letras_sec=False):
+    """
+    Agrega Promedio, Nota_Minima, Estado y Letra a una nómina.
+
+    Trabaja sobre columnas completas (sin `apply` fila por fila) y devuelve
+    una copia superficial: el DataFrame original no se modifica.
+    """
+    df = df.copy(deep=False)
+    resultado = calificar_arrays(
+        df["Grado"].to_numpy(),
+        df[BIMESTRES].to_numpy(dtype=float),
+        df["Asistencia"].to_numpy(dtype=float),
+        nota_minima_prim, nota_minima_sec, asistencia_minima, usar_letras_sec
+    )
+    for columna, valores in resultado.items():
+        df[columna] = valores
+    return df
+
+
+def normalizar_dni(valores):
+    """
+    DNI como texto de 8 dígitos (recupera los ceros iniciales que Excel suele quitar y quita separadores).
+
+    Las celdas vacías quedan como NA: no deben coincidir entre sí como si fueran un DNI.
+    """
+    valores = pd.Series(valores)
+    dni = valores.astype(str).str.strip().str.removesuffix(".0")
+    # "12.345.678", "12 345 678" o "12-345-678" son el mismo DNI
+    digitos = dni.str.replace(r"[\s.\-]", "", regex=True)
+    dni = dni.where(~digitos.str.fullmatch(r"\d{1,8}"), digitos.str.zfill(8))
+    return dni.astype(object).mask(valores.isna().to_numpy() | (dni == "").to_numpy())
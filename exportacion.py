@@ -0,0 +1,127 @@
+"""Exportación de nóminas calificadas a Excel (XLSX) y CSV"""
+import re
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# Columnas del reporte en el orden en que se entregan a la dirección
+COLUMNAS_EXPORTACION = [
+    "Estudiante", "DNI", "Grado", "Seccion",
+    "Bim1", "Bim2", "Bim3", "Bim4",
+    "Promedio", "Letra", "Asistencia",
+    "Asistencia_Bim1", "Asistencia_Bim2", "Asistencia_Bim3", "Asistencia_Bim4",
+    "Conducta", "Estado",
+    "Puesto_Seccion", "Puesto_Grado", "Percentil_Grado"
+]
+
+RELLENO_DESAPROBADO = PatternFill(start_color="FFEBEE", end_color="FFEBEE", fill_type="solid")
+FUENTE_DESAPROBADO = Font(color="C62828")
+
+# Excel no admite estos caracteres en el nombre de una hoja
+_CARACTERES_INVALIDOS_HOJA = re.compile(r"[\[\]\*\?/\\:]")
+
+# Nombre de hoja para las filas sin Grado o sin Sección
+SIN_VALOR_HOJA = {"Grado": "Sin grado", "Seccion": "Sin sección"}
+
+# Filas por bloque al convertir los valores de cada hoja
+_FILAS_POR_BLOQUE = 20_000
+
+
+def columnas_disponibles(df):
+    """Devuelve las columnas de exportación presentes en el DataFrame"""
+    return [col for col in COLUMNAS_EXPORTACION if col in df.columns]
+
+
+def exportar_csv(df, columnas=None):
+    """Exporta la nómina calificada a CSV (UTF-8 con BOM para abrir en Excel)"""
+    columnas = columnas_disponibles(df) if columnas is None else columnas
+    return df[columnas].to_csv(index=False).encode("utf-8-sig")
+
+
+def _nombre_hoja(clave, usados):
+    """Genera un nombre de hoja válido (máx. 31 caracteres) y único"""
+    partes = clave if isinstance(clave, tuple) else (clave,)
+    base = _CARACTERES_INVALIDOS_HOJA.sub("-", " - ".join(str(p) for p in partes)).strip()[:31] or "Hoja"
+    nombre, n = base, 2
+    while nombre.lower() in usados:
+        sufijo = f" ({n})"
+        nombre = base[:31 - len(sufijo)] + sufijo
+        n += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def _valores_columna(columna):
+    """
+    Valores de una columna listos para openpyxl.
+
+    Excel no admite NaN ni infinitos: quedan como celdas vacías. Los booleanos
+    se escriben como booleanos y a los textos se les quitan los caracteres de
+    control que el XML no admite.
+    """
+    if is_bool_dtype(columna):
+        return [None if pd.isna(v) else bool(v) for v in columna]
+    if is_numeric_dtype(columna):
+        valores = columna.to_numpy(dtype=float, na_value=np.nan)
+        return np.where(np.isfinite(valores), valores, None).tolist()
+    texto = columna.astype(str).str.replace(ILLEGAL_CHARACTERS_RE, "", regex=True)
+    return texto.where(columna.notna(), None).tolist()
+
+
+def exportar_excel(df, destino=None):
+    """
+    Exporta la nómina calificada a XLSX con una hoja por Grado/Sección.
+
+    Usa el modo de solo escritura de openpyxl: cada hoja se escribe fila por
+    fila y en bloques de columnas ya convertidas, así la memoria no crece con
+    el tamaño de la nómina. Los desaprobados se resaltan con una única regla
+    de formato condicional por hoja en lugar de dar estilo celda por celda.
+    Con `destino` (ruta o archivo) el libro se guarda allí; sin él se
+    devuelven los bytes del archivo.
+    """
+    columnas = columnas_disponibles(df)
+    claves = [col for col in ("Grado", "Seccion") if col in df.columns]
+    col_estado = get_column_letter(columnas.index("Estado") + 1) if "Estado" in columnas else None
+    ultima_col = get_column_letter(len(columnas))
+
+    wb = Workbook(write_only=True)
+    usados = set()
+    if claves:
+        grupos = df.groupby([df[col].fillna(SIN_VALOR_HOJA[col]) for col in claves], sort=True)
+    else:
+        grupos = [("Nomina", df)]
+
+    for clave, grupo in grupos:
+        ws = wb.create_sheet(_nombre_hoja(clave, usados))
+        ws.freeze_panes = "A2"
+        n_filas = len(grupo)
+
+        if col_estado and n_filas:
+            ws.conditional_formatting.add(
+                f"A2:{ultima_col}{n_filas + 1}",
+                FormulaRule(
+                    formula=[f'${col_estado}2="Desaprobado"'],
+                    fill=RELLENO_DESAPROBADO,
+                    font=FUENTE_DESAPROBADO
+                )
+            )
+
+        ws.append(columnas)
+        for inicio in range(0, n_filas, _FILAS_POR_BLOQUE):
+            bloque = grupo.iloc[inicio:inicio + _FILAS_POR_BLOQUE]
+            for fila in zip(*(_valores_columna(bloque[col]) for col in columnas)):
+                ws.append(fila)
+
+    if destino is not None:
+        wb.save(destino)
+        return None
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
@@ -3,10 +3,32 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import requests
+import streamlit.components.v1 as components
+from streamlit.proto.DownloadButton_pb2 import DownloadButton as DownloadButtonProto
 import datetime
-from fpdf import FPDF
+import functools
+import hmac
+import os
+import re
+import uuid
 from io import BytesIO
+import calificacion
+from calificacion import calificar
+from exportacion import exportar_csv, exportar_excel
+from registro_compartido import RegistroNominas, espacio_colegio, memoria_df
+from trabajos import ColaTrabajos, ESTADOS_ACTIVOS
+from reportes import trabajo_reporte_pdf
+from simulador import SimuladorAprobacion
+from ranking import RankingMerito
+from notas_areas import AREAS_PRIMARIA, AREAS_SECUNDARIA, COLUMNAS_LARGO, NotasAreas
+from asistencia import CalendarioEscolar, agregar_registro, aplicar_asistencia
+from versiones_nomina import VersionesNomina, reporte_cambios
+from identidad import duplicados_nomina
+from instantaneas import (generar_html, huella_guardada, huella_instantanea, leer_instantanea, nombre_archivo,
+                          publicar_instantanea, renovar_token, sin_estudiantes, token_instantanea)
+from alertas import REGLAS, actualizar_motor, ranking_riesgo
+from analisis_ia import (AlmacenAnalisis, SeguidorLotes, construir_prompt, huella_prompt, solicitar_analisis,
+                         trabajo_analisis_batches, trabajo_analisis_lote, ErrorAPIClaude)
 
 # Configuración de la página
 st.set_page_config(
@@ -111,31 +133,138 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- Vista de solo lectura: instantánea publicada (no se recalcula nada) ---
+DIRECTORIO_INSTANTANEAS = os.environ.get("GESTION_INSTANTANEAS_DIR", "instantaneas")
+if "instantanea" in st.query_params:
+    # El enlace lleva un token aleatorio por instantánea, no el código modular (que es público)
+    archivo_instantanea = nombre_archivo(st.query_params["instantanea"])
+    ruta_instantanea = os.path.join(DIRECTORIO_INSTANTANEAS, archivo_instantanea) if archivo_instantanea else None
+    if ruta_instantanea and os.path.exists(ruta_instantanea):
+        with open(ruta_instantanea, encoding="utf-8") as f:
+            components.html(f.read(), height=3600, scrolling=True)
+    else:
+        st.error("❌ El enlace de la instantánea no es válido o fue renovado")
+    st.stop()
+
 # --- Cabecera ---
 st.markdown('<div class="header">📊 Sistema de Gestión Escolar con IA</div>', unsafe_allow_html=True)
 st.caption("Herramienta para el seguimiento académico según normas del Ministerio de Educación del Perú")
 
 # --- Variables de sesión ---
-if 'df' not in st.session_state:
-    st.session_state.df = None
+# La sesión solo guarda la clave de la nómina; los datos viven en el registro compartido.
+# El identificador va en la URL (?sesion=) para que al recargar la página se recuperen los trabajos
+if 'sesion_id' not in st.session_state:
+    sesion_url = st.query_params.get("sesion", "")
+    st.session_state.sesion_id = sesion_url if re.fullmatch(r"[0-9a-f]{32}", sesion_url) else uuid.uuid4().hex
+st.query_params["sesion"] = st.session_state.sesion_id
+if 'nomina_clave' not in st.session_state:
+    st.session_state.nomina_clave = None
+if 'archivo_id' not in st.session_state:
+    st.session_state.archivo_id = None
 if 'nivel_educativo' not in st.session_state:
     st.session_state.nivel_educativo = None
+if 'motor_alertas' not in st.session_state:
+    st.session_state.motor_alertas = None
+if 'cambios_nomina' not in st.session_state:
+    st.session_state.cambios_nomina = None
+if 'duplicados_nomina' not in st.session_state:
+    st.session_state.duplicados_nomina = None
+
+# --- Registro de nóminas compartido entre sesiones ---
+@st.cache_resource
+def obtener_registro():
+    """Registro único por proceso: cada nómina se guarda una vez por colegio"""
+    return RegistroNominas()
+
+registro = obtener_registro()
+
+def es_administrador():
+    """Los paneles del servidor solo se muestran abriendo la app con ?admin=<GESTION_CLAVE_ADMIN>"""
+    clave = os.environ.get("GESTION_CLAVE_ADMIN")
+    if not clave:
+        return False
+    return hmac.compare_digest(st.query_params.get("admin", "").encode("utf-8"), clave.encode("utf-8"))
+
+# --- Cola de trabajos en segundo plano ---
+@st.cache_resource
+def obtener_cola():
+    """Pool de trabajadores único por proceso (configurable con GESTION_TRABAJADORES)"""
+    return ColaTrabajos(
+        ruta_db=os.environ.get("GESTION_TRABAJOS_DB", "trabajos.db"),
+        trabajadores=int(os.environ.get("GESTION_TRABAJADORES", "2"))
+    )
+
+cola = obtener_cola()
+
+# Las versiones recientes de Streamlit aceptan una función en download_button(data=...) y la llaman al descargar
+DESCARGA_DIFERIDA = "deferred_file_id" in DownloadButtonProto.DESCRIPTOR.fields_by_name
+
+# --- Almacén persistente de análisis IA ---
+@st.cache_resource
+def obtener_almacen_analisis():
+    """Análisis generados (individuales y por lotes), compartidos por todas las sesiones"""
+    return AlmacenAnalisis(os.environ.get("GESTION_ANALISIS_DB", "analisis.db"))
+
+almacen_analisis = obtener_almacen_analisis()
+
+# --- Seguimiento de lotes de Message Batches (hilo propio, no ocupa la cola) ---
+@st.cache_resource
+def obtener_seguidor_lotes():
+    """Consulta los lotes enviados hasta guardar sus resultados; retoma los pendientes tras un reinicio"""
+    return SeguidorLotes(
+        almacen_analisis, cola,
+        intervalo=float(os.environ.get("GESTION_INTERVALO_LOTES", "30"))
+    )
+
+seguidor_lotes = obtener_seguidor_lotes()
+
+# --- Versiones de la nómina por colegio (carga incremental) ---
+@st.cache_resource
+def obtener_versiones_nomina():
+    """Última versión guardada de la nómina de cada colegio, para comparar cargas sucesivas"""
+    return VersionesNomina(os.environ.get("GESTION_VERSIONES_DB", "versiones.db"))
+
+versiones_nomina = obtener_versiones_nomina()
+
+def nomina_sesion():
+    """Devuelve la nómina compartida asociada a la sesión (o None)"""
+    if st.session_state.nomina_clave is None:
+        return None
+    return registro.adquirir(st.session_state.sesion_id, st.session_state.nomina_clave)
 
 # --- Configuración del sidebar ---
 with st.sidebar:
+    st.header("🏫 Institución Educativa")
+    codigo_colegio = st.text_input(
+        "Código modular",
+        help="Identifica al colegio en la carga incremental y en las instantáneas publicadas."
+    ).strip()
+    clave_colegio = st.text_input(
+        "Clave del colegio",
+        type="password",
+        help="Los docentes que ingresan el mismo código modular y la misma clave comparten en memoria las nóminas cargadas. "
+             "Sin clave, la nómina es privada de esta sesión."
+    )
+    # Nóminas compartidas: solo con código y clave (el código modular por sí solo es público)
+    espacio = espacio_colegio(codigo_colegio, clave_colegio)
+
+    st.markdown("---")
     st.header("🔐 Configuración API Claude")
     ANTHROPIC_API_KEY = st.text_input(
         "Ingrese su API Key de Anthropic",
         type="password",
         help="Opcional para análisis con IA"
     )
+    # Los lotes enviados con esta clave (también antes de un reinicio) se siguen con ella
+    seguidor_lotes.recordar_clave(ANTHROPIC_API_KEY)
 
     st.markdown("---")
     st.header("⚙️ Parámetros Académicos")
 
     # Detectar nivel educativo automáticamente si hay datos cargados
-    if st.session_state.df is not None and 'Grado' in st.session_state.df.columns:
-        grados_unicos = st.session_state.df['Grado'].unique()
+    nomina = nomina_sesion()
+    if nomina is not None and 'Grado' in nomina.columns:
+        grados_unicos = nomina['Grado'].unique()
         if any('Primaria' in str(grado) for grado in grados_unicos):
             st.session_state.nivel_educativo = 'Primaria'
         elif any('Secundaria' in str(grado) for grado in grados_unicos):
@@ -156,7 +285,9 @@ with st.sidebar:
         disabled=len(nivel_options) == 1
     )
 
-    # Configuración específica por nivel
+    # Configuración específica por nivel (valores por defecto para el nivel no seleccionado)
+    nota_minima_prim, usar_letras_prim = calificacion.NOTA_MINIMA_PRIM, False
+    nota_minima_sec, usar_letras_sec = calificacion.NOTA_MINIMA_SEC, False
     if nivel_educativo in ["Primaria", "Ambos"]:
         nota_minima_prim = st.slider(
             "Nota mínima aprobatoria (Primaria)",
@@ -190,6 +321,21 @@ with st.sidebar:
         value=80
     )
 
+    # Calendario para calcular la asistencia desde el registro diario
+    with st.expander("🗓️ Calendario escolar (registro diario)"):
+        anio_escolar = st.number_input(
+            "Año escolar",
+            min_value=2000,
+            max_value=2100,
+            value=datetime.date.today().year,
+            step=1
+        )
+        no_laborables_txt = st.text_area(
+            "Días no laborables adicionales",
+            placeholder="2025-04-21\n2025-10-31",
+            help="Una fecha por línea (AAAA-MM-DD). Los feriados nacionales y los fines de semana ya se excluyen."
+        )
+
     # Guía para calcular asistencia
     with st.expander("ℹ️ ¿Cómo calcular el porcentaje de asistencia?"):
         st.markdown("""
@@ -210,6 +356,11 @@ with st.sidebar:
         - Considere días justificados (enfermedad con certificado médico)
         - No cuente como inasistencia los feriados o días no laborables
         - Registre la asistencia bimestralmente para mayor precisión
+
+        **O súbala calculada automáticamente:** junto con la nómina puede subir el
+        registro diario (CSV con columnas `DNI, Fecha, Estado`, una fila por
+        estudiante por día). Códigos: `P` presente, `T` tardanza, `J` falta
+        justificada (cuenta como asistencia), `F` falta.
         """)
 
     st.markdown("---")
@@ -223,16 +374,8 @@ with st.sidebar:
 
 # --- Sistema de Letras Ajustado ---
 def convertir_a_letras(nota, nivel):
-    """Convierte nota numérica a letras según escala MINEDU"""
-    # Mismo sistema para Primaria y Secundaria cuando está activado
-    if nivel == "Secundaria" and not usar_letras_sec:
-        return "-"
-
-    if nota <= 10: return "C"
-    elif 11 <= nota <= 13: return "B"
-    elif 14 <= nota <= 17: return "A"
-    elif nota >= 18: return "AD"
-    else: return "-"
+    """Convierte nota numérica a letras según escala MINEDU y la configuración actual"""
+    return calificacion.convertir_a_letras(nota, nivel, usar_letras_sec)
 
 # --- Datos de ejemplo ---
 @st.cache_data
@@ -276,6 +419,46 @@ def generar_datos_ejemplo(nivel):
     }
     return pd.DataFrame(datos)
 
+@st.cache_data
+def generar_notas_ejemplo(df):
+    """Notas por área curricular alrededor de las notas bimestrales del ejemplo"""
+    filas = []
+    for i, (dni, grado, *notas) in enumerate(df[["DNI", "Grado", *calificacion.BIMESTRES]].itertuples(index=False)):
+        areas = AREAS_PRIMARIA if "Primaria" in grado else AREAS_SECUNDARIA
+        for area in areas:
+            for bim, nota in enumerate(notas, 1):
+                filas.append((dni, area, bim, int(np.clip(nota + np.random.randint(-3, 4), 0, 20))))
+    return NotasAreas.desde_largo(pd.DataFrame(filas, columns=COLUMNAS_LARGO), df["DNI"])[0]
+
+# --- Exportación (cacheada para no regenerar los archivos en cada interacción) ---
+exportar_csv_cache = st.cache_data(exportar_csv)
+exportar_excel_cache = st.cache_data(exportar_excel)
+
+@st.cache_data(max_entries=16)
+def descarga_instantanea(ruta, huella):
+    """Bytes de la instantánea publicada; `huella` renueva la caché cuando se regenera"""
+    return leer_instantanea(ruta)
+
+# --- Simulador de umbrales (solo depende de notas, asistencia y grado; no de los sliders) ---
+@st.cache_data
+def construir_simulador(promedio, asistencia, grados):
+    return SimuladorAprobacion(promedio, asistencia, grados)
+
+# --- Promedios por área curricular (dependen solo de la nómina) ---
+@st.cache_data(max_entries=16)
+def obtener_promedios_area(nomina_clave, _notas_areas, grados):
+    return pd.concat([_notas_areas.promedios_area(), _notas_areas.promedios_area(grados)], ignore_index=True)
+
+# --- Reporte de cambios de una carga incremental (solo recorre las filas que cambiaron) ---
+@st.cache_data(max_entries=16)
+def obtener_reporte_cambios(colegio, version, _cambios, nota_minima_prim, nota_minima_sec, asistencia_minima):
+    return reporte_cambios(_cambios, nota_minima_prim, nota_minima_sec, asistencia_minima)
+
+# --- Orden de mérito (depende solo de notas y asistencia: se cachea por nómina) ---
+@st.cache_resource(max_entries=16)
+def obtener_ranking(nomina_clave, _df):
+    return RankingMerito(_df)
+
 # --- Guía para formato de datos ---
 def mostrar_guia_formato():
     st.markdown("""
@@ -292,7 +475,8 @@ def mostrar_guia_formato():
             <li><strong>Estudiante:</strong> Nombre completo del estudiante</li>
             <li><strong>DNI:</strong> Documento de identidad (8 dígitos)</li>
             <li><strong>Grado:</strong> Ejemplo: "1° Primaria", "3° Secundaria"</li>
-            <li><strong>Bim1-Bim4:</strong> Notas de cada bimestre (números enteros o decimales)</li>
+            <li><strong>Bim1-Bim4:</strong> Notas de cada bimestre (números enteros o decimales). Los bimestres aún no evaluados pueden dejarse vacíos u omitirse</li>
+            <li><strong>Notas por área (opcional):</strong> En un archivo aparte con columnas DNI, Area, Bimestre, Nota (una fila por estudiante, área y bimestre). En ese caso Bim1-Bim4 pueden omitirse: se calculan como el promedio de las áreas</li>
             <li><strong>Asistencia:</strong> Porcentaje de asistencia (0-100)</li>
             <li><strong>Conducta (opcional):</strong> Evaluación cualitativa</li>
         </ul>
@@ -344,7 +528,11 @@ if modo == "Subir archivo propio":
 
 if modo == "Usar datos de ejemplo":
     df = generar_datos_ejemplo(nivel_educativo)
-    st.session_state.df = df
+    # Las notas bimestrales del ejemplo son el promedio de sus áreas curriculares
+    notas_areas = generar_notas_ejemplo(df)
+    df = df.assign(**dict(zip(calificacion.BIMESTRES, notas_areas.promedios_bimestre().T)))
+    st.session_state.nomina_clave = registro.publicar(st.session_state.sesion_id, "DEMO", df, notas_areas)
+    st.session_state.archivo_id = None
     st.session_state.nivel_educativo = nivel_educativo
 
     st.markdown(f"""
@@ -359,8 +547,37 @@ else:
         type=["xlsx", "csv"],
         help="El archivo debe contener columnas para Estudiante, DNI, Grado, Bim1-Bim4 y Asistencia"
     )
+    archivo_areas = st.file_uploader(
+        "📚 Opcional: notas por área curricular (CSV o Excel en formato largo)",
+        type=["xlsx", "csv"],
+        help="Columnas DNI, Area, Bimestre (1-4) y Nota: una fila por estudiante, área y bimestre. "
+             "Las notas bimestrales de la nómina se calculan como el promedio de las áreas."
+    )
+    registro_diario = st.file_uploader(
+        "📅 Opcional: registro diario de asistencia (CSV)",
+        type=["csv"],
+        help="Columnas DNI, Fecha (AAAA-MM-DD) y Estado (P/T/J/F). Reemplaza la columna Asistencia de la nómina."
+    )
+    carga_incremental = st.checkbox(
+        "🔄 Comparar con la carga anterior del colegio",
+        disabled=not espacio,
+        help="Guarda esta nómina como nueva versión del colegio y muestra solo lo que cambió desde la carga anterior "
+             "(notas corregidas, bimestres nuevos, estudiantes nuevos, retirados y nuevos en riesgo). "
+             "Requiere el código modular y la clave del colegio.",
+        key="carga_incremental"
+    ) and bool(espacio)
+
+    # Un archivo ya procesado no se vuelve a leer ni validar en cada interacción
+    clave_archivo = uploaded_file and (
+        uploaded_file.file_id,
+        archivo_areas.file_id if archivo_areas else None,
+        registro_diario.file_id if registro_diario else None,
+        anio_escolar, no_laborables_txt, carga_incremental
+    )
+    if uploaded_file and clave_archivo == st.session_state.archivo_id:
+        df = nomina_sesion()
 
-    if uploaded_file:
+    if uploaded_file and df is None:
         try:
             if uploaded_file.name.endswith('.csv'):
                 df = pd.read_csv(uploaded_file)
@@ -368,7 +585,11 @@ else:
                 df = pd.read_excel(uploaded_file, engine='openpyxl')
 
             # Validación de columnas
-            required_cols = ["Estudiante", "DNI", "Grado", "Bim1", "Bim2", "Bim3", "Bim4", "Asistencia"]
+            # Bim2-Bim4 pueden faltar si aún no se han evaluado (alerta temprana)
+            # Asistencia puede faltar si se calcula desde el registro diario
+            # Bim1 puede faltar si se calcula desde las notas por área
+            required_cols = (["Estudiante", "DNI", "Grado"] + ([] if archivo_areas else ["Bim1"])
+                             + ([] if registro_diario else ["Asistencia"]))
             missing_cols = [col for col in required_cols if col not in df.columns]
 
             if missing_cols:
@@ -381,26 +602,70 @@ else:
                 """, unsafe_allow_html=True)
                 st.stop()
 
+            notas_areas = None
+            if archivo_areas:
+                if archivo_areas.name.endswith('.csv'):
+                    largo = pd.read_csv(archivo_areas, usecols=lambda c: c.strip() in COLUMNAS_LARGO)
+                else:
+                    largo = pd.read_excel(archivo_areas, engine='openpyxl')
+                largo.columns = largo.columns.str.strip()
+                notas_areas, descartadas = NotasAreas.desde_largo(largo, df["DNI"])
+                if descartadas:
+                    st.warning(f"⚠️ Se ignoraron {descartadas} notas por área con DNI fuera de la nómina, bimestre no reconocido o nota vacía")
+                # Los bimestres aún sin ninguna nota por área quedan vacíos
+                df = df.assign(**dict(zip(calificacion.BIMESTRES, notas_areas.promedios_bimestre().T)))
+
             # Validación de datos
             for bim in ["Bim1", "Bim2", "Bim3", "Bim4"]:
-                df[bim] = pd.to_numeric(df[bim], errors='coerce')
-                if df[bim].isnull().any():
+                if bim not in df.columns:
+                    df[bim] = np.nan
+                    continue
+                notas = pd.to_numeric(df[bim], errors='coerce')
+                if (notas.isnull() & df[bim].notnull()).any():
                     st.error(f"❌ Las notas en {bim} contienen valores no numéricos")
                     st.stop()
-                df[bim] = df[bim].clip(0, 20)
+                # Un bimestre se carga completo o se deja vacío
+                if notas.notnull().any() and notas.isnull().any():
+                    st.error(f"❌ Faltan notas en {bim} para algunos estudiantes")
+                    st.stop()
+                df[bim] = notas.clip(0, 20)
+
+            if registro_diario:
+                no_laborables = {
+                    datetime.date.fromisoformat(linea.strip())
+                    for linea in no_laborables_txt.splitlines() if linea.strip()
+                }
+                calendario = CalendarioEscolar.por_defecto(int(anio_escolar), no_laborables)
+                with st.spinner("Calculando asistencia desde el registro diario..."):
+                    asistencia, agregador = agregar_registro(registro_diario, calendario)
+                df = aplicar_asistencia(df, asistencia)
+                if agregador.descartadas or agregador.codigos_invalidos:
+                    st.warning(
+                        f"⚠️ Se ignoraron {agregador.descartadas} registros en días no lectivos o sin DNI "
+                        f"y {agregador.codigos_invalidos} con código de asistencia no reconocido"
+                    )
 
             df["Asistencia"] = pd.to_numeric(df["Asistencia"], errors='coerce').clip(0, 100)
 
-            st.session_state.df = df
+            # Filas que parecen el mismo estudiante (DNI con otro formato, tildes o faltas en el nombre)
+            with st.spinner("Buscando estudiantes registrados más de una vez..."):
+                st.session_state.duplicados_nomina = duplicados_nomina(df)
+
+            # Solo se guardan y reportan las filas insertadas, modificadas o eliminadas
+            if carga_incremental:
+                with st.spinner("Comparando con la carga anterior..."):
+                    cambios = versiones_nomina.registrar(espacio, df)
+                # La misma nómina procesada otra vez (otro calendario, la casilla) no crea otra versión:
+                # se conserva el reporte de la carga que la registró
+                previos = st.session_state.cambios_nomina
+                if not (cambios.repetida and previos and previos[0] == espacio and previos[1].version == cambios.version):
+                    st.session_state.cambios_nomina = (espacio, cambios)
+
+            colegio = espacio or f"sesion-{st.session_state.sesion_id[:8]}"
+            st.session_state.nomina_clave = registro.publicar(st.session_state.sesion_id, colegio, df, notas_areas)
+            st.session_state.archivo_id = clave_archivo
             st.session_state.nivel_educativo = nivel_educativo
 
-            st.markdown(f"""
-            <div class="success-box">
-                <h4>✅ Archivo cargado correctamente</h4>
-                <p>Se procesaron {len(df)} registros de estudiantes.</p>
-            </div>
-            """, unsafe_allow_html=True)
-
         except Exception as e:
             st.markdown(f"""
             <div class="error-box">
@@ -416,45 +681,123 @@ else:
             """, unsafe_allow_html=True)
             st.stop()
 
-# --- Procesamiento de datos ---
-if st.session_state.df is not None:
-    df = st.session_state.df.copy()
-
-    # Determinar parámetros según nivel educativo
-    def get_params(row):
-        if "Primaria" in str(row["Grado"]):
-            return nota_minima_prim, usar_letras_prim
-        elif "Secundaria" in str(row["Grado"]):
-            return nota_minima_sec, usar_letras_sec
-        else:
-            return (nota_minima_prim, usar_letras_prim) if nivel_educativo == "Primaria" else (nota_minima_sec, usar_letras_sec)
+    if uploaded_file:
+        st.markdown(f"""
+        <div class="success-box">
+            <h4>✅ Archivo cargado correctamente</h4>
+            <p>Se procesaron {len(df)} registros de estudiantes.{" La asistencia se calculó desde el registro diario." if "Asistencia_Bim1" in df.columns else ""}</p>
+        </div>
+        """, unsafe_allow_html=True)
 
-    # Calcular promedio y estado
-    df["Promedio"] = df[["Bim1", "Bim2", "Bim3", "Bim4"]].mean(axis=1).round(1)
+        duplicados = st.session_state.duplicados_nomina
+        if duplicados is not None and len(duplicados):
+            st.warning(f"⚠️ {duplicados['Grupo'].nunique()} estudiantes parecen estar registrados más de una vez "
+                       "(mismo DNI escrito distinto, o el mismo nombre con otras tildes o faltas de ortografía)")
+            with st.expander("👥 Posibles registros duplicados"):
+                st.caption("Fila_Archivo cuenta el encabezado como fila 1, igual que Excel")
+                st.dataframe(
+                    duplicados.assign(Fila=duplicados["Fila"] + 2).rename(columns={"Fila": "Fila_Archivo"}),
+                    use_container_width=True, hide_index=True
+                )
 
-    # Aplicar criterios por nivel educativo
-    df["Nota_Minima"] = df.apply(
-        lambda row: nota_minima_prim if "Primaria" in str(row["Grado"]) else nota_minima_sec,
-        axis=1
-    )
+        if carga_incremental and st.session_state.cambios_nomina and st.session_state.cambios_nomina[0] == espacio:
+            colegio_cambios, cambios = st.session_state.cambios_nomina
+            with st.expander("🔄 Cambios respecto a la carga anterior", expanded=True):
+                if cambios.repetida:
+                    st.success(f"✅ Esta nómina coincide con la versión {cambios.version} ya registrada: "
+                               "no se creó una versión nueva")
+                elif cambios.primera:
+                    st.info("ℹ️ Primera carga registrada para este colegio: las próximas cargas se compararán con esta versión")
+                elif not len(cambios):
+                    st.success(f"✅ Sin cambios respecto a la carga anterior ({cambios.sin_cambios} estudiantes)")
+                else:
+                    reporte = obtener_reporte_cambios(
+                        colegio_cambios, cambios.version, cambios,
+                        nota_minima_prim, nota_minima_sec, asistencia_minima
+                    )
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Nuevos", len(cambios.insertados))
+                    col2.metric("Modificados", len(cambios.modificados))
+                    col3.metric("Retirados", len(cambios.eliminadas))
+                    col4.metric("Sin cambios", cambios.sin_cambios)
+                    if reporte["bimestres_nuevos"]:
+                        st.info("📅 Notas nuevas: " + ", ".join(
+                            f"{bim} ({n} estudiantes)" for bim, n in reporte["bimestres_nuevos"].items()
+                        ))
+
+                    st.markdown(f"##### 🚨 Nuevos en riesgo ({len(reporte['nuevos_en_riesgo'])})")
+                    if len(reporte["nuevos_en_riesgo"]):
+                        st.dataframe(
+                            reporte["nuevos_en_riesgo"][["Situacion", "Estudiante", "DNI", "Grado", "Seccion",
+                                                         "Promedio_Actual", "Proyectado", "Alertas"]],
+                            use_container_width=True, hide_index=True
+                        )
+                    st.markdown(f"##### ✏️ Correcciones de notas y asistencia ({len(reporte['correcciones'])})")
+                    if len(reporte["correcciones"]):
+                        st.dataframe(reporte["correcciones"], use_container_width=True, hide_index=True)
+                    if len(reporte["datos"]):
+                        st.markdown(f"##### 🪪 Cambios en los datos del estudiante ({len(reporte['datos'])})")
+                        st.dataframe(reporte["datos"], use_container_width=True, hide_index=True)
+                    if len(reporte["reingresos"]):
+                        st.markdown(f"##### 🔁 Posibles mismos estudiantes con otro DNI ({len(reporte['reingresos'])})")
+                        st.caption("Figuran como retirados y nuevos a la vez: revise si el DNI se escribió mal en alguna de las cargas")
+                        st.dataframe(reporte["reingresos"], use_container_width=True, hide_index=True)
+                    if len(reporte["eliminados"]):
+                        st.markdown(f"##### 👋 Retirados de la nómina ({len(reporte['eliminados'])})")
+                        st.dataframe(reporte["eliminados"], use_container_width=True, hide_index=True)
+    elif espacio:
+        # Nóminas que otros docentes del mismo colegio (mismo código y clave) ya cargaron en este servidor
+        compartidas = registro.nominas_de(espacio)
+        if compartidas:
+            seleccion = st.selectbox(
+                "📂 O use una nómina ya cargada en su institución",
+                [None] + [n["clave"] for n in compartidas],
+                format_func=lambda clave: "Seleccione una nómina..." if clave is None else next(
+                    f"{n['estudiantes']} estudiantes - cargada a las {datetime.datetime.fromtimestamp(n['cargado']).strftime('%H:%M')}"
+                    for n in compartidas if n["clave"] == clave
+                ),
+                key="nomina_compartida_select"
+            )
+            if seleccion is not None and seleccion != st.session_state.nomina_clave:
+                st.session_state.nomina_clave = seleccion
+                st.session_state.archivo_id = None
 
-    df["Estado"] = np.where(
-        (df["Promedio"] >= df["Nota_Minima"]) & (df["Asistencia"] >= asistencia_minima),
-        "Aprobado", "Desaprobado"
+# --- Procesamiento de datos ---
+nomina = nomina_sesion()
+if nomina is not None:
+    # Calcular promedio, nota mínima por nivel, estado y letra (mismas reglas que el servicio HTTP).
+    # calificar devuelve una copia superficial: la nómina compartida no se modifica
+    df = calificar(
+        nomina,
+        nota_minima_prim=nota_minima_prim,
+        nota_minima_sec=nota_minima_sec,
+        asistencia_minima=asistencia_minima,
+        usar_letras_sec=usar_letras_sec
     )
 
-    # Aplicar sistema de letras según nivel
-    df["Letra"] = df.apply(
-        lambda row: convertir_a_letras(row["Promedio"], "Primaria" if "Primaria" in str(row["Grado"]) else "Secundaria"),
-        axis=1
+    notas_areas = registro.notas_areas(st.session_state.nomina_clave)
+
+    # Puesto y percentil en el colegio, el grado y la sección
+    ranking = obtener_ranking(st.session_state.nomina_clave, df)
+    columnas_ranking = ranking.columnas()
+    df = df.join(columnas_ranking)
+
+    registro.reportar_privado(
+        st.session_state.sesion_id,
+        memoria_df(df[["Promedio", "Nota_Minima", "Estado", "Letra", *columnas_ranking.columns]])
     )
 
+    # Gráficos de las dos primeras pestañas, para la instantánea de solo lectura: cada uno es una función que
+    # arma la figura pública, y solo se llama al publicar
+    graficos_instantanea = {"📊 Resumen General": [], "📈 Análisis Comparativo": []}
+
     # --- Dashboard Principal ---
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📊 Resumen General",
         "📈 Análisis Comparativo",
         "🧑‍🎓 Análisis Individual",
-        "📝 Reportes"
+        "📝 Reportes",
+        "🚨 Alerta Temprana"
     ])
 
     with tab1:
@@ -525,6 +868,7 @@ if st.session_state.df is not None:
 
         fig1.update_layout(bargap=0.1)
         st.plotly_chart(fig1, use_container_width=True)
+        graficos_instantanea["📊 Resumen General"].append(("📉 Distribución de Notas Finales", functools.partial(sin_estudiantes, fig1)))
 
         # Leyenda del gráfico
         st.markdown("""
@@ -564,6 +908,7 @@ if st.session_state.df is not None:
             fig2.add_hline(y=nota_min, line_dash="dash", line_color="red")
 
         st.plotly_chart(fig2, use_container_width=True)
+        graficos_instantanea["📊 Resumen General"].append(("🎓 Rendimiento por Grado", functools.partial(sin_estudiantes, fig2)))
 
         # Leyenda del gráfico
         st.markdown("""
@@ -606,6 +951,7 @@ if st.session_state.df is not None:
 
         fig3.add_vline(x=asistencia_minima, line_dash="dash", line_color="red")
         st.plotly_chart(fig3, use_container_width=True)
+        graficos_instantanea["📊 Resumen General"].append(("📅 Relación Asistencia vs Rendimiento", functools.partial(sin_estudiantes, fig3)))
 
         # Leyenda del gráfico
         st.markdown("""
@@ -666,6 +1012,7 @@ if st.session_state.df is not None:
             marker=dict(size=10)
         )
         st.plotly_chart(fig4, use_container_width=True)
+        graficos_instantanea["📈 Análisis Comparativo"].append(("📅 Evolución Bimestral (Promedio)", functools.partial(go.Figure, fig4)))
 
         # Leyenda del gráfico
         st.markdown("""
@@ -716,6 +1063,7 @@ if st.session_state.df is not None:
                 )
 
             st.plotly_chart(fig5, use_container_width=True)
+            graficos_instantanea["📈 Análisis Comparativo"].append(("🔠 Distribución por Sistema de Letras", functools.partial(go.Figure, fig5)))
 
             # Leyenda del gráfico
             st.markdown("""
@@ -743,16 +1091,28 @@ if st.session_state.df is not None:
             </div>
             """, unsafe_allow_html=True)
 
-        # Nuevo Gráfico 6: Top 5 estudiantes
-        st.markdown("#### 🏆 Top 5 Mejores Estudiantes por Grado")
+        # Nuevo Gráfico 6: Orden de mérito
+        st.markdown("#### 🏆 Orden de Mérito")
+
+        ambitos = {"Colegio": "Todo el colegio", "Grado": "Por grado", "Seccion": "Por grado y sección"}
+        cols_rank = st.columns(3)
+        with cols_rank[0]:
+            nivel_rank = st.selectbox("Ámbito", ranking.niveles(), format_func=ambitos.get, key="ranking_nivel")
+        with cols_rank[1]:
+            grupo_rank = "Todos" if nivel_rank == "Colegio" else st.selectbox(
+                "Grupo",
+                ranking.grupos(nivel_rank),
+                format_func=lambda g: " - ".join(map(str, g)) if isinstance(g, tuple) else str(g),
+                key="ranking_grupo"
+            )
+        with cols_rank[2]:
+            extremo = st.radio("Mostrar", ["Mejores", "Requieren apoyo"], horizontal=True, key="ranking_extremo")
+        k_rank = st.slider("Cantidad de estudiantes", min_value=3, max_value=20, value=5, key="ranking_k")
 
-        if nivel_educativo == "Ambos":
-            top_estudiantes = pd.concat([
-                df[df["Grado"].str.contains("Primaria")].nlargest(5, "Promedio"),
-                df[df["Grado"].str.contains("Secundaria")].nlargest(5, "Promedio")
-            ])
+        if extremo == "Mejores":
+            top_estudiantes = df.loc[ranking.top(nivel_rank, grupo_rank, k_rank)]
         else:
-            top_estudiantes = df.nlargest(5, "Promedio")
+            top_estudiantes = df.loc[ranking.ultimos(nivel_rank, grupo_rank, k_rank)]
 
         fig6 = px.bar(
             top_estudiantes,
@@ -761,13 +1121,28 @@ if st.session_state.df is not None:
             color="Promedio",
             color_continuous_scale="Viridis",
             text="Promedio",
-            hover_data=["Grado", "Asistencia"],
-            labels={"Promedio": "Nota Promedio"},
-            facet_col="Grado" if nivel_educativo == "Ambos" else None
+            hover_data=["Grado", "Asistencia", f"Puesto_{nivel_rank}", f"Percentil_{nivel_rank}"],
+            labels={"Promedio": "Nota Promedio", f"Puesto_{nivel_rank}": "Puesto", f"Percentil_{nivel_rank}": "Percentil"}
         )
         fig6.update_traces(texttemplate='%{text:.1f}', textposition='outside')
         fig6.update_layout(yaxis_range=[0, 20])
         st.plotly_chart(fig6, use_container_width=True)
+        # La instantánea es pública: el orden de mérito se publica agregado por grado, sin nombres
+        def merito_por_grado():
+            merito_grados = df.groupby("Grado", as_index=False)["Promedio"].mean().sort_values("Promedio", ascending=False)
+            fig6_publica = px.bar(
+                merito_grados,
+                x="Grado",
+                y="Promedio",
+                color="Promedio",
+                color_continuous_scale="Viridis",
+                text="Promedio",
+                labels={"Promedio": "Nota Promedio"}
+            )
+            fig6_publica.update_traces(texttemplate='%{text:.1f}', textposition='outside')
+            fig6_publica.update_layout(yaxis_range=[0, 20])
+            return fig6_publica
+        graficos_instantanea["📈 Análisis Comparativo"].append(("🏆 Promedio por Grado", merito_por_grado))
 
         # Leyenda del gráfico
         st.markdown("""
@@ -778,6 +1153,94 @@ if st.session_state.df is not None:
                 <li>Analice si hay correlación con asistencia, conducta u otros factores</li>
                 <li>Considere crear grupos de tutoría donde los mejores apoyen a otros</li>
                 <li>Reconozca públicamente los logros para motivar a todos</li>
+                <li><strong>Desempate:</strong> a igual promedio se ubica primero quien tiene mejor nota en el Bim4, luego Bim3, Bim2, Bim1 y asistencia; si todo coincide, comparten el puesto</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
+
+        # Nuevo Gráfico 7: Rendimiento por área curricular
+        if notas_areas is not None:
+            st.markdown("#### 📚 Rendimiento por Área Curricular")
+            promedios_area = obtener_promedios_area(st.session_state.nomina_clave, notas_areas, df["Grado"].to_numpy())
+            grado_area = st.selectbox(
+                "Grado",
+                ["Todos"] + sorted(df["Grado"].unique()),
+                format_func=lambda g: "Todos los grados" if g == "Todos" else g,
+                key="areas_grado"
+            )
+            tabla_area = (
+                promedios_area[promedios_area["Grupo"] == grado_area]
+                .pivot(index="Area", columns="Bimestre", values="Nota")
+                .reindex(index=[a for a in notas_areas.areas if a in set(promedios_area.loc[promedios_area["Grupo"] == grado_area, "Area"])])
+            )
+            fig_areas = px.imshow(
+                tabla_area,
+                color_continuous_scale="RdYlGn",
+                zmin=0,
+                zmax=20,
+                text_auto=".1f",
+                aspect="auto",
+                labels={"color": "Promedio", "x": "Bimestre", "y": "Área"}
+            )
+            st.plotly_chart(fig_areas, use_container_width=True)
+
+            st.markdown("""
+            <div class="legend">
+                <h4>📌 Interpretación del gráfico:</h4>
+                <ul>
+                    <li>Cada celda es el promedio de todos los estudiantes en esa área y bimestre</li>
+                    <li>Filas en <span style="color:#F44336;font-weight:bold;">rojo</span> señalan áreas que requieren refuerzo en todo el grado</li>
+                    <li>Las notas bimestrales generales de cada estudiante son el promedio de sus áreas</li>
+                </ul>
+            </div>
+            """, unsafe_allow_html=True)
+
+        # Nuevo Gráfico 8: Simulador de umbrales
+        st.markdown("#### 🔬 Simulador de Umbrales (¿Qué pasaría si...?)")
+
+        simulador = construir_simulador(
+            df["Promedio"].to_numpy(), df["Asistencia"].to_numpy(), df["Grado"].to_numpy()
+        )
+        grado_sim = st.selectbox(
+            "Grado a simular",
+            ["Todos los grados"] + list(simulador.grados),
+            key="simulador_grado"
+        )
+        grado_tabla = None if grado_sim == "Todos los grados" else grado_sim
+
+        fig_sim = px.imshow(
+            simulador.tabla(grado_tabla),
+            color_continuous_scale="RdYlGn",
+            zmin=0,
+            zmax=100,
+            origin="lower",
+            aspect="auto",
+            labels={"color": "% Aprobación"}
+        )
+
+        # Marcar el escenario configurado actualmente en el panel izquierdo
+        if grado_tabla is not None or nivel_educativo != "Ambos":
+            nivel_sim = grado_sim if grado_tabla is not None else nivel_educativo
+            nota_actual = nota_minima_prim if "Primaria" in nivel_sim else nota_minima_sec
+            fig_sim.add_scatter(
+                x=[asistencia_minima],
+                y=[nota_actual],
+                mode="markers",
+                marker=dict(symbol="x", size=14, color="black"),
+                name="Escenario actual",
+                hovertemplate=f"Actual: {simulador.consultar(nota_actual, asistencia_minima, grado_tabla):.1f}% aprobados<extra></extra>"
+            )
+        st.plotly_chart(fig_sim, use_container_width=True)
+
+        # Leyenda del gráfico
+        st.markdown("""
+        <div class="legend">
+            <h4>📌 Cómo usar el simulador:</h4>
+            <ul>
+                <li>Cada celda muestra el % de estudiantes que aprobaría con esa nota mínima (eje vertical) y esa asistencia mínima (eje horizontal)</li>
+                <li>La <strong>X negra</strong> marca los parámetros configurados en el panel izquierdo</li>
+                <li>Zonas <span style="color:#F44336;font-weight:bold;">rojas</span> indican umbrales con alta desaprobación</li>
+                <li>Un cambio brusco de color entre celdas vecinas indica muchos estudiantes cerca del límite</li>
             </ul>
         </div>
         """, unsafe_allow_html=True)
@@ -785,13 +1248,23 @@ if st.session_state.df is not None:
     with tab3:
         st.markdown("### 🧑‍🎓 Análisis Individual")
 
-        estudiante = st.selectbox(
+        # Se elige por fila de la nómina (no por nombre): dos homónimos son dos estudiantes distintos
+        etiquetas_estudiante = (df["Estudiante"].astype(str) + " · DNI " + df["DNI"].astype(str)).to_numpy()
+        fila_estudiante = st.selectbox(
             "Seleccione un estudiante",
-            df["Estudiante"].unique(),
+            range(len(df)),
+            format_func=lambda fila: etiquetas_estudiante[fila],
             key="estudiante_select"
         )
 
-        datos = df[df["Estudiante"] == estudiante].iloc[0]
+        datos = df.iloc[fila_estudiante]
+
+        # Asistencia por bimestre cuando se calculó desde el registro diario
+        detalle_asistencia = " · ".join(
+            f"{b}: {datos[f'Asistencia_{b}']:.0f}%"
+            for b in calificacion.BIMESTRES if pd.notna(datos.get(f"Asistencia_{b}"))
+        )
+        detalle_asistencia = f" ({detalle_asistencia})" if detalle_asistencia else ""
 
         # Tarjeta de resumen
         st.markdown(f"""
@@ -799,12 +1272,22 @@ if st.session_state.df is not None:
             <h3 style="color: #1f3c73;">{datos['Estudiante']}</h3>
             <p><strong>📋 DNI:</strong> {datos['DNI']} | <strong>🎓 Grado:</strong> {datos['Grado']}</p>
             <p><strong>📊 Promedio:</strong> {datos['Promedio']:.1f} {f"({datos['Letra']})" if datos['Letra'] != '-' else ""} |
-            <strong>📅 Asistencia:</strong> {datos['Asistencia']}%</p>
+            <strong>📅 Asistencia:</strong> {datos['Asistencia']}%{detalle_asistencia}</p>
             <p><strong>✅ Estado:</strong> <span style="color: {'#4CAF50' if datos['Estado'] == 'Aprobado' else '#F44336'}">{datos['Estado']}</span></p>
             <p><strong>📝 Conducta:</strong> {datos.get('Conducta', 'No registrada')}</p>
+            <p><strong>🏅 Orden de mérito:</strong> {datos['Puesto_Grado']}° en su grado (percentil {datos['Percentil_Grado']:.0f}) |
+            {datos['Puesto_Colegio']}° en el colegio</p>
         </div>
         """, unsafe_allow_html=True)
 
+        # Notas por área curricular del estudiante
+        if notas_areas is not None:
+            st.markdown("#### 📚 Notas por Área Curricular")
+            st.dataframe(
+                notas_areas.tabla(fila_estudiante).style.format("{:.1f}", na_rep="-"),
+                use_container_width=True
+            )
+
         # Gráfico 7: Evolución individual
         st.markdown("#### 📶 Evolución Bimestral Individual")
         fig7 = go.Figure()
@@ -816,7 +1299,7 @@ if st.session_state.df is not None:
             name="Notas",
             line=dict(color="#1f3c73", width=3),
             marker=dict(size=12, color="#1f3c73"),
-            text=[str(round(datos[b], 1)) for b in ["Bim1", "Bim2", "Bim3", "Bim4"]],
+            text=[str(round(datos[b], 1)) if pd.notna(datos[b]) else "" for b in ["Bim1", "Bim2", "Bim3", "Bim4"]],
             textposition="top center"
         ))
 
@@ -854,138 +1337,278 @@ if st.session_state.df is not None:
          # Análisis con Claude API
         st.markdown("#### 🧠 Análisis Pedagógico con IA")
 
+        # Un análisis ya generado (aquí o en un lote) se muestra mientras los datos no cambien
+        prompt = construir_prompt(datos)
+        clave_analisis = (str(datos["DNI"]), huella_prompt(prompt))
+        analisis = almacen_analisis.buscar([clave_analisis]).get(clave_analisis)
+        if analisis is not None:
+            st.caption("Análisis guardado previamente para las notas actuales del estudiante")
+
         if ANTHROPIC_API_KEY:
-            if st.button("Generar Análisis", key="analisis_btn"):
+            if st.button("Generar Análisis" if analisis is None else "Regenerar Análisis", key="analisis_btn"):
                 with st.spinner("Analizando con Claude AI..."):
-                    prompt = """
-                    [Texto del prompt permanece igual...]
-                    """
-
-                    headers = {
-                        "x-api-key": ANTHROPIC_API_KEY,
-                        "anthropic-version": "2023-06-01",
-                        "content-type": "application/json"
-                    }
-
-                    payload = {
-                        "model": "claude-3-haiku-20240307",
-                        "max_tokens": 2000,
-                        "messages": [{"role": "user", "content": prompt}]
-                    }
-
                     try:
-                        response = requests.post(
-                            "https://api.anthropic.com/v1/messages",
-                            headers=headers,
-                            json=payload,
-                            timeout=30
-                        )
-
-                        if response.status_code == 200:
-                            analisis = response.json()["content"][0]["text"]
-                            # Solución alternativa para evitar problemas con f-strings
-                            html_content = f"""
-                            <div style="background-color: #e8f5e9; border-radius: 10px; padding: 15px; margin-top: 20px;">
-                                <h4 style="color: #1f3c73;">🔍 Análisis Generado:</h4>
-                                <div style="white-space: pre-wrap;">{analisis}</div>
-                            </div>
-                            """
-                            st.markdown(html_content, unsafe_allow_html=True)
-                        else:
-                            st.error(f"Error al conectar con la API de Claude. Código: {response.status_code}")
+                        analisis = solicitar_analisis(ANTHROPIC_API_KEY, prompt)
+                        almacen_analisis.guardar([(*clave_analisis, datos["Estudiante"], analisis, "directo")])
+                    except ErrorAPIClaude as e:
+                        st.error(str(e))
                     except Exception as e:
                         st.error(f"Error de conexión: {str(e)}")
-        else:
+        elif analisis is None:
             st.warning("Ingrese su API Key de Claude en el panel izquierdo para habilitar el análisis con IA")
 
+        if analisis is not None:
+            # Solución alternativa para evitar problemas con f-strings
+            html_content = f"""
+            <div style="background-color: #e8f5e9; border-radius: 10px; padding: 15px; margin-top: 20px;">
+                <h4 style="color: #1f3c73;">🔍 Análisis Generado:</h4>
+                <div style="white-space: pre-wrap;">{analisis}</div>
+            </div>
+            """
+            st.markdown(html_content, unsafe_allow_html=True)
+
     with tab4:
         st.markdown("### 📄 Generar Reportes")
 
+        etiquetas_estudiante = (df["Estudiante"].astype(str) + " · DNI " + df["DNI"].astype(str)).to_numpy()
         estudiantes_seleccionados = st.multiselect(
             "Seleccione estudiantes para el reporte",
-            df["Estudiante"].unique(),
+            range(len(df)),
+            format_func=lambda fila: etiquetas_estudiante[fila],
             key="reporte_select"
         )
 
         if estudiantes_seleccionados:
-            if st.button("Generar Reporte PDF", key="reporte_btn"):
-                pdf = FPDF()
-                pdf.set_auto_page_break(auto=True, margin=15)
-
-                for estudiante in estudiantes_seleccionados:
-                    datos = df[df["Estudiante"] == estudiante].iloc[0]
-
-                    pdf.add_page()
-                    pdf.set_font("Arial", 'B', 16)
-                    pdf.cell(0, 10, f"Reporte Académico - {estudiante}", 0, 1, 'C')
-                    pdf.ln(8)
-
-                    pdf.set_font("Arial", '', 12)
-                    pdf.cell(0, 10, f"Grado: {datos['Grado']} | DNI: {datos['DNI']}", 0, 1)
-                    pdf.cell(0, 10, f"Periodo: {periodo}", 0, 1)
-                    pdf.ln(10)
-
-                    # Tabla de notas
-                    pdf.set_font("Arial", 'B', 12)
-                    pdf.cell(45, 10, "Bimestre", 1, 0, 'C')
-                    pdf.cell(35, 10, "Nota (0-20)", 1, 0, 'C')
-                    if datos['Letra'] != '-':
-                        pdf.cell(35, 10, "Escala", 1, 0, 'C')
-                    pdf.ln()
-
-                    pdf.set_font("Arial", '', 12)
-                    for i, bim in enumerate(["Bim1", "Bim2", "Bim3", "Bim4"], 1):
-                        pdf.cell(45, 10, f"Bimestre {i}", 1, 0, 'C')
-                        pdf.cell(35, 10, str(datos[bim]), 1, 0, 'C')
-                        if datos['Letra'] != '-':
-                            pdf.cell(35, 10, convertir_a_letras(datos[bim], "Primaria" if "Primaria" in datos["Grado"] else "Secundaria"), 1, 0, 'C')
-                        pdf.ln()
-
-                    pdf.ln(8)
-                    pdf.set_font("Arial", 'B', 12)
-                    pdf.cell(45, 10, "Promedio Final", 0, 0)
-                    pdf.cell(35, 10, f"{datos['Promedio']:.1f}", 0, 0)
-                    if datos['Letra'] != '-':
-                        pdf.cell(35, 10, datos["Letra"], 0, 0)
-                    pdf.ln(12)
-
-                    pdf.cell(0, 10, f"Asistencia: {datos['Asistencia']}% | Estado: {datos['Estado']}", 0, 1)
-                    pdf.ln(10)
-
-                    # Recomendaciones
-                    pdf.set_font("Arial", 'B', 12)
-                    pdf.cell(0, 10, "Recomendaciones:", 0, 1)
-                    pdf.set_font("Arial", '', 12)
-
-                    if datos['Estado'] == 'Aprobado':
-                        pdf.multi_cell(0, 8, "El estudiante ha alcanzado los objetivos de aprendizaje establecidos. Se recomienda:")
-                        pdf.multi_cell(0, 8, "- Continuar con las estrategias pedagógicas actuales")
-                        pdf.multi_cell(0, 8, "- Mantener el buen desempeño y asistencia")
-                        pdf.multi_cell(0, 8, "- Proponer desafíos adicionales para alcanzar logros destacados")
+            # Los reportes se generan en segundo plano: la página sigue respondiendo y el
+            # resultado no se pierde si se cambia un filtro mientras tanto
+            cols_reporte = st.columns(2)
+            with cols_reporte[0]:
+                if st.button("Generar Reporte PDF", key="reporte_btn"):
+                    # Tablas área × bimestre de los seleccionados, en el mismo orden
+                    notas_reporte = None
+                    if notas_areas is not None:
+                        notas_reporte = (notas_areas.areas, notas_areas.matriz(estudiantes_seleccionados))
+                    cola.enviar(
+                        "Reporte PDF",
+                        f"{len(estudiantes_seleccionados)} estudiantes",
+                        trabajo_reporte_pdf,
+                        df.iloc[estudiantes_seleccionados].copy(),
+                        periodo,
+                        convertir_a_letras,
+                        notas_areas=notas_reporte,
+                        propietario=st.session_state.sesion_id
+                    )
+            with cols_reporte[1]:
+                modo_batches = st.checkbox(
+                    "Usar Message Batches",
+                    value=True,
+                    key="analisis_modo_batches",
+                    help="Envía todos los análisis en un solo lote: cuesta la mitad, pero la API puede tardar "
+                         "de minutos a horas. Los estudiantes ya analizados con las mismas notas no se reenvían."
+                )
+                if st.button("🧠 Análisis IA por lotes", key="analisis_lote_btn", disabled=not ANTHROPIC_API_KEY,
+                             help="Requiere la API Key de Claude"):
+                    seleccion = df.iloc[estudiantes_seleccionados].copy()
+                    if modo_batches:
+                        cola.enviar(
+                            "Análisis IA (lote)",
+                            f"{len(estudiantes_seleccionados)} estudiantes",
+                            trabajo_analisis_batches,
+                            ANTHROPIC_API_KEY,
+                            seleccion,
+                            seguidor_lotes,
+                            propietario=st.session_state.sesion_id
+                        )
                     else:
-                        pdf.multi_cell(0, 8, "El estudiante requiere apoyo en las siguientes áreas:")
-                        pdf.multi_cell(0, 8, "- Asistir a sesiones de reforzamiento en los bimestres con menor rendimiento")
-                        pdf.multi_cell(0, 8, "- Implementar estrategias de aprendizaje personalizadas")
-                        pdf.multi_cell(0, 8, "- Mejorar hábitos de estudio y participación en clase")
-                        pdf.multi_cell(0, 8, "- Revisar causas de inasistencia si aplica")
+                        cola.enviar(
+                            "Análisis IA",
+                            f"{len(estudiantes_seleccionados)} estudiantes",
+                            trabajo_analisis_lote,
+                            ANTHROPIC_API_KEY,
+                            seleccion,
+                            almacen_analisis,
+                            propietario=st.session_state.sesion_id
+                        )
+        else:
+            st.warning("Seleccione al menos un estudiante para generar el reporte")
 
-                    pdf.ln(15)
+        # Trabajos en segundo plano de esta sesión
+        trabajos_sesion = cola.listar(propietario=st.session_state.sesion_id)
+        if trabajos_sesion:
+            st.markdown("#### ⏳ Trabajos en segundo plano")
+            st.button("🔄 Actualizar estado", key="trabajos_refrescar")
+            for trabajo in trabajos_sesion:
+                creado = datetime.datetime.fromtimestamp(trabajo["creado"]).strftime("%H:%M:%S")
+                titulo = f"**{trabajo['tipo']}** ({trabajo['descripcion']}) - {creado}"
+                if trabajo["estado"] in ESTADOS_ACTIVOS:
+                    st.progress(trabajo["progreso"], text=f"{titulo}: {trabajo['mensaje'] or trabajo['estado']}")
+                elif trabajo["estado"] == "terminado":
+                    # El resultado se lee de la base de datos recién al hacer clic en descargar
+                    datos_trabajo = functools.partial(cola.datos_resultado, trabajo["id"])
+                    st.download_button(
+                        label=f"⬇️ {trabajo['tipo']} - {creado}",
+                        data=datos_trabajo if DESCARGA_DIFERIDA else datos_trabajo(),
+                        file_name=trabajo["nombre_archivo"],
+                        mime=trabajo["mime"],
+                        key=f"trabajo_{trabajo['id']}"
+                    )
+                elif trabajo["estado"] == "error":
+                    st.error(f"{titulo}: {trabajo['error'].splitlines()[0]}")
+                else:
+                    st.warning(f"{titulo}: interrumpido por un reinicio del servidor")
 
-                # Generar PDF
-                pdf_bytes = pdf.output(dest='S').encode('latin1')
+        # Exportación de la nómina calificada completa
+        st.markdown("---")
+        st.markdown("#### 📥 Exportar Resultados")
+        st.caption("Nómina calificada (Promedio, Letra y Estado). En Excel se genera una hoja por Grado/Sección y se resaltan los desaprobados.")
+
+        fecha_export = datetime.datetime.now().strftime('%Y%m%d')
+        cols_export = st.columns(2)
+        with cols_export[0]:
+            st.download_button(
+                label="⬇️ Descargar CSV",
+                data=exportar_csv_cache(df),
+                file_name=f"nomina_calificada_{fecha_export}.csv",
+                mime="text/csv",
+                key="export_csv_btn"
+            )
+        with cols_export[1]:
+            # El Excel se genera solo a pedido: en nóminas grandes toma más tiempo que el CSV
+            if st.button("📊 Preparar Excel", key="export_xlsx_prep"):
+                with st.spinner("Generando archivo Excel..."):
+                    xlsx_bytes = exportar_excel_cache(df)
                 st.download_button(
-                    label="⬇️ Descargar Reporte Completo",
-                    data=pdf_bytes,
-                    file_name=f"reporte_academico_{datetime.datetime.now().strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf",
-                    help="Descargue el reporte en formato PDF para imprimir o compartir"
+                    label="⬇️ Descargar Excel",
+                    data=xlsx_bytes,
+                    file_name=f"nomina_calificada_{fecha_export}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="export_xlsx_btn"
+                )
+
+        # Instantánea estática para directivos y familias
+        st.markdown("---")
+        st.markdown("#### 📸 Instantánea de Solo Lectura")
+        st.caption("Publica el Resumen General y el Análisis Comparativo como una página estática: quienes solo consultan "
+                   "la ven sin recalcular nada. Solo se regenera si cambian la nómina o los parámetros.")
+        token_publicado = token_instantanea(DIRECTORIO_INSTANTANEAS, espacio) if espacio else None
+        cols_instantanea = st.columns(2)
+        with cols_instantanea[0]:
+            publicar = st.button("📸 Publicar instantánea", key="instantanea_btn", disabled=not espacio,
+                                 help="Requiere el código modular y la clave del colegio")
+        with cols_instantanea[1]:
+            if st.button("🔄 Renovar enlace", key="instantanea_renovar", disabled=not token_publicado,
+                         help="Borra la instantánea publicada: el enlace anterior deja de funcionar"):
+                token_publicado = renovar_token(DIRECTORIO_INSTANTANEAS, espacio)
+                st.info("ℹ️ Enlace renovado: vuelva a publicar la instantánea")
+        if publicar:
+            token_publicado = token_publicado or renovar_token(DIRECTORIO_INSTANTANEAS, espacio)
+            huella = huella_instantanea(st.session_state.nomina_clave, {
+                "nota_minima_prim": nota_minima_prim, "nota_minima_sec": nota_minima_sec,
+                "asistencia_minima": asistencia_minima, "usar_letras_prim": usar_letras_prim,
+                "usar_letras_sec": usar_letras_sec, "nivel": nivel_educativo
+            })
+            metricas = [
+                ("Total Estudiantes", str(len(df))),
+                ("% Aprobación", f"{(df['Estado'] == 'Aprobado').mean() * 100:.1f}%"),
+                ("Nota Promedio", f"{df['Promedio'].mean():.1f}"),
+                ("Asistencia Prom.", f"{df['Asistencia'].mean():.1f}%")
+            ]
+            with st.spinner("Generando instantánea..."):
+                _, regenerada = publicar_instantanea(
+                    DIRECTORIO_INSTANTANEAS, token_publicado, huella,
+                    lambda: generar_html(f"Dashboard Escolar - {codigo_colegio}", metricas, {
+                        seccion: [(titulo, figura_publica()) for titulo, figura_publica in graficos]
+                        for seccion, graficos in graficos_instantanea.items()
+                    }, huella)
                 )
+            st.success("✅ Instantánea publicada" if regenerada else "✅ La instantánea publicada ya está al día")
+        ruta_publicada = os.path.join(DIRECTORIO_INSTANTANEAS, nombre_archivo(token_publicado)) if token_publicado else None
+        if ruta_publicada and os.path.exists(ruta_publicada):
+            st.markdown(f"Enlace de consulta: `?instantanea={token_publicado}` (agregar a la dirección de esta aplicación). "
+                        "Compártalo solo con quienes deban ver el resumen.")
+            # Sin descarga diferida, el archivo se lee una vez por versión publicada
+            st.download_button(
+                label="⬇️ Descargar instantánea (HTML)",
+                data=(functools.partial(leer_instantanea, ruta_publicada) if DESCARGA_DIFERIDA
+                      else descarga_instantanea(ruta_publicada, huella_guardada(ruta_publicada))),
+                file_name=f"instantanea_{codigo_colegio}.html",
+                mime="text/html",
+                key="instantanea_descarga"
+            )
+
+    with tab5:
+        st.markdown("### 🚨 Alerta Temprana")
+
+        # Solo se procesan los bimestres nuevos respecto a la carga anterior; con la misma nómina no se recalcula nada
+        st.session_state.motor_alertas = actualizar_motor(st.session_state.motor_alertas, df, st.session_state.nomina_clave)
+        motor = st.session_state.motor_alertas
+        evaluados = [b for b in ["Bim1", "Bim2", "Bim3", "Bim4"] if b in motor.huellas]
+        st.caption(f"Bimestres evaluados: {', '.join(evaluados)}. Las alertas se actualizan al cargar cada nuevo bimestre.")
+
+        caida_minima = st.slider(
+            "Caída que activa la alerta de tendencia (puntos por bimestre)",
+            min_value=0.5,
+            max_value=5.0,
+            value=1.0,
+            step=0.5,
+            key="caida_minima"
+        )
+
+        alertas = motor.evaluar(df["Nota_Minima"].to_numpy(), df["Asistencia"].to_numpy(), asistencia_minima, caida_minima)
+        riesgo = ranking_riesgo(df, alertas)
+
+        cols = st.columns(len(REGLAS) + 1)
+        with cols[0]:
+            st.metric("Estudiantes en riesgo", len(riesgo), f"{len(riesgo) / len(df) * 100:.1f}% del total", delta_color="off")
+        for col, regla in zip(cols[1:], REGLAS):
+            with col:
+                st.metric(regla, int(alertas[regla].sum()), help=REGLAS[regla])
+
+        if len(riesgo):
+            st.dataframe(
+                riesgo.head(500).drop(columns=list(REGLAS)),
+                hide_index=True,
+                use_container_width=True
+            )
+            if len(riesgo) > 500:
+                st.caption(f"Se muestran los 500 casos de mayor riesgo de {len(riesgo)}. Descargue la lista completa.")
+            st.download_button(
+                label="⬇️ Descargar lista de riesgo (CSV)",
+                data=exportar_csv(riesgo, columnas=list(riesgo.columns)),
+                file_name=f"alerta_temprana_{datetime.datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv",
+                key="alertas_csv_btn"
+            )
         else:
-            st.warning("Seleccione al menos un estudiante para generar el reporte")
+            st.success("No hay estudiantes con alertas activas")
+
+        # Leyenda
+        st.markdown("""
+        <div class="legend">
+            <h4>📌 Reglas de alerta:</h4>
+            <ul>
+                <li><strong>Irrecuperable:</strong> ni con 20 en los bimestres restantes alcanza la nota mínima</li>
+                <li><strong>Proyeccion:</strong> si sigue su tendencia actual, su promedio final quedaría bajo el mínimo</li>
+                <li><strong>Inasistencia:</strong> asistencia por debajo del mínimo configurado</li>
+                <li><strong>Tendencia:</strong> sus notas bajan bimestre a bimestre más que la caída configurada</li>
+                <li>El <strong>puntaje</strong> combina las alertas activas y la distancia al mínimo; mayor puntaje = mayor prioridad</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
 
 else:
     st.info("Por favor seleccione el modo de operación y configure los parámetros para continuar.")
 
+# --- Uso de memoria del servidor (solo administradores: lista colegios y sesiones) ---
+if es_administrador():
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("🧮 Memoria compartida del servidor"):
+            st.caption("Por colegio")
+            st.dataframe(registro.memoria_por_colegio(), hide_index=True, use_container_width=True)
+            st.caption("Por sesión")
+            st.dataframe(registro.memoria_por_sesion(), hide_index=True, use_container_width=True)
+
 # --- Pie de página ---
 st.markdown("---")
 st.markdown("""
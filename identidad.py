@@ -0,0 +1,384 @@
+"""
+Resolución de identidad de estudiantes entre nóminas y años.
+
+El DNI y los nombres se normalizan (sin tildes, signos ni separadores) y
+cada registro recibe claves de bloque: su DNI y cada par de códigos
+fonéticos de las palabras de su nombre. Solo se comparan los registros que
+comparten alguna clave, así el costo crece con el tamaño de los bloques y no
+con n²: 1M + 1M de registros se enlazan en minutos.
+
+Uso:
+    python identidad.py nomina_2024.csv nomina_2025.csv --salida enlaces.csv
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from calificacion import normalizar_dni
+
+# Palabras que no distinguen a una persona ("María de los Ángeles")
+PARTICULAS = {"DE", "DEL", "LA", "LAS", "LOS", "Y", "E", "DA", "DI", "VDA"}
+
+# Código fonético para nombres en español, sobre texto en mayúsculas y sin tildes (en orden)
+_REGLAS_FONETICAS = [
+    (r"CH", "x"),  # sonido propio: se protege en minúscula para que no lo toquen las reglas de C y H
+    (r"QU(?=[EI])", "K"),
+    (r"G(?=[EI])", "J"),
+    (r"GU(?=[EI])", "G"),
+    (r"C(?=[EI])", "S"),
+    (r"LL", "Y"),
+    (r"^X", "J"),
+    (r"X", "KS"),
+    (r"H", ""),
+    (r"W", "U"),
+    (r"[CQ]", "K"),
+    (r"V", "B"),
+    (r"Z", "S"),
+    (r"Y(?![AEIOU])", "I"),
+    (r"(.)\1+", r"\1"),
+]
+
+# Decisiones sobre un par candidato
+MISMO_DNI = "Mismo DNI"
+DNI_UN_DIGITO = "DNI con un dígito distinto"
+DNI_REVISAR = "DNI con un dígito distinto (revisar)"
+SOLO_NOMBRE = "Nombre (sin DNI válido)"
+CONFLICTO = "Mismo DNI con nombre distinto"
+AMBIGUO = "Nombre coincide con varios DNI"
+
+
+def normalizar_nombre(valores):
+    """Nombre en mayúsculas, sin tildes ni signos y con espacios simples (se calcula por valor distinto)"""
+    codigos, unicos = pd.factorize(pd.Series(valores).fillna("").astype(str))
+    texto = (
+        pd.Series(unicos, dtype=object).str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.upper().str.replace(r"[^A-Z]+", " ", regex=True).str.strip()
+    )
+    return pd.Series(np.append(texto.to_numpy(dtype=object), "")[codigos], index=getattr(valores, "index", None))
+
+
+def codigo_fonetico(palabras):
+    """Código fonético de cada palabra: Vásquez/Vazquez/Basques o Huamán/Wamán dan el mismo código"""
+    codigo = pd.Series(palabras, dtype=object)
+    for patron, reemplazo in _REGLAS_FONETICAS:
+        codigo = codigo.str.replace(patron, reemplazo, regex=True)
+    return codigo
+
+
+def dni_valido(dni):
+    """DNI de 8 dígitos que no sea de relleno (00000000, 11111111...)"""
+    dni = pd.Series(dni, dtype=object).fillna("")
+    return (dni.str.fullmatch(r"\d{8}") & ~dni.str.fullmatch(r"(\d)\1{7}")).to_numpy(dtype=bool)
+
+
+def _trigramas(palabras):
+    """Hash de los trigramas de cada palabra (con bordes), como arreglos CSR: (inicios, hashes)"""
+    gramas, largos = [], []
+    for palabra in palabras:
+        p = f" {palabra} "
+        nuevos = [p[i:i + 3] for i in range(len(p) - 2)]
+        gramas += nuevos
+        largos.append(len(nuevos))
+    hashes = pd.util.hash_array(np.array(gramas, dtype=object)) if gramas else np.zeros(0, dtype=np.uint64)
+    # Desplazamientos enteros también sin palabras (np.cumsum de una lista vacía es float)
+    inicios = np.zeros(len(largos) + 1, dtype=np.int64)
+    np.cumsum(largos, out=inicios[1:])
+    return inicios, hashes
+
+
+def _expandir(inicios, elementos):
+    """Índices de los elementos de varias filas CSR concatenados: (posición de la fila, índice)"""
+    elementos = np.asarray(elementos, dtype=np.int64)
+    largos = inicios[elementos + 1] - inicios[elementos]
+    posicion = np.repeat(np.arange(len(elementos)), largos)
+    indices = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos) + np.repeat(inicios[elementos], largos)
+    return posicion, indices
+
+
+def _componentes(n, a, b):
+    """Componentes conexas de los enlaces (a, b): etiqueta = menor índice de la componente"""
+    etiqueta = np.arange(n)
+    while True:
+        menor = np.minimum(etiqueta[a], etiqueta[b])
+        nueva = etiqueta.copy()
+        np.minimum.at(nueva, a, menor)
+        np.minimum.at(nueva, b, menor)
+        # Salto de punteros: cada nodo apunta directo a la menor etiqueta conocida
+        nueva = nueva[nueva]
+        if (nueva == etiqueta).all():
+            return etiqueta
+        etiqueta = nueva
+
+
+class IndiceIdentidad:
+    """
+    Índice de bloques para enlazar registros de estudiantes sin comparar todos contra todos.
+
+    Los nombres se procesan por valor distinto: las palabras se reducen a
+    códigos fonéticos y cada nombre genera una clave por par de códigos
+    (tolera el orden de nombres y apellidos, un segundo nombre omitido y una
+    falta de ortografía en una palabra). Los bloques más grandes que
+    `max_bloque` (nombres muy comunes) se descartan: un mismo estudiante
+    comparte además claves más raras. La similitud de nombres es el Jaccard
+    de los trigramas fonéticos estimado con MinHash, así la comparación de
+    millones de pares es una operación vectorizada.
+
+    `origen` indica la nómina de cada registro: un DNI con un dígito distinto
+    solo se toma como error de tipeo entre nóminas distintas (sin `origen`,
+    todos los registros son de la misma nómina).
+    """
+
+    def __init__(self, dni, nombre, max_bloque=100, permutaciones=32, semilla=0, origen=None):
+        self.n = len(dni)
+        self.max_bloque = max_bloque
+        self.origen = np.zeros(self.n, dtype=np.int64) if origen is None else pd.factorize(pd.Series(origen))[0]
+        self.dni = normalizar_dni(pd.Series(dni, dtype=object).reset_index(drop=True)).to_numpy(dtype=object)
+        self.nombre = normalizar_nombre(pd.Series(nombre, dtype=object).reset_index(drop=True)).to_numpy(dtype=object)
+        self.dni_valido = dni_valido(self.dni)
+        # Dígitos del DNI como matriz (registros × 8) para contar diferencias sin recorrer los pares
+        self.digitos = np.zeros((self.n, 8), dtype=np.uint8)
+        self.digitos[self.dni_valido] = np.frombuffer(
+            "".join(self.dni[self.dni_valido]).encode("ascii"), dtype=np.uint8
+        ).reshape(-1, 8)
+
+        # Nombres distintos → palabras → códigos fonéticos (cada paso sobre valores únicos)
+        self.codigo_nombre, nombres = pd.factorize(self.nombre)
+        palabras = pd.Series(nombres, dtype=object).str.split().explode()
+        palabras = palabras[palabras.str.len().ge(2) & ~palabras.isin(PARTICULAS)]
+        codigo_palabra, palabras_unicas = pd.factorize(palabras)
+        codigo_fon, fonemas = pd.factorize(codigo_fonetico(palabras_unicas))
+        pares = pd.DataFrame({
+            "nombre": palabras.index.to_numpy(dtype=np.int64), "fonema": codigo_fon[codigo_palabra].astype(np.int64)
+        }).drop_duplicates().sort_values(["nombre", "fonema"])
+        self._nombre_fonemas = (pares["nombre"].to_numpy(), pares["fonema"].to_numpy())
+        self.n_nombres, self.n_fonemas = len(nombres), len(fonemas)
+
+        self.firmas = self._minhash(fonemas, permutaciones, semilla)
+
+    def _minhash(self, fonemas, permutaciones, semilla):
+        """Firma MinHash (nombres distintos × permutaciones) de los trigramas fonéticos de cada nombre"""
+        firmas = np.full((self.n_nombres, permutaciones), np.iinfo(np.uint32).max, dtype=np.uint32)
+        # Sin códigos fonéticos (nómina vacía o solo iniciales) todas las firmas quedan vacías
+        if not len(fonemas):
+            return firmas
+        inicios, hashes = _trigramas(fonemas)
+        nombre, fonema = self._nombre_fonemas
+        posicion, indices = _expandir(inicios, fonema)
+        nombre_grama, grama = nombre[posicion], hashes[indices]
+        if not len(grama):
+            return firmas
+        # Los trigramas están agrupados por nombre: el mínimo de cada tramo es un reduceat
+        cortes = np.flatnonzero(np.r_[True, nombre_grama[1:] != nombre_grama[:-1]])
+        azar = np.random.default_rng(semilla).integers(1, 2 ** 63, size=(permutaciones, 2), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for k, (mezcla, multiplicador) in enumerate(azar):
+                h = ((grama ^ mezcla) * (multiplicador | np.uint64(1))) >> np.uint64(32)
+                firmas[nombre_grama[cortes], k] = np.minimum.reduceat(h, cortes).astype(np.uint32)
+        return firmas
+
+    def claves(self):
+        """Claves de bloque de cada registro en formato largo: (registro, clave entera)"""
+        # Pares de fonemas de cada nombre distinto (un nombre de 4 palabras genera 6 claves)
+        nombre, fonema = self._nombre_fonemas
+        clave_nombre, clave = [], []
+        for salto in range(1, 8):
+            mismo = nombre[salto:] == nombre[:-salto]
+            if not mismo.any():
+                break
+            clave_nombre.append(nombre[salto:][mismo])
+            clave.append(fonema[:-salto][mismo].astype(np.int64) * self.n_fonemas + fonema[salto:][mismo])
+        # Nombre completo (conjunto de fonemas): bloque chico aunque todos sus pares sean comunes.
+        # Hash del conjunto ordenado, como clave negativa para no chocar con las demás
+        if len(nombre):
+            cortes = np.flatnonzero(np.r_[True, nombre[1:] != nombre[:-1]])
+            posicion = np.minimum(np.arange(len(nombre)) - np.repeat(cortes, np.diff(np.r_[cortes, len(nombre)])), 15)
+            pesos = np.random.default_rng(1).integers(1, 2 ** 63, 16, dtype=np.uint64) | np.uint64(1)
+            with np.errstate(over="ignore"):
+                completo = np.add.reduceat((fonema.astype(np.uint64) + np.uint64(1)) * pesos[posicion], cortes)
+            clave_nombre.append(nombre[cortes])
+            clave.append(-(completo >> np.uint64(1)).astype(np.int64) - 1)
+        clave_nombre = np.concatenate(clave_nombre) if clave_nombre else np.zeros(0, dtype=np.int64)
+        clave = np.concatenate(clave) if clave else np.zeros(0, dtype=np.int64)
+
+        # Registros → claves de su nombre
+        orden = np.argsort(clave_nombre, kind="stable")
+        clave_nombre, clave = clave_nombre[orden], clave[orden]
+        inicios = np.searchsorted(clave_nombre, np.arange(self.n_nombres + 1))
+        registros = np.flatnonzero(self.codigo_nombre >= 0)
+        posicion, indices = _expandir(inicios, self.codigo_nombre[registros])
+        registro, clave = registros[posicion], clave[indices]
+
+        # DNI válido: clave propia, en un rango que no choca con las de nombre
+        con_dni = np.flatnonzero(self.dni_valido)
+        clave_dni = self.n_fonemas ** 2 + self.dni[con_dni].astype(np.int64)
+        return np.r_[registro, con_dni], np.r_[clave, clave_dni]
+
+    def candidatos(self):
+        """Pares (a, b) con a < b que comparten algún bloque de tamaño permitido"""
+        registro, clave = self.claves()
+        orden = np.lexsort((registro, clave))
+        registro, clave = registro[orden], clave[orden]
+        inicio_bloque = np.r_[True, clave[1:] != clave[:-1]]
+        id_bloque = np.cumsum(inicio_bloque) - 1
+        tamano = np.bincount(id_bloque)[id_bloque]
+        util = (tamano >= 2) & (tamano <= self.max_bloque)
+        registro, id_bloque, tamano = registro[util], id_bloque[util], tamano[util]
+
+        # Todos los pares de cada bloque: cada elemento con el que está `salto` posiciones después.
+        # En cada salto solo quedan los elementos a los que aún les queda un compañero en su bloque
+        nuevo = np.r_[True, id_bloque[1:] != id_bloque[:-1]] if len(registro) else np.zeros(0, dtype=bool)
+        posicion_en_bloque = np.arange(len(registro)) - np.flatnonzero(nuevo)[np.cumsum(nuevo) - 1]
+        restantes = tamano - posicion_en_bloque - 1
+        a, b = [], []
+        posiciones = np.flatnonzero(restantes > 0)
+        salto = 1
+        while len(posiciones):
+            a.append(registro[posiciones])
+            b.append(registro[posiciones + salto])
+            salto += 1
+            posiciones = posiciones[restantes[posiciones] >= salto]
+        if not a:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        a, b = np.concatenate(a), np.concatenate(b)
+        # Un mismo par puede compartir varios bloques (ordenar y comparar vecinos es más rápido que np.unique)
+        par = np.sort(np.minimum(a, b).astype(np.int64) * self.n + np.maximum(a, b))
+        par = par[np.r_[True, par[1:] != par[:-1]]]
+        return par // self.n, par % self.n
+
+    def comparar(self, a, b, umbral_dni=0.5, umbral_digito=0.8, umbral_nombre=0.85):
+        """
+        Similitud y decisión de cada par candidato.
+
+        Un DNI válido distinto en ambos registros separa a dos personas salvo
+        que difiera en un solo dígito y el nombre sea muy parecido (error de
+        tipeo); sin DNI válido en alguno de los dos decide el nombre. El
+        error de tipeo solo se acepta entre nóminas distintas y si ninguno de
+        los dos registros tiene otro candidato con DNI válido; si no, pueden
+        ser homónimos con DNI cercanos y el par queda para revisar.
+        """
+        ambos_validos = self.dni_valido[a] & self.dni_valido[b]
+        distancia = np.where(ambos_validos, (self.digitos[a] != self.digitos[b]).sum(axis=1), -1)
+
+        # Dos DNI válidos que difieren en más de un dígito ya separan a las personas: no se compara el nombre
+        similitud = np.zeros(len(a))
+        comparar = distancia <= 1
+        similitud[comparar] = (
+            self.firmas[self.codigo_nombre[a[comparar]]] == self.firmas[self.codigo_nombre[b[comparar]]]
+        ).mean(axis=1)
+
+        decision = np.select(
+            [
+                (distancia == 0) & (similitud >= umbral_dni),
+                distancia == 0,
+                (distancia == 1) & (similitud >= umbral_digito),
+                ~ambos_validos & (similitud >= umbral_nombre)
+            ],
+            [MISMO_DNI, CONFLICTO, DNI_UN_DIGITO, SOLO_NOMBRE],
+            default=""
+        ).astype(object)
+
+        # Dos homónimos con DNI cercanos que siguen en la nómina tienen cada uno su propio par con el
+        # mismo DNI (o están en la misma nómina): el dígito distinto no basta para unirlos
+        un_digito = decision == DNI_UN_DIGITO
+        if un_digito.any():
+            con_dni = (decision == MISMO_DNI) | un_digito
+            candidatos = np.bincount(np.r_[a[con_dni], b[con_dni]], minlength=self.n)
+            exclusivo = (candidatos[a] == 1) & (candidatos[b] == 1) & (self.origen[a] != self.origen[b])
+            decision[un_digito & ~exclusivo] = DNI_REVISAR
+
+        # Un registro sin DNI cuyo nombre coincide con personas de DNI distintos (homónimos) no se
+        # enlaza: uniría a esas personas a través de él
+        solo = decision == SOLO_NOMBRE
+        sin_dni = np.where(self.dni_valido[a], b, a)
+        otro = np.where(self.dni_valido[a], a, b)
+        con_dni = solo & self.dni_valido[otro]
+        candidatos_dni = pd.DataFrame({"registro": sin_dni[con_dni], "dni": self.dni[otro[con_dni]]}).drop_duplicates()
+        varios = candidatos_dni["registro"].value_counts()
+        decision[con_dni & np.isin(sin_dni, varios.index[varios > 1])] = AMBIGUO
+        return pd.DataFrame({
+            "a": a, "b": b, "Similitud": np.round(similitud, 2), "Distancia_DNI": distancia, "Decision": decision
+        })
+
+    def resolver(self, **umbrales):
+        """
+        Agrupa los registros que corresponden a la misma persona.
+
+        Devuelve el identificador de persona de cada registro (0..k-1) y los
+        pares evaluados con decisión (los conflictos, los ambiguos y los DNI
+        por revisar se informan pero no se enlazan).
+        """
+        if not self.n:
+            return np.zeros(0, dtype=np.int64), self.comparar(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        a, b = self.candidatos()
+        pares = self.comparar(a, b, **umbrales)
+        pares = pares[pares["Decision"] != ""].reset_index(drop=True)
+        enlazados = pares[~pares["Decision"].isin([CONFLICTO, AMBIGUO, DNI_REVISAR])]
+        etiqueta = _componentes(self.n, enlazados["a"].to_numpy(), enlazados["b"].to_numpy())
+        persona, _ = pd.factorize(etiqueta)
+        return persona, pares
+
+
+def enlazar_nominas(nominas, **opciones):
+    """
+    Enlaza varias nóminas ({origen: DataFrame con DNI y Estudiante}) con un identificador de persona común.
+
+    Devuelve un DataFrame con Origen, Fila (posición en su nómina), DNI,
+    Estudiante, DNI_Normalizado e ID_Persona, y los pares evaluados.
+    """
+    registros = pd.concat(
+        [
+            pd.DataFrame({"Origen": origen, "Fila": np.arange(len(df)), "DNI": df["DNI"].to_numpy(), "Estudiante": df["Estudiante"].to_numpy()})
+            for origen, df in nominas.items()
+        ],
+        ignore_index=True
+    )
+    umbrales = {k: opciones.pop(k) for k in list(opciones) if k.startswith("umbral_")}
+    indice = IndiceIdentidad(registros["DNI"], registros["Estudiante"], origen=registros["Origen"], **opciones)
+    persona, pares = indice.resolver(**umbrales)
+    registros["DNI_Normalizado"] = indice.dni
+    registros["ID_Persona"] = persona
+    return registros, pares
+
+
+def duplicados_nomina(df, **opciones):
+    """Grupos de filas de una misma nómina que parecen ser el mismo estudiante (vacío si no hay)"""
+    indice = IndiceIdentidad(df["DNI"], df["Estudiante"], **opciones)
+    persona, pares = indice.resolver()
+    repetidos = pd.Series(persona).duplicated(keep=False).to_numpy()
+    if not repetidos.any():
+        return pd.DataFrame(columns=["Grupo", "Fila", "Estudiante", "DNI", "Grado"])
+    filas = np.flatnonzero(repetidos)
+    columnas = [c for c in ["Estudiante", "DNI", "Grado"] if c in df.columns]
+    grupos = df.iloc[filas][columnas].reset_index(drop=True)
+    grupos.insert(0, "Fila", filas)
+    grupos.insert(0, "Grupo", pd.factorize(persona[filas])[0] + 1)
+    return grupos.sort_values(["Grupo", "Fila"], kind="stable").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enlace de estudiantes entre nóminas (DNI y nombres normalizados)")
+    parser.add_argument("nominas", nargs="*", help="Archivos CSV o Excel con columnas DNI y Estudiante")
+    parser.add_argument("--salida", default="enlaces.csv", help="CSV con el ID_Persona de cada registro")
+    parser.add_argument("--max-bloque", type=int, default=100, help="Tamaño máximo de bloque que se compara")
+    args = parser.parse_args()
+
+    if args.nominas:
+        nominas = {
+            ruta: pd.read_csv(ruta, dtype={"DNI": str}) if ruta.endswith(".csv") else pd.read_excel(ruta, dtype={"DNI": str})
+            for ruta in args.nominas
+        }
+        inicio = time.perf_counter()
+        registros, pares = enlazar_nominas(nominas, max_bloque=args.max_bloque)
+        registros.to_csv(args.salida, index=False)
+        print(f"{len(registros)} registros, {registros['ID_Persona'].nunique()} personas distintas "
+              f"en {time.perf_counter() - inicio:.1f} s → {args.salida}")
+        conflictos = pares[pares["Decision"] == CONFLICTO]
+        if len(conflictos):
+            print(f"⚠️ {len(conflictos)} pares con el mismo DNI y nombres distintos (revisar)")
+        revisar = pares[pares["Decision"] == DNI_REVISAR]
+        if len(revisar):
+            print(f"⚠️ {len(revisar)} pares con el mismo nombre y DNI con un dígito distinto, no enlazados (revisar)")
+    else:
+        parser.print_help()
@@ -0,0 +1,223 @@
+"""Instantáneas estáticas del dashboard (HTML autocontenido) para consulta de solo lectura"""
+import base64
+import datetime
+import functools
+import gzip
+import hashlib
+import html
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+_HUELLA_META = re.compile(rb'<meta name="huella" content="([0-9a-f]+)">')
+_TOKEN = re.compile(r"[A-Za-z0-9_-]{22}")
+_INDICE = "indice.json"
+_lock_indice = threading.Lock()
+
+# El navegador descomprime plotly.js y los datos de los gráficos con DecompressionStream
+_PLANTILLA = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="huella" content="{huella}">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{titulo}</title>
+<style>
+body {{ font-family: sans-serif; margin: 0 auto; max-width: 1200px; padding: 20px; color: #1f3c73; }}
+.metricas {{ display: flex; gap: 16px; flex-wrap: wrap; }}
+.metrica {{ flex: 1; min-width: 160px; background: #f5f5f5; border-radius: 10px; padding: 12px; text-align: center; }}
+.metrica h2 {{ margin: 4px 0; }}
+.grafico {{ min-height: 420px; }}
+footer {{ color: #666; font-size: 0.8em; margin-top: 24px; }}
+</style>
+</head>
+<body>
+<h1>📊 {titulo}</h1>
+<p>Generado el {generado} · Solo lectura</p>
+<div class="metricas">{metricas}</div>
+{secciones}
+<footer>Sistema de Gestión Escolar con IA - instantánea {huella}</footer>
+<script>
+async function descomprimir(b64) {{
+  const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+  const flujo = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+  return await new Response(flujo).text();
+}}
+(async () => {{
+  const script = document.createElement("script");
+  script.src = URL.createObjectURL(new Blob([await descomprimir("{plotlyjs}")], {{type: "text/javascript"}}));
+  await new Promise(listo => {{ script.onload = listo; document.head.appendChild(script); }});
+  const graficos = JSON.parse(await descomprimir("{graficos}"));
+  for (const [id, fig] of Object.entries(graficos)) {{
+    Plotly.newPlot(id, fig.data, fig.layout, {{responsive: true, displaylogo: false}});
+  }}
+}})();
+</script>
+</body>
+</html>
+"""
+
+
+def _comprimir(texto):
+    """gzip + base64 para incrustar en el HTML"""
+    return base64.b64encode(gzip.compress(texto.encode("utf-8"), compresslevel=9)).decode("ascii")
+
+
+@functools.lru_cache(maxsize=1)
+def _plotlyjs_comprimido():
+    """plotly.js de la versión instalada, comprimido una sola vez por proceso"""
+    return _comprimir(get_plotlyjs())
+
+
+def nombre_archivo(token):
+    """Nombre de archivo de una instantánea (None si el token no tiene el formato esperado)"""
+    return f"{token}.html" if _TOKEN.fullmatch(token or "") else None
+
+
+def _escribir_atomico(ruta, texto):
+    """
+    Escribe un archivo completo y lo reemplaza de una vez.
+
+    El temporal tiene un nombre único (mkstemp), así que dos hilos del mismo
+    proceso que publican a la vez no escriben sobre el mismo temporal.
+    """
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            f.write(texto)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+
+def _leer_indice(directorio):
+    """Índice {hash del espacio del colegio: token}"""
+    try:
+        with open(os.path.join(directorio, _INDICE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _llave_indice(colegio):
+    """El índice guarda el hash del espacio del colegio, no el espacio"""
+    return hashlib.sha256(colegio.encode("utf-8")).hexdigest()
+
+
+def token_instantanea(directorio, colegio):
+    """Token del enlace de la instantánea de un colegio (None si todavía no tiene)"""
+    return _leer_indice(directorio).get(_llave_indice(colegio))
+
+
+def renovar_token(directorio, colegio):
+    """
+    Genera un token aleatorio para el enlace de la instantánea del colegio.
+
+    `colegio` es el espacio del colegio (código modular más clave). Si ya
+    había un token se borra su instantánea, con lo que el enlace anterior
+    deja de funcionar.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, _INDICE)
+    with _lock_indice:
+        indice = _leer_indice(directorio)
+        anterior = indice.get(_llave_indice(colegio))
+        if anterior:
+            try:
+                os.remove(os.path.join(directorio, nombre_archivo(anterior)))
+            except OSError:
+                pass
+        indice[_llave_indice(colegio)] = token = secrets.token_urlsafe(16)
+        _escribir_atomico(ruta, json.dumps(indice))
+    return token
+
+
+def sin_estudiantes(figura):
+    """
+    Copia de una figura sin datos que identifiquen estudiantes.
+
+    Quita los nombres del hover (hover_name/hover_data de Plotly Express) y
+    los textos de los puntos; el hover vuelve al de Plotly (valores de los ejes).
+    """
+    copia = go.Figure(figura)
+    copia.update_traces(hovertext=None, customdata=None, text=None, hovertemplate=None, ids=None)
+    return copia
+
+
+def huella_instantanea(nomina_clave, parametros):
+    """Identifica el contenido de la instantánea: nómina (ya identificada por su contenido) y parámetros"""
+    datos = json.dumps({"nomina": nomina_clave, **parametros}, sort_keys=True, default=str)
+    return hashlib.sha1(datos.encode("utf-8")).hexdigest()[:16]
+
+
+def huella_guardada(ruta):
+    """Huella de una instantánea ya generada (None si no existe)"""
+    try:
+        with open(ruta, "rb") as f:
+            encontrada = _HUELLA_META.search(f.read(512))
+    except OSError:
+        return None
+    return encontrada.group(1).decode() if encontrada else None
+
+
+def generar_html(titulo, metricas, secciones, huella):
+    """
+    Arma el HTML autocontenido de la instantánea.
+
+    `metricas` es una lista de (nombre, valor) y `secciones` un diccionario
+    {título de sección: [(título del gráfico, figura de Plotly)]}. Los datos de
+    todos los gráficos van en un solo JSON comprimido.
+    """
+    graficos, bloques = [], []
+    for seccion, figuras in secciones.items():
+        bloques.append(f"<h2>{html.escape(seccion)}</h2>")
+        for titulo_grafico, figura in figuras:
+            id_grafico = f"grafico{len(graficos) + 1}"
+            graficos.append(f'"{id_grafico}": {pio.to_json(figura, validate=False)}')
+            bloques.append(f'<h3>{html.escape(titulo_grafico)}</h3>\n<div id="{id_grafico}" class="grafico"></div>')
+
+    return _PLANTILLA.format(
+        huella=huella,
+        titulo=html.escape(titulo),
+        generado=datetime.datetime.now().strftime("%d/%m/%Y %H:%M"),
+        metricas="".join(
+            f'<div class="metrica"><div>{html.escape(nombre)}</div><h2>{html.escape(valor)}</h2></div>'
+            for nombre, valor in metricas
+        ),
+        secciones="\n".join(bloques),
+        plotlyjs=_plotlyjs_comprimido(),
+        graficos=_comprimir("{" + ", ".join(graficos) + "}")
+    )
+
+
+def publicar_instantanea(directorio, token, huella, generar):
+    """
+    Guarda la instantánea del token si su huella cambió.
+
+    `generar` es una función sin argumentos que devuelve el HTML; solo se
+    llama cuando hay que regenerar. Devuelve (ruta, regenerada).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, nombre_archivo(token))
+    if huella_guardada(ruta) == huella:
+        return ruta, False
+    # Reemplazo atómico: quien esté leyendo la instantánea anterior no ve un archivo a medias
+    _escribir_atomico(ruta, generar())
+    return ruta, True
+
+
+def leer_instantanea(ruta):
+    """Bytes de una instantánea publicada (vacío si ya no existe), para descargas diferidas"""
+    try:
+        with open(ruta, "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
@@ -0,0 +1,190 @@
+"""Notas por área curricular en formato largo (estudiante × área × bimestre)"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from calificacion import normalizar_dni
+
+BIMESTRES = ["Bim1", "Bim2", "Bim3", "Bim4"]
+COLUMNAS_LARGO = ["DNI", "Area", "Bimestre", "Nota"]
+MAX_AREAS = 31
+
+# Áreas curriculares del CNEB por nivel
+AREAS_PRIMARIA = [
+    "Comunicación", "Matemática", "Personal Social", "Ciencia y Tecnología",
+    "Arte y Cultura", "Educación Física", "Educación Religiosa", "Inglés"
+]
+AREAS_SECUNDARIA = [
+    "Comunicación", "Matemática", "Ciencias Sociales", "Desarrollo Personal, Ciudadanía y Cívica",
+    "Ciencia y Tecnología", "Arte y Cultura", "Educación Física", "Educación Religiosa",
+    "Inglés", "Educación para el Trabajo"
+]
+# Orden de presentación; las áreas que no estén aquí se agregan al final en el orden en que aparecen
+AREAS_CURRICULARES = [
+    "Comunicación", "Matemática", "Personal Social", "Ciencias Sociales",
+    "Desarrollo Personal, Ciudadanía y Cívica", "Ciencia y Tecnología",
+    "Arte y Cultura", "Educación Física", "Educación Religiosa", "Inglés",
+    "Educación para el Trabajo"
+]
+
+
+def _codigo_bimestre(valores):
+    """Bimestre como entero 0-3 (acepta 1-4, "Bim1"-"Bim4" o "I"-"IV"); -1 si no se reconoce"""
+    texto = pd.Series(valores).astype(str).str.strip().str.upper().str.removeprefix("BIM").str.removesuffix(".0")
+    return texto.map({"1": 0, "2": 1, "3": 2, "4": 3, "I": 0, "II": 1, "III": 2, "IV": 3}).fillna(-1).to_numpy(dtype=np.int8)
+
+
+class NotasAreas:
+    """
+    Almacén compacto de notas por área curricular.
+
+    Las notas se guardan ordenadas por estudiante (fila de la nómina) y cada
+    estudiante ocupa un tramo contiguo definido por `inicios`. Por nota solo
+    se guarda una celda de 1 byte (área × 4 + bimestre) y la nota en float32,
+    así 1M de estudiantes × 12 áreas × 4 bimestres ocupa ~240 MB en lugar de
+    un DataFrame ancho de cientos de columnas. Los promedios se calculan con
+    `bincount` sobre claves enteras y las tablas área × bimestre se arman con
+    una sola asignación vectorizada.
+    """
+
+    def __init__(self, estudiante, area, bimestre, nota, areas, n_estudiantes):
+        self.areas = list(areas)
+        self.n_estudiantes = n_estudiantes
+        celda = area.astype(np.int16) * len(BIMESTRES) + bimestre
+        clave = estudiante.astype(np.int64) * 256 + celda
+        # Si ya viene ordenado y sin repetidos (caso usual) no hace falta ordenar
+        if len(clave) > 1 and not (clave[1:] > clave[:-1]).all():
+            # Orden estable: si una nota se repite para el mismo estudiante/área/bimestre vale la última
+            orden = np.argsort(clave, kind="stable")
+            clave, estudiante, celda, nota = clave[orden], estudiante[orden], celda[orden], nota[orden]
+            ultima = np.r_[clave[1:] != clave[:-1], True]
+            estudiante, celda, nota = estudiante[ultima], celda[ultima], nota[ultima]
+        del clave
+
+        self.celda = celda.astype(np.int8)
+        self.nota = nota.astype(np.float32)
+        self.inicios = np.searchsorted(estudiante, np.arange(n_estudiantes + 1)).astype(np.int64)
+
+    @classmethod
+    def desde_largo(cls, largo, dni_nomina):
+        """
+        Construye el almacén a partir de un DataFrame con DNI, Area, Bimestre y Nota.
+
+        Devuelve el almacén y la cantidad de filas descartadas (DNI que no está
+        en la nómina, bimestre no reconocido o nota vacía). Si la nómina repite
+        un DNI, sus notas se asignan a cada fila con ese DNI.
+        """
+        faltantes = [col for col in COLUMNAS_LARGO if col not in largo.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en las notas por área: {', '.join(faltantes)}")
+
+        nota = pd.to_numeric(largo["Nota"], errors="coerce")
+        if (nota.isna() & largo["Nota"].notna()).any():
+            raise ValueError("Las notas por área contienen valores no numéricos")
+
+        # DNI y áreas se normalizan una vez por valor distinto
+        codigos_dni, dnis = pd.factorize(largo["DNI"])
+        enlace = pd.DataFrame({"codigo": np.arange(len(dnis)), "DNI": normalizar_dni(dnis).to_numpy()}).dropna().merge(
+            pd.DataFrame({"DNI": normalizar_dni(dni_nomina).to_numpy(), "fila": np.arange(len(dni_nomina))}).dropna(),
+            on="DNI"
+        ).sort_values(["codigo", "fila"], kind="stable")
+        # Filas de la nómina de cada DNI distinto, como CSR; un DNI repetido en la nómina
+        # (el mismo estudiante en dos filas) recibe sus notas en todas esas filas
+        veces_codigo = np.bincount(enlace["codigo"].to_numpy(), minlength=len(dnis))
+        inicio_codigo = np.cumsum(veces_codigo) - veces_codigo
+        veces = np.append(veces_codigo, 0)[codigos_dni]
+
+        codigos_area, nombres = pd.factorize(largo["Area"].astype(str).str.strip())
+        # La celda área × 4 + bimestre debe caber en un byte
+        if len(nombres) > MAX_AREAS:
+            raise ValueError(f"Se admiten hasta {MAX_AREAS} áreas curriculares distintas")
+        areas = [a for a in AREAS_CURRICULARES if a in set(nombres)] + [a for a in nombres if a not in AREAS_CURRICULARES]
+        area = np.append(pd.Index(areas).get_indexer(nombres), -1)[codigos_area]
+
+        codigos_bim, valores_bim = pd.factorize(largo["Bimestre"])
+        bimestre = np.append(_codigo_bimestre(valores_bim), -1)[codigos_bim]
+
+        validas = (veces > 0) & (area >= 0) & (bimestre >= 0) & nota.notna().to_numpy()
+        fila = np.flatnonzero(validas)
+        veces = veces[fila]
+        if (veces > 1).any():
+            fila = np.repeat(fila, veces)
+            desplazamiento = np.arange(len(fila)) - np.repeat(np.cumsum(veces) - veces, veces)
+        else:
+            desplazamiento = 0
+        estudiante = enlace["fila"].to_numpy()[inicio_codigo[codigos_dni[fila]] + desplazamiento]
+        almacen = cls(
+            estudiante.astype(np.int32), area[fila].astype(np.int8), bimestre[fila].astype(np.int8),
+            nota.to_numpy(dtype=np.float32)[fila].clip(0, 20), areas, len(dni_nomina)
+        )
+        return almacen, int((~validas).sum())
+
+    def __len__(self):
+        return len(self.nota)
+
+    def _estudiante(self):
+        """Fila de la nómina de cada nota (se expande solo cuando se necesita)"""
+        return np.repeat(np.arange(self.n_estudiantes, dtype=np.int32), np.diff(self.inicios))
+
+    def _promedios(self, grupo, n_grupos, por_area):
+        """Promedio de las notas agrupadas por grupo (× área) × bimestre"""
+        celdas = len(self.areas) * len(BIMESTRES) if por_area else len(BIMESTRES)
+        celda = self.celda.astype(np.int64) if por_area else self.celda % len(BIMESTRES)
+        clave = grupo.astype(np.int64) * celdas + celda
+        suma = np.bincount(clave, weights=self.nota, minlength=n_grupos * celdas)
+        cantidad = np.bincount(clave, minlength=n_grupos * celdas)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            promedios = suma / cantidad
+        return promedios.reshape(n_grupos, -1, len(BIMESTRES)) if por_area else promedios.reshape(n_grupos, len(BIMESTRES))
+
+    def promedios_bimestre(self):
+        """Matriz (estudiantes × bimestres) con el promedio de las áreas en cada bimestre"""
+        return np.round(self._promedios(self._estudiante(), self.n_estudiantes, por_area=False), 1)
+
+    def promedios_area(self, grupos=None):
+        """
+        Promedio por área y bimestre, para toda la nómina o por grupo.
+
+        `grupos` es un arreglo alineado con la nómina (p. ej. la columna Grado).
+        Devuelve un DataFrame en formato largo con Grupo, Area, Bimestre y Nota.
+        """
+        if grupos is None:
+            codigos, nombres = np.zeros(self.n_estudiantes, dtype=np.int64), ["Todos"]
+        else:
+            codigos, nombres = pd.factorize(pd.Series(grupos), sort=True)
+        promedios = self._promedios(codigos[self._estudiante()], len(nombres), por_area=True)
+        indice = pd.MultiIndex.from_product([list(nombres), self.areas, BIMESTRES], names=["Grupo", "Area", "Bimestre"])
+        resultado = pd.Series(promedios.ravel(), index=indice, name="Nota").dropna().round(1)
+        return resultado.reset_index()
+
+    def matriz(self, filas):
+        """Tablas área × bimestre de las filas de la nómina indicadas: arreglo (filas × áreas × 4) con NaN sin nota"""
+        filas = np.asarray(filas, dtype=np.int64)
+        inicio, fin = self.inicios[filas], self.inicios[filas + 1]
+        largos = fin - inicio
+        # Posiciones de todas las notas de las filas pedidas sin recorrerlas una a una
+        posicion = np.repeat(np.arange(len(filas)), largos)
+        indices = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos) + np.repeat(inicio, largos)
+        cubo = np.full((len(filas), len(self.areas) * len(BIMESTRES)), np.nan, dtype=np.float32)
+        cubo[posicion, self.celda[indices]] = self.nota[indices]
+        return cubo.reshape(len(filas), len(self.areas), len(BIMESTRES))
+
+    def tabla(self, fila):
+        """Notas de un estudiante como DataFrame (áreas × Bim1-Bim4 y Promedio)"""
+        tabla = pd.DataFrame(self.matriz([fila])[0].astype(float), index=self.areas, columns=BIMESTRES)
+        tabla = tabla.dropna(how="all")
+        tabla["Promedio"] = tabla.mean(axis=1).round(1)
+        return tabla
+
+    def huella(self):
+        """Hash del contenido (para distinguir nóminas con distintas notas por área)"""
+        h = hashlib.sha1()
+        h.update("|".join(self.areas).encode("utf-8"))
+        for arreglo in (self.inicios, self.celda, self.nota):
+            h.update(arreglo.tobytes())
+        return h.hexdigest()[:16]
+
+    def memoria(self):
+        """Bytes ocupados por los arreglos del almacén"""
+        return self.inicios.nbytes + self.celda.nbytes + self.nota.nbytes
@@ -0,0 +1,490 @@
+"""
+Prueba de carga de la aplicación Streamlit con sesiones concurrentes simuladas.
+
+Levanta una sola instancia real de la aplicación (`streamlit run`) y conecta
+N sesiones a la vez por el mismo protocolo que el navegador: un websocket
+por pestaña en `/_stcore/stream` (mensajes protobuf BackMsg/ForwardMsg) y
+las subidas de archivos por HTTP. Así las sesiones comparten el registro de
+nóminas, `st.cache_resource`, `st.cache_data` y la cola de trabajos de esa
+instancia, como los docentes de un colegio en un mismo servidor.
+
+Cada sesión sube una nómina sintética, mueve sliders, cambia de estudiante
+y pide un reporte PDF; se mide la duración de cada rerun (del envío del
+rerun hasta `script_finished`) y el CPU y la memoria del proceso servidor.
+
+Con `--compartida` todas las sesiones usan el mismo código modular, la
+misma clave y la misma nómina; después de subirla, un segundo docente la
+toma del registro compartido en lugar de volver a subirla.
+
+Si alguna sesión falla (excepción en la aplicación o error de conexión), se
+informan los errores y no se calculan estadísticas (código de salida 1).
+
+Uso:
+    python prueba_carga_app.py --sesiones 8 --interacciones 20 --estudiantes 2000
+    python prueba_carga_app.py --url http://localhost:8501 --pid 12345   # servidor ya levantado
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import requests
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+RUTA_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gestion_escolar.py")
+ACCIONES = ["nota_minima", "asistencia_minima", "estudiante", "ranking", "simulador"]
+CODIGO_COMPARTIDO = ("0000000", "clave-prueba-carga")
+# Elementos de Streamlit que son widgets (tienen id y envían su valor en cada rerun)
+TIPOS_WIDGET = {
+    "button", "checkbox", "download_button", "file_uploader", "multiselect", "number_input",
+    "radio", "selectbox", "slider", "text_area", "text_input"
+}
+
+
+def nomina_sintetica(estudiantes, semilla):
+    """CSV de una nómina aleatoria con el formato de carga de la aplicación"""
+    rng = np.random.default_rng(semilla)
+    grados = [f"{i}° Primaria" for i in range(1, 7)] + [f"{i}° Secundaria" for i in range(1, 6)]
+    df = pd.DataFrame({
+        "Estudiante": [f"Estudiante {semilla}-{i}" for i in range(estudiantes)],
+        "DNI": [f"{10000000 + semilla * 100000 + i}" for i in range(estudiantes)],
+        "Grado": rng.choice(grados, estudiantes),
+        "Seccion": rng.choice(list("ABC"), estudiantes),
+        **{f"Bim{b}": rng.integers(5, 21, estudiantes) for b in range(1, 5)},
+        "Asistencia": rng.integers(60, 101, estudiantes),
+        "Conducta": rng.choice(["Excelente", "Bueno", "Regular"], estudiantes)
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+
+# --- Servidor: una instancia de la aplicación y sus métricas de proceso ---
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(puerto, directorio):
+    """Levanta `streamlit run` con bases de datos temporales y espera a que responda"""
+    entorno = {
+        **os.environ,
+        "GESTION_TRABAJOS_DB": os.path.join(directorio, "trabajos.db"),
+        "GESTION_ANALISIS_DB": os.path.join(directorio, "analisis.db"),
+        "GESTION_VERSIONES_DB": os.path.join(directorio, "versiones.db"),
+        "GESTION_INSTANTANEAS_DIR": os.path.join(directorio, "instantaneas")
+    }
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", RUTA_APP,
+         "--server.headless", "true", "--server.port", str(puerto),
+         "--server.enableXsrfProtection", "false", "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false"],
+        cwd=directorio, env=entorno, stdout=subprocess.DEVNULL, stderr=open(os.path.join(directorio, "servidor.log"), "w")
+    )
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < 60:
+        if servidor.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al iniciar (ver {directorio}/servidor.log)")
+        try:
+            if requests.get(f"http://localhost:{puerto}/_stcore/health", timeout=1).ok:
+                return servidor
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    servidor.terminate()
+    raise TimeoutError("El servidor no respondió en 60 s")
+
+
+def rss_proceso_mb(pid):
+    """Memoria residente actual de un proceso en MB (None sin /proc)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return None
+
+
+def cpu_proceso_s(pid):
+    """Segundos de CPU (usuario + sistema) consumidos por un proceso (None sin /proc)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def muestrear_memoria(pid, muestras, intervalo=0.2):
+    """Registra la memoria del servidor mientras corren las sesiones (se cancela al terminar)"""
+    while True:
+        rss = rss_proceso_mb(pid)
+        if rss is not None:
+            muestras.append(rss)
+        await asyncio.sleep(intervalo)
+
+
+# --- Cliente: una pestaña del navegador ---
+class ClienteStreamlit:
+    """
+    Sesión de Streamlit por websocket, como una pestaña del navegador.
+
+    Guarda los widgets del último rerun (tipo, etiqueta, key y opciones) y
+    los valores que la sesión les dio; en cada rerun se envían todos, como lo
+    hace el navegador. Los botones solo se envían en el rerun que los pulsa.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.ws = None
+        self.sesion = None
+        self.pagina = ""
+        self.query_string = ""
+        self.widgets = {}   # id -> (tipo, proto)
+        self.valores = {}   # id -> WidgetState
+        self.elementos = []
+
+    async def conectar(self):
+        ws_url = "ws" + self.url[len("http"):] + "/_stcore/stream"
+        self.ws = await websockets.connect(ws_url, subprotocols=["streamlit"], max_size=None)
+
+    async def cerrar(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def _recibir(self):
+        mensaje = ForwardMsg()
+        mensaje.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+        return mensaje
+
+    async def rerun(self, *disparadores):
+        """Pide un rerun con los valores actuales más los botones indicados y espera a que termine"""
+        mensaje = BackMsg()
+        estado = mensaje.rerun_script
+        estado.query_string = self.query_string
+        estado.page_script_hash = self.pagina
+        estado.widget_states.widgets.extend(v for i, v in self.valores.items() if i in self.widgets or not self.widgets)
+        estado.widget_states.widgets.extend(disparadores)
+        await self.ws.send(mensaje.SerializeToString())
+
+        elementos, errores = [], []
+        while True:
+            respuesta = await self._recibir()
+            tipo = respuesta.WhichOneof("type")
+            if tipo == "new_session":
+                self.sesion = respuesta.new_session.initialize.session_id
+                self.pagina = respuesta.new_session.page_script_hash
+            elif tipo == "page_info_changed":
+                self.query_string = respuesta.page_info_changed.query_string
+            elif tipo == "delta" and respuesta.delta.WhichOneof("type") == "new_element":
+                elemento = respuesta.delta.new_element
+                tipo_elemento = elemento.WhichOneof("type")
+                proto = getattr(elemento, tipo_elemento)
+                elementos.append((tipo_elemento, proto))
+                if tipo_elemento == "exception":
+                    errores.append(f"{proto.type}: {proto.message}")
+            elif tipo == "script_finished":
+                if respuesta.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                break
+        self.elementos = elementos
+        self.widgets = {p.id: (t, p) for t, p in elementos if t in TIPOS_WIDGET}
+        if errores:
+            raise RuntimeError(errores[0])
+
+    def widget(self, tipo, clave=None, etiqueta=None):
+        """Widget del último rerun por key o por el inicio de su etiqueta"""
+        for widget_id, (t, proto) in self.widgets.items():
+            if t != tipo:
+                continue
+            if clave is not None and widget_id.endswith(f"-{clave}"):
+                return widget_id, proto
+            if etiqueta is not None and proto.label.startswith(etiqueta):
+                return widget_id, proto
+        raise LookupError(f"No se encontró el widget {tipo} '{clave or etiqueta}'")
+
+    def hay(self, tipo, etiqueta):
+        return any(t == tipo and etiqueta in p.label for t, p in self.elementos)
+
+    def fijar(self, widget_id, **valor):
+        """Valor de un widget como lo envía el navegador (string_value, double_array_value...)"""
+        estado = WidgetState(id=widget_id)
+        for campo, dato in valor.items():
+            if campo.endswith("_array_value"):
+                getattr(estado, campo).data[:] = dato
+            else:
+                setattr(estado, campo, dato)
+        self.valores[widget_id] = estado
+
+    @staticmethod
+    def pulsar(widget_id):
+        return WidgetState(id=widget_id, trigger_value=True)
+
+    async def subir(self, widget_id, nombre, contenido, tipo_mime):
+        """Sube un archivo como el navegador: pide la URL de subida, envía el archivo y fija el widget"""
+        pedido = BackMsg()
+        pedido.file_urls_request.request_id = uuid.uuid4().hex
+        pedido.file_urls_request.file_names.append(nombre)
+        pedido.file_urls_request.session_id = self.sesion
+        await self.ws.send(pedido.SerializeToString())
+        while True:
+            respuesta = await self._recibir()
+            if respuesta.WhichOneof("type") == "file_urls_response":
+                break
+        if respuesta.file_urls_response.error_msg:
+            raise RuntimeError(respuesta.file_urls_response.error_msg)
+        urls = respuesta.file_urls_response.file_urls[0]
+        subida = await asyncio.to_thread(
+            requests.put, self.url + urls.upload_url, files={"file": (nombre, contenido, tipo_mime)}, timeout=self.timeout
+        )
+        subida.raise_for_status()
+
+        estado = WidgetState(id=widget_id)
+        archivo = estado.file_uploader_state_value.uploaded_file_info.add()
+        archivo.name, archivo.size, archivo.file_id = nombre, len(contenido), urls.file_id
+        archivo.file_urls.CopyFrom(urls)
+        self.valores[widget_id] = estado
+
+
+class SesionSimulada:
+    """Un docente: carga su nómina y realiza interacciones al azar con pausas entre ellas"""
+
+    def __init__(self, numero, args):
+        self.numero = numero
+        self.args = args
+        self.rng = random.Random(numero)
+        self.reruns = []  # (accion, segundos)
+        self.clientes = []
+
+    async def _medir(self, cliente, accion, *disparadores):
+        inicio = time.perf_counter()
+        try:
+            await cliente.rerun(*disparadores)
+        except RuntimeError as e:
+            raise RuntimeError(f"{accion}: {e}") from None
+        self.reruns.append((accion, time.perf_counter() - inicio))
+
+    async def _pausa(self):
+        if self.args.pausa > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.pausa))
+
+    async def _abrir(self):
+        """Abre una pestaña; con --compartida ingresa el código modular y la clave, y pasa al modo de carga"""
+        cliente = ClienteStreamlit(self.args.url, self.args.timeout)
+        self.clientes.append(cliente)
+        await cliente.conectar()
+        await self._medir(cliente, "inicio")
+        if self.args.compartida:
+            codigo, clave = CODIGO_COMPARTIDO
+            cliente.fijar(cliente.widget("text_input", etiqueta="Código modular")[0], string_value=codigo)
+            cliente.fijar(cliente.widget("text_input", etiqueta="Clave del colegio")[0], string_value=clave)
+        cliente.fijar(cliente.widget("radio", etiqueta="Seleccione el modo")[0], string_value="Subir archivo propio")
+        await self._medir(cliente, "modo")
+        return cliente
+
+    async def ejecutar(self):
+        cliente = await self._abrir()
+        semilla = 0 if self.args.compartida else self.numero + 1
+        await cliente.subir(
+            cliente.widget("file_uploader", etiqueta="Suba su archivo")[0],
+            "nomina.csv", nomina_sintetica(self.args.estudiantes, semilla), "text/csv"
+        )
+        await self._medir(cliente, "carga")
+        if self.args.compartida:
+            # Otro docente del mismo colegio toma la nómina ya cargada del registro compartido
+            otro = await self._abrir()
+            selector_id, selector = otro.widget("selectbox", clave="nomina_compartida_select")
+            otro.fijar(selector_id, string_value=selector.options[1])
+            await self._medir(otro, "compartida")
+
+        for _ in range(self.args.interacciones):
+            await self._pausa()
+            accion = self.rng.choice(ACCIONES)
+            if accion == "nota_minima":
+                widget_id, _ = cliente.widget("slider", etiqueta="Nota mínima aprobatoria")
+                cliente.fijar(widget_id, double_array_value=[self.rng.randint(9, 14)])
+            elif accion == "asistencia_minima":
+                widget_id, _ = cliente.widget("slider", etiqueta="Asistencia mínima")
+                cliente.fijar(widget_id, double_array_value=[self.rng.randint(60, 100)])
+            elif accion == "estudiante":
+                # Las opciones son filas de la nómina; se elige por posición
+                widget_id, selector = cliente.widget("selectbox", clave="estudiante_select")
+                cliente.fijar(widget_id, string_value=self.rng.choice(selector.options))
+            elif accion == "ranking":
+                widget_id, _ = cliente.widget("slider", clave="ranking_k")
+                cliente.fijar(widget_id, double_array_value=[self.rng.randint(3, 20)])
+            else:
+                widget_id, selector = cliente.widget("selectbox", clave="simulador_grado")
+                cliente.fijar(widget_id, string_value=self.rng.choice(selector.options))
+            await self._medir(cliente, accion)
+
+        if self.args.pdf:
+            await self._pausa()
+            widget_id, seleccion = cliente.widget("multiselect", clave="reporte_select")
+            cliente.fijar(widget_id, string_array_value=list(seleccion.options[:self.args.pdf]))
+            await self._medir(cliente, "pdf_seleccion")
+            inicio = time.perf_counter()
+            await self._medir(cliente, "pdf_encolar", cliente.pulsar(cliente.widget("button", clave="reporte_btn")[0]))
+            # El PDF se genera en la cola de trabajos: se refresca hasta que aparece la descarga
+            while not cliente.hay("download_button", "Reporte PDF"):
+                if time.perf_counter() - inicio > self.args.timeout:
+                    raise TimeoutError("El reporte PDF no terminó a tiempo")
+                await asyncio.sleep(0.5)
+                await self._medir(cliente, "pdf_refrescar", cliente.pulsar(cliente.widget("button", clave="trabajos_refrescar")[0]))
+            self.reruns.append(("pdf_total", time.perf_counter() - inicio))
+
+    async def cerrar(self):
+        for cliente in self.clientes:
+            await cliente.cerrar()
+
+
+def percentiles(valores):
+    """Percentiles de latencia en milisegundos"""
+    valores = np.asarray(valores) * 1000
+    return {
+        "n": len(valores),
+        "p50_ms": round(float(np.percentile(valores, 50)), 1),
+        "p90_ms": round(float(np.percentile(valores, 90)), 1),
+        "p99_ms": round(float(np.percentile(valores, 99)), 1),
+        "max_ms": round(float(valores.max()), 1)
+    }
+
+
+async def ejecutar_sesiones(args, pid):
+    """Corre las sesiones a la vez contra la instancia y devuelve (sesiones, errores, duración, métricas del servidor)"""
+    # Sesión de calentamiento: la primera ejecución del script importa módulos y llena cachés de proceso
+    calentamiento = ClienteStreamlit(args.url, args.timeout)
+    await calentamiento.conectar()
+    await calentamiento.rerun()
+    await calentamiento.cerrar()
+
+    servidor = {"rss_base_mb": rss_proceso_mb(pid) if pid else None, "cpu_inicio_s": cpu_proceso_s(pid) if pid else None}
+    muestras = []
+    muestreo = asyncio.create_task(muestrear_memoria(pid, muestras)) if servidor["rss_base_mb"] is not None else None
+
+    sesiones = [SesionSimulada(i, args) for i in range(args.sesiones)]
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(s.ejecutar() for s in sesiones), return_exceptions=True)
+    duracion = time.perf_counter() - inicio
+
+    # Memoria con todas las sesiones aún abiertas (sus estados siguen en el servidor)
+    if muestreo:
+        muestreo.cancel()
+        servidor["rss_final_mb"] = rss_proceso_mb(pid)
+        servidor["rss_pico_mb"] = max(muestras + [servidor["rss_final_mb"]])
+    if servidor["cpu_inicio_s"] is not None:
+        servidor["cpu_s"] = cpu_proceso_s(pid) - servidor["cpu_inicio_s"]
+    for sesion in sesiones:
+        await sesion.cerrar()
+
+    errores = {
+        f"sesion-{s.numero}": f"{type(r).__name__}: {r}"
+        for s, r in zip(sesiones, resultados) if isinstance(r, BaseException)
+    }
+    return sesiones, errores, duracion, servidor
+
+
+def ejecutar(args):
+    """Levanta la instancia (si no se indicó --url), corre las sesiones y devuelve el informe"""
+    servidor_propio = None
+    pid = args.pid
+    if not args.url:
+        directorio = tempfile.mkdtemp()
+        puerto = puerto_libre()
+        servidor_propio = iniciar_servidor(puerto, directorio)
+        args.url, pid = f"http://localhost:{puerto}", servidor_propio.pid
+    try:
+        sesiones, errores, duracion, servidor = asyncio.run(ejecutar_sesiones(args, pid))
+    finally:
+        if servidor_propio:
+            servidor_propio.terminate()
+            servidor_propio.wait()
+
+    informe = {
+        "sesiones": args.sesiones,
+        "estudiantes_por_nomina": args.estudiantes,
+        "compartida": args.compartida,
+        "duracion_s": round(duracion, 1),
+        "errores": errores
+    }
+    if errores:
+        # Con sesiones fallidas los percentiles describirían otra carga: no se calculan
+        return informe
+
+    todos = [r for s in sesiones for r in s.reruns]
+    por_accion = {}
+    for accion, segundos in todos:
+        por_accion.setdefault(accion, []).append(segundos)
+    reruns = [r for r in todos if r[0] != "pdf_total"]
+    informe.update({
+        "reruns": len(reruns),
+        "reruns_por_s": round(len(reruns) / duracion, 2),
+        "latencia_rerun": percentiles([r[1] for r in reruns]),
+        "latencia_por_accion": {accion: percentiles(v) for accion, v in sorted(por_accion.items())}
+    })
+    if "cpu_s" in servidor:
+        informe["cpu_servidor_s"] = round(servidor["cpu_s"], 1)
+        informe["cpu_por_rerun_ms"] = round(1000 * servidor["cpu_s"] / len(reruns), 1)
+    if "rss_pico_mb" in servidor:
+        informe.update({
+            "rss_base_mb": round(servidor["rss_base_mb"], 1),
+            "rss_pico_mb": round(servidor["rss_pico_mb"], 1),
+            "rss_final_mb": round(servidor["rss_final_mb"], 1),
+            "rss_por_sesion_mb": round((servidor["rss_final_mb"] - servidor["rss_base_mb"]) / args.sesiones, 1)
+        })
+    return informe
+
+
+def imprimir(informe):
+    print(f"\n{informe['sesiones']} sesiones concurrentes en una instancia, nóminas de "
+          f"{informe['estudiantes_por_nomina']} estudiantes, {informe['duracion_s']} s")
+    if informe["errores"]:
+        for sesion, error in informe["errores"].items():
+            print(f"⚠️ {sesion}: {error}")
+        print("❌ Hubo sesiones con error: no se calculan estadísticas")
+        return
+    print(f"{informe['reruns']} reruns ({informe['reruns_por_s']}/s)")
+    print(f"\n{'Acción':<18}{'n':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    filas = {"(todos los reruns)": informe["latencia_rerun"], **informe["latencia_por_accion"]}
+    for accion, p in filas.items():
+        print(f"{accion:<18}{p['n']:>6}{p['p50_ms']:>10}{p['p90_ms']:>10}{p['p99_ms']:>10}{p['max_ms']:>10}")
+    if "cpu_servidor_s" in informe:
+        print(f"\nCPU del servidor: {informe['cpu_servidor_s']} s, {informe['cpu_por_rerun_ms']} ms por rerun")
+    if "rss_pico_mb" in informe:
+        print(f"RSS del servidor: base {informe['rss_base_mb']} MB, pico {informe['rss_pico_mb']} MB, "
+              f"con las sesiones abiertas {informe['rss_final_mb']} MB "
+              f"(≈ {informe['rss_por_sesion_mb']} MB por sesión)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de gestion_escolar.py con sesiones concurrentes")
+    parser.add_argument("--sesiones", type=int, default=4)
+    parser.add_argument("--interacciones", type=int, default=15, help="Interacciones por sesión después de la carga")
+    parser.add_argument("--estudiantes", type=int, default=1000, help="Tamaño de la nómina sintética")
+    parser.add_argument("--compartida", action="store_true",
+                        help="Todas las sesiones usan el mismo colegio y la misma nómina, que otro docente toma del registro compartido")
+    parser.add_argument("--pausa", type=float, default=0.5, help="Pausa media entre interacciones (s)")
+    parser.add_argument("--pdf", type=int, default=5, help="Estudiantes en el reporte PDF (0 para omitirlo)")
+    parser.add_argument("--timeout", type=float, default=300, help="Tiempo máximo por rerun (s)")
+    parser.add_argument("--url", help="Servidor ya levantado (por defecto se inicia uno con streamlit run)")
+    parser.add_argument("--pid", type=int, help="PID del servidor indicado con --url, para medir su CPU y memoria")
+    parser.add_argument("--json", help="Guarda el informe en este archivo")
+    args = parser.parse_args()
+
+    informe = ejecutar(args)
+    imprimir(informe)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if informe["errores"] else 0)
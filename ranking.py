@@ -0,0 +1,109 @@
+"""Orden de mérito y percentiles por colegio, grado y sección"""
+import numpy as np
+import pandas as pd
+
+# Criterios en orden de prioridad (todos de mayor a menor). Si persiste el empate,
+# los estudiantes comparten el puesto y el siguiente puesto se salta (1, 2, 2, 4).
+CRITERIOS_DESEMPATE = ["Promedio", "Bim4", "Bim3", "Bim2", "Bim1", "Asistencia"]
+
+NIVELES = {
+    "Colegio": [],
+    "Grado": ["Grado"],
+    "Seccion": ["Grado", "Seccion"]
+}
+
+
+class RankingMerito:
+    """
+    Calcula el orden de mérito de toda la nómina en cada nivel de agrupación.
+
+    Los criterios de desempate se ordenan una sola vez para toda la nómina;
+    cada nivel solo reagrupa ese orden con un ordenamiento estable por grupo.
+    El puesto dentro de cada grupo sale de la posición en ese orden y los
+    empates se detectan comparando cada fila con la anterior. Se guardan el
+    orden y el inicio de cada grupo, así que `top`/`ultimos` de cualquier
+    grupo son un corte del arreglo ya ordenado.
+    """
+
+    def __init__(self, df):
+        self.indice = df.index
+        n = len(df)
+        # Sin nota cuenta como el valor más bajo; se ordena de mayor a menor con el signo invertido
+        criterios = [
+            -np.nan_to_num(df[col].to_numpy(dtype=float), nan=-np.inf)
+            for col in CRITERIOS_DESEMPATE if col in df.columns
+        ]
+
+        # El orden por criterios se calcula una sola vez; cada nivel solo reagrupa ese orden
+        # con un ordenamiento estable por grupo. `clase` identifica a los empatados exactos.
+        orden_criterios = np.lexsort(list(reversed(criterios))) if criterios else np.arange(n)
+        distinto = np.zeros(n, dtype=bool)
+        distinto[:1] = True
+        for c in criterios:
+            c_ord = c[orden_criterios]
+            distinto[1:] |= c_ord[1:] != c_ord[:-1]
+        clase = np.empty(n, dtype=np.int64)
+        clase[orden_criterios] = np.cumsum(distinto)
+
+        self.puestos, self.percentiles = {}, {}
+        self._orden, self._grupos = {}, {}
+        for nivel, claves in NIVELES.items():
+            if any(col not in df.columns for col in claves):
+                continue
+            if claves:
+                agrupado = df.groupby(claves if len(claves) > 1 else claves[0], sort=True, dropna=False)
+                codigos = agrupado.ngroup().to_numpy()
+                nombres = list(agrupado.size().index)
+            else:
+                codigos, nombres = np.zeros(n, dtype=np.int64), ["Todos"]
+
+            orden = orden_criterios[np.argsort(codigos[orden_criterios], kind="stable")]
+            codigos_ord = codigos[orden]
+            inicios = np.flatnonzero(np.r_[True, codigos_ord[1:] != codigos_ord[:-1]])
+            tamanos = np.diff(np.r_[inicios, n])
+            inicio_fila = np.repeat(inicios, tamanos)
+
+            # Una fila empata con la anterior si está en el mismo grupo y en la misma clase
+            nuevo = np.ones(n, dtype=bool)
+            clase_ord = clase[orden]
+            nuevo[1:] = (codigos_ord[1:] != codigos_ord[:-1]) | (clase_ord[1:] != clase_ord[:-1])
+            posicion = np.arange(n)
+            puesto_ord = np.maximum.accumulate(np.where(nuevo, posicion, 0)) - inicio_fila + 1
+
+            tamano_fila = np.repeat(tamanos, tamanos)
+            percentil_ord = np.where(tamano_fila > 1, (tamano_fila - puesto_ord) / np.maximum(tamano_fila - 1, 1) * 100, 100.0)
+
+            puestos = np.empty(n, dtype=np.int64)
+            puestos[orden] = puesto_ord
+            percentiles = np.empty(n)
+            percentiles[orden] = np.round(percentil_ord, 1)
+
+            self.puestos[nivel], self.percentiles[nivel] = puestos, percentiles
+            self._orden[nivel] = orden
+            self._grupos[nivel] = {nombre: (inicio, inicio + tamano) for nombre, inicio, tamano in zip(nombres, inicios, tamanos)}
+
+    def niveles(self):
+        """Niveles disponibles según las columnas de la nómina"""
+        return list(self._orden)
+
+    def grupos(self, nivel):
+        """Grupos de un nivel (p. ej. cada grado o cada par grado-sección)"""
+        return list(self._grupos[nivel])
+
+    def columnas(self):
+        """DataFrame alineado con la nómina con Puesto_<nivel> y Percentil_<nivel>"""
+        datos = {}
+        for nivel in self._orden:
+            datos[f"Puesto_{nivel}"] = self.puestos[nivel]
+            datos[f"Percentil_{nivel}"] = self.percentiles[nivel]
+        return pd.DataFrame(datos, index=self.indice)
+
+    def top(self, nivel, grupo="Todos", k=5):
+        """Índices (de la nómina) de los k primeros del grupo, en orden de mérito"""
+        inicio, fin = self._grupos[nivel][grupo]
+        return self.indice[self._orden[nivel][inicio:min(inicio + k, fin)]]
+
+    def ultimos(self, nivel, grupo="Todos", k=5):
+        """Índices de los k últimos del grupo (del último hacia arriba)"""
+        inicio, fin = self._grupos[nivel][grupo]
+        return self.indice[self._orden[nivel][max(fin - k, inicio):fin][::-1]]
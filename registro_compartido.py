@@ -0,0 +1,163 @@
+"""Registro de nóminas compartidas entre sesiones de un mismo colegio"""
+import hashlib
+import threading
+import time
+
+import pandas as pd
+
+
+def huella_nomina(df):
+    """Calcula un hash del contenido de la nómina (independiente del archivo de origen)"""
+    h = hashlib.sha1()
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def espacio_colegio(codigo, clave):
+    """
+    Espacio de nombres de un colegio: código modular más su clave de acceso.
+
+    El código modular es público; solo quien conoce la clave llega a las
+    nóminas del colegio. Sin clave no hay espacio compartido (None).
+    """
+    if not codigo or not clave:
+        return None
+    secreto = hashlib.pbkdf2_hmac("sha256", clave.encode("utf-8"), f"gestion-escolar:{codigo}".encode("utf-8"), 100_000)
+    return f"{codigo}:{secreto.hex()[:24]}"
+
+
+def memoria_df(df):
+    """Bytes ocupados por un DataFrame (incluye el contenido de los textos)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class RegistroNominas:
+    """
+    Caché de proceso con conteo de referencias para las nóminas cargadas.
+
+    Cada nómina se guarda una sola vez por colegio y contenido; las sesiones
+    solo guardan la clave y sus propios filtros. Como Streamlit no avisa
+    cuando una sesión termina, las referencias expiran si la sesión no se
+    vuelve a ver en `ttl_sesion` segundos.
+    """
+
+    def __init__(self, ttl_sesion=3600):
+        self.ttl_sesion = ttl_sesion
+        self._lock = threading.Lock()
+        self._nominas = {}   # clave -> {"colegio", "df", "notas_areas", "bytes", "cargado", "sesiones"}
+        self._sesiones = {}  # sesion_id -> {"clave", "visto", "bytes_privados"}
+
+    def publicar(self, sesion_id, colegio, df, notas_areas=None):
+        """
+        Registra la nómina para la sesión y devuelve su clave; si ya existe se reutiliza la copia compartida.
+
+        `notas_areas` es el almacén opcional de notas por área curricular de la nómina.
+        """
+        clave = f"{colegio}:{huella_nomina(df)}"
+        if notas_areas is not None:
+            clave += f":{notas_areas.huella()}"
+        with self._lock:
+            if clave not in self._nominas:
+                compartida = df.copy(deep=True)
+                self._nominas[clave] = {
+                    "colegio": colegio,
+                    "df": compartida,
+                    "notas_areas": notas_areas,
+                    "bytes": memoria_df(compartida) + (notas_areas.memoria() if notas_areas is not None else 0),
+                    "cargado": time.time(),
+                    "sesiones": set()
+                }
+            self._asociar(sesion_id, clave)
+        return clave
+
+    def adquirir(self, sesion_id, clave):
+        """Asocia la sesión a una nómina ya registrada y devuelve el DataFrame compartido"""
+        with self._lock:
+            self._purgar()
+            if clave not in self._nominas:
+                return None
+            self._asociar(sesion_id, clave)
+            return self._nominas[clave]["df"]
+
+    def notas_areas(self, clave):
+        """Almacén de notas por área de una nómina registrada (None si no tiene)"""
+        with self._lock:
+            entrada = self._nominas.get(clave)
+            return entrada["notas_areas"] if entrada is not None else None
+
+    def nominas_de(self, colegio):
+        """Nóminas registradas para un colegio (la más reciente primero)"""
+        with self._lock:
+            self._purgar()
+            nominas = [
+                {"clave": clave, "estudiantes": len(e["df"]), "cargado": e["cargado"]}
+                for clave, e in self._nominas.items() if e["colegio"] == colegio
+            ]
+        return sorted(nominas, key=lambda n: n["cargado"], reverse=True)
+
+    def liberar(self, sesion_id):
+        """Quita la referencia de la sesión a su nómina"""
+        with self._lock:
+            self._soltar(sesion_id)
+
+    def reportar_privado(self, sesion_id, bytes_privados):
+        """Registra la memoria propia de la sesión (columnas derivadas, filtros)"""
+        with self._lock:
+            if sesion_id in self._sesiones:
+                self._sesiones[sesion_id]["bytes_privados"] = int(bytes_privados)
+                self._sesiones[sesion_id]["visto"] = time.time()
+
+    def memoria_por_colegio(self):
+        """Memoria compartida por colegio: nóminas, bytes y sesiones activas"""
+        with self._lock:
+            self._purgar()
+            filas = {}
+            for entrada in self._nominas.values():
+                fila = filas.setdefault(entrada["colegio"], {"Colegio": entrada["colegio"], "Nominas": 0, "Sesiones": 0, "MB": 0.0})
+                fila["Nominas"] += 1
+                fila["Sesiones"] += len(entrada["sesiones"])
+                fila["MB"] += entrada["bytes"] / 1e6
+        return pd.DataFrame(list(filas.values()), columns=["Colegio", "Nominas", "Sesiones", "MB"])
+
+    def memoria_por_sesion(self):
+        """Memoria por sesión: parte proporcional de la nómina compartida más la memoria propia"""
+        with self._lock:
+            self._purgar()
+            filas = []
+            for sesion_id, sesion in self._sesiones.items():
+                entrada = self._nominas[sesion["clave"]]
+                filas.append({
+                    "Sesion": sesion_id[:8],
+                    "Colegio": entrada["colegio"],
+                    "MB compartidos": entrada["bytes"] / len(entrada["sesiones"]) / 1e6,
+                    "MB propios": sesion["bytes_privados"] / 1e6
+                })
+        return pd.DataFrame(filas, columns=["Sesion", "Colegio", "MB compartidos", "MB propios"])
+
+    # Los métodos internos asumen que el lock ya está tomado
+    def _asociar(self, sesion_id, clave):
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is not None and sesion["clave"] != clave:
+            self._soltar(sesion_id)
+            sesion = None
+        if sesion is None:
+            sesion = {"clave": clave, "visto": time.time(), "bytes_privados": 0}
+            self._sesiones[sesion_id] = sesion
+        sesion["visto"] = time.time()
+        self._nominas[clave]["sesiones"].add(sesion_id)
+
+    def _soltar(self, sesion_id):
+        sesion = self._sesiones.pop(sesion_id, None)
+        if sesion is None:
+            return
+        entrada = self._nominas.get(sesion["clave"])
+        if entrada is not None:
+            entrada["sesiones"].discard(sesion_id)
+            if not entrada["sesiones"]:
+                del self._nominas[sesion["clave"]]
+
+    def _purgar(self):
+        limite = time.time() - self.ttl_sesion
+        for sesion_id in [s for s, datos in self._sesiones.items() if datos["visto"] < limite]:
+            self._soltar(sesion_id)
@@ -0,0 +1,118 @@
+"""Generación de reportes académicos en PDF"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+BIMESTRES = ["Bim1", "Bim2", "Bim3", "Bim4"]
+
+
+def generar_reporte_pdf(df, periodo, convertir_a_letras, progreso=None, notas_areas=None):
+    """
+    Genera un PDF con una página por fila de `df` (en su orden) y devuelve sus bytes.
+
+    `notas_areas` es opcional: (nombres de áreas, arreglo estudiantes × áreas × 4)
+    alineado con las filas de `df`, para agregar la tabla de notas por área.
+    """
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    for n, (_, datos) in enumerate(df.iterrows(), 1):
+        estudiante = datos["Estudiante"]
+
+        pdf.add_page()
+        pdf.set_font("Arial", 'B', 16)
+        pdf.cell(0, 10, f"Reporte Académico - {estudiante}", 0, 1, 'C')
+        pdf.ln(8)
+
+        pdf.set_font("Arial", '', 12)
+        pdf.cell(0, 10, f"Grado: {datos['Grado']} | DNI: {datos['DNI']}", 0, 1)
+        pdf.cell(0, 10, f"Periodo: {periodo}", 0, 1)
+        pdf.ln(10)
+
+        # Tabla de notas
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(45, 10, "Bimestre", 1, 0, 'C')
+        pdf.cell(35, 10, "Nota (0-20)", 1, 0, 'C')
+        if datos['Letra'] != '-':
+            pdf.cell(35, 10, "Escala", 1, 0, 'C')
+        pdf.ln()
+
+        pdf.set_font("Arial", '', 12)
+        for i, bim in enumerate(BIMESTRES, 1):
+            pdf.cell(45, 10, f"Bimestre {i}", 1, 0, 'C')
+            # Bimestre aún no evaluado
+            if pd.isna(datos[bim]):
+                pdf.cell(35, 10, "-", 1, 0, 'C')
+                if datos['Letra'] != '-':
+                    pdf.cell(35, 10, "-", 1, 0, 'C')
+                pdf.ln()
+                continue
+            pdf.cell(35, 10, str(datos[bim]), 1, 0, 'C')
+            if datos['Letra'] != '-':
+                pdf.cell(35, 10, convertir_a_letras(datos[bim], "Primaria" if "Primaria" in datos["Grado"] else "Secundaria"), 1, 0, 'C')
+            pdf.ln()
+
+        pdf.ln(8)
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(45, 10, "Promedio Final", 0, 0)
+        pdf.cell(35, 10, f"{datos['Promedio']:.1f}", 0, 0)
+        if datos['Letra'] != '-':
+            pdf.cell(35, 10, datos["Letra"], 0, 0)
+        pdf.ln(12)
+
+        pdf.cell(0, 10, f"Asistencia: {datos['Asistencia']}% | Estado: {datos['Estado']}", 0, 1)
+        pdf.ln(10)
+
+        # Notas por área curricular
+        if notas_areas is not None:
+            areas, cubo = notas_areas
+            pdf.set_font("Arial", 'B', 10)
+            pdf.cell(75, 7, "Área curricular", 1, 0, 'C')
+            for bim in BIMESTRES + ["Prom."]:
+                pdf.cell(20, 7, bim, 1, 0, 'C')
+            pdf.ln()
+            pdf.set_font("Arial", '', 9)
+            for area, notas in zip(areas, cubo[n - 1]):
+                if np.isnan(notas).all():
+                    continue
+                pdf.cell(75, 7, area, 1, 0)
+                for nota in notas:
+                    pdf.cell(20, 7, "-" if np.isnan(nota) else f"{nota:.0f}" if nota == int(nota) else f"{nota:.1f}", 1, 0, 'C')
+                pdf.cell(20, 7, f"{np.nanmean(notas):.1f}", 1, 0, 'C')
+                pdf.ln()
+            pdf.ln(8)
+
+        # Recomendaciones
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, "Recomendaciones:", 0, 1)
+        pdf.set_font("Arial", '', 12)
+
+        if datos['Estado'] == 'Aprobado':
+            pdf.multi_cell(0, 8, "El estudiante ha alcanzado los objetivos de aprendizaje establecidos. Se recomienda:", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Continuar con las estrategias pedagógicas actuales", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Mantener el buen desempeño y asistencia", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Proponer desafíos adicionales para alcanzar logros destacados", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        else:
+            pdf.multi_cell(0, 8, "El estudiante requiere apoyo en las siguientes áreas:", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Asistir a sesiones de reforzamiento en los bimestres con menor rendimiento", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Implementar estrategias de aprendizaje personalizadas", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Mejorar hábitos de estudio y participación en clase", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.multi_cell(0, 8, "- Revisar causas de inasistencia si aplica", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        pdf.ln(15)
+
+        if progreso is not None:
+            progreso(n / len(df), f"{n}/{len(df)} estudiantes")
+
+    # fpdf2 devuelve un bytearray
+    return bytes(pdf.output())
+
+
+def trabajo_reporte_pdf(progreso, df, periodo, convertir_a_letras, notas_areas=None):
+    """Versión para la cola de trabajos: devuelve (bytes, nombre de archivo, mime)"""
+    pdf_bytes = generar_reporte_pdf(df, periodo, convertir_a_letras, progreso, notas_areas)
+    nombre = f"reporte_academico_{datetime.datetime.now().strftime('%Y%m%d')}.pdf"
+    return pdf_bytes, nombre, "application/pdf"
@@ -0,0 +1,271 @@
+"""
+Servicio HTTP JSON con las reglas de calificación para integrarse con el SIS.
+
+Uso:
+    python servicio_calificacion.py --puerto 8502
+
+Endpoints:
+    POST /calificar  {"estudiantes": [{"Grado": ..., "Bim1": ..., ..., "Asistencia": ...}],
+                      "parametros": {"nota_minima_prim": 11, "nota_minima_sec": 10,
+                                     "asistencia_minima": 80, "usar_letras_sec": false}}
+    GET  /metricas   latencias p50/p99, solicitudes y tamaño de los lotes
+    GET  /salud
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from calificacion import ASISTENCIA_MINIMA, BIMESTRES, NOTA_MINIMA_PRIM, NOTA_MINIMA_SEC, calificar_arrays
+
+COLUMNAS_ENTRADA = ["Grado", *BIMESTRES, "Asistencia"]
+COLUMNAS_SALIDA = ["Promedio", "Nota_Minima", "Estado", "Letra"]
+PARAMETROS_DEFECTO = {
+    "nota_minima_prim": NOTA_MINIMA_PRIM,
+    "nota_minima_sec": NOTA_MINIMA_SEC,
+    "asistencia_minima": ASISTENCIA_MINIMA,
+    "usar_letras_sec": False
+}
+
+
+class ErrorSolicitud(ValueError):
+    """Solicitud con formato inválido (se responde con HTTP 400)"""
+
+
+def leer_parametros(datos):
+    """Combina los parámetros recibidos con los valores por defecto (los umbrales deben ser números finitos)"""
+    if not isinstance(datos, dict):
+        raise ErrorSolicitud("Se espera un objeto 'parametros'")
+    desconocidos = set(datos) - set(PARAMETROS_DEFECTO)
+    if desconocidos:
+        raise ErrorSolicitud(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}")
+    parametros = {**PARAMETROS_DEFECTO, **datos}
+    for nombre, valor in parametros.items():
+        if nombre == "usar_letras_sec":
+            if not isinstance(valor, bool):
+                raise ErrorSolicitud("'usar_letras_sec' debe ser true o false")
+        elif isinstance(valor, bool) or not isinstance(valor, (int, float)) or not np.isfinite(valor):
+            raise ErrorSolicitud(f"'{nombre}' debe ser un número")
+    return parametros
+
+
+def _numero(valor):
+    """Convierte un valor JSON a float (None o texto no numérico -> NaN)"""
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class Agrupador:
+    """
+    Junta las solicitudes concurrentes en micro-lotes y los califica en una sola pasada.
+
+    Cada solicitud deja sus estudiantes en una cola y espera un Future. Un hilo
+    toma lo que haya en la cola (hasta `max_estudiantes`, esperando a lo sumo
+    `max_espera_ms` a que lleguen más), arma una sola matriz de notas por
+    combinación de parámetros, llama a `calificar_arrays` y reparte los resultados.
+    """
+
+    def __init__(self, max_estudiantes=5000, max_espera_ms=2.0):
+        self.max_estudiantes = max_estudiantes
+        self.max_espera = max_espera_ms / 1000
+        self._cola = queue.Queue()
+        self._lotes = deque(maxlen=10000)
+        self._hilo = threading.Thread(target=self._bucle, name="agrupador", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, estudiantes, parametros):
+        """Encola una solicitud y devuelve un Future con la lista de resultados"""
+        futuro = Future()
+        self._cola.put((estudiantes, parametros, futuro))
+        return futuro
+
+    def tamanos_lote(self):
+        return list(self._lotes)
+
+    def _bucle(self):
+        while True:
+            pendientes = [self._cola.get()]
+            total = len(pendientes[0][0])
+            limite = time.monotonic() + self.max_espera
+            while total < self.max_estudiantes:
+                restante = limite - time.monotonic()
+                try:
+                    item = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                pendientes.append(item)
+                total += len(item[0])
+            self._procesar(pendientes)
+            self._lotes.append(total)
+
+    def _procesar(self, pendientes):
+        # Cualquier error falla solo las solicitudes del lote: el hilo agrupador nunca debe terminar
+        try:
+            self._calificar(pendientes)
+        except Exception as e:
+            for _, _, futuro in pendientes:
+                if not futuro.done():
+                    futuro.set_exception(e)
+
+    def _calificar(self, pendientes):
+        por_parametros = {}
+        for item in pendientes:
+            por_parametros.setdefault(tuple(sorted(item[1].items())), []).append(item)
+
+        for parametros, items in por_parametros.items():
+            try:
+                filas = [fila for estudiantes, _, _ in items for fila in estudiantes]
+                notas = np.array([[_numero(fila[b]) for b in BIMESTRES] for fila in filas], dtype=float).reshape(-1, len(BIMESTRES))
+                asistencia = np.array([_numero(fila["Asistencia"]) for fila in filas], dtype=float)
+                resultado = calificar_arrays([fila["Grado"] for fila in filas], notas, asistencia, **dict(parametros))
+                # tolist() entrega tipos de Python; NaN no es JSON válido y se devuelve como null
+                columnas = [resultado[col].tolist() for col in COLUMNAS_SALIDA]
+                registros = [
+                    {col: (None if isinstance(v, float) and v != v else v) for col, v in zip(COLUMNAS_SALIDA, valores)}
+                    for valores in zip(*columnas)
+                ]
+            except Exception as e:
+                for _, _, futuro in items:
+                    futuro.set_exception(e)
+                continue
+
+            inicio = 0
+            for estudiantes, _, futuro in items:
+                futuro.set_result(registros[inicio:inicio + len(estudiantes)])
+                inicio += len(estudiantes)
+
+
+class Metricas:
+    """Latencias recientes (ventana deslizante) y contadores del servicio"""
+
+    def __init__(self, ventana=20000):
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=ventana)
+        self.solicitudes = 0
+        self.errores = 0
+        self.estudiantes = 0
+        self.inicio = time.time()
+
+    def registrar(self, segundos, estudiantes=0, error=False):
+        with self._lock:
+            self._latencias.append(segundos)
+            self.solicitudes += 1
+            self.estudiantes += estudiantes
+            self.errores += int(error)
+
+    def resumen(self, tamanos_lote):
+        with self._lock:
+            latencias = np.array(self._latencias) * 1000
+            solicitudes, errores, estudiantes = self.solicitudes, self.errores, self.estudiantes
+        p50, p99 = np.percentile(latencias, [50, 99]) if len(latencias) else (0.0, 0.0)
+        return {
+            "solicitudes": solicitudes,
+            "errores": errores,
+            "estudiantes": estudiantes,
+            "latencia_p50_ms": round(float(p50), 3),
+            "latencia_p99_ms": round(float(p99), 3),
+            "lote_promedio": round(float(np.mean(tamanos_lote)), 1) if tamanos_lote else 0.0,
+            "lote_maximo": int(max(tamanos_lote)) if tamanos_lote else 0,
+            "segundos_activo": round(time.time() - self.inicio, 1)
+        }
+
+
+class ManejadorCalificacion(BaseHTTPRequestHandler):
+    """Manejador HTTP; `agrupador` y `metricas` se asignan al crear el servidor"""
+
+    protocol_version = "HTTP/1.1"  # conexiones persistentes (keep-alive)
+    # Cabeceras y cuerpo salen en dos escrituras: con Nagle, el cuerpo espera el ACK diferido del cliente (~40 ms)
+    disable_nagle_algorithm = True
+    agrupador = None
+    metricas = None
+
+    def log_message(self, formato, *args):
+        pass  # sin registro por solicitud: a miles de solicitudes por segundo satura la consola
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/salud":
+            self._responder(200, {"estado": "ok"})
+        elif self.path == "/metricas":
+            self._responder(200, self.metricas.resumen(self.agrupador.tamanos_lote()))
+        else:
+            self._responder(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        if self.path != "/calificar":
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+
+        inicio = time.perf_counter()
+        n_estudiantes = 0
+        try:
+            cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            estudiantes = cuerpo.get("estudiantes")
+            if not isinstance(estudiantes, list):
+                raise ErrorSolicitud("Se espera una lista 'estudiantes'")
+            if not all(isinstance(e, dict) for e in estudiantes):
+                raise ErrorSolicitud("Cada estudiante debe ser un objeto")
+            faltantes = {col for e in estudiantes for col in COLUMNAS_ENTRADA if col not in e}
+            if faltantes:
+                raise ErrorSolicitud(f"Faltan columnas: {', '.join(sorted(faltantes))}")
+            parametros = leer_parametros(cuerpo.get("parametros", {}))
+            n_estudiantes = len(estudiantes)
+            resultados = self.agrupador.enviar(estudiantes, parametros).result(timeout=30) if estudiantes else []
+        except (ErrorSolicitud, json.JSONDecodeError, AttributeError, TypeError) as e:
+            self.metricas.registrar(time.perf_counter() - inicio, error=True)
+            self._responder(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.metricas.registrar(time.perf_counter() - inicio, error=True)
+            self._responder(500, {"error": str(e)})
+            return
+
+        self.metricas.registrar(time.perf_counter() - inicio, n_estudiantes)
+        self._responder(200, {"estudiantes": resultados})
+
+
+class ServidorCalificacion(ThreadingHTTPServer):
+    """Servidor con un hilo por conexión y cola de conexiones amplia para ráfagas de clientes"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def crear_servidor(host="127.0.0.1", puerto=8502, max_estudiantes=5000, max_espera_ms=2.0):
+    """Crea el servidor HTTP (sin iniciarlo) con su agrupador y métricas"""
+    manejador = type("Manejador", (ManejadorCalificacion,), {
+        "agrupador": Agrupador(max_estudiantes, max_espera_ms),
+        "metricas": Metricas()
+    })
+    return ServidorCalificacion((host, puerto), manejador)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP de calificación MINEDU")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    parser.add_argument("--max-lote", type=int, default=5000, help="Máximo de estudiantes por micro-lote")
+    parser.add_argument("--max-espera-ms", type=float, default=2.0, help="Espera máxima para completar un micro-lote")
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.host, args.puerto, args.max_lote, args.max_espera_ms)
+    print(f"Servicio de calificación en http://{args.host}:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.shutdown()
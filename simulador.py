@@ -0,0 +1,72 @@
+"""Simulador de umbrales de aprobación (¿qué pasaría si...?)"""
+import numpy as np
+import pandas as pd
+
+NOTAS_MINIMAS = np.arange(0, 21)
+ASISTENCIAS_MINIMAS = np.arange(60, 101)
+
+
+class SimuladorAprobacion:
+    """
+    Precalcula la tasa de aprobación de cada grado para toda la grilla de umbrales.
+
+    Cada estudiante se ubica por búsqueda binaria en la grilla de notas y de
+    asistencia (cuántos umbrales cumple en cada eje). Con un conteo agrupado
+    y sumas acumuladas en reversa se obtiene, para cada combinación
+    (nota mínima, asistencia mínima), cuántos estudiantes cumplen ambas
+    condiciones. El costo es O(n log T + G·T²) en lugar de evaluar cada
+    escenario sobre toda la nómina, y cada consulta posterior es una
+    búsqueda binaria sobre la grilla.
+    """
+
+    def __init__(self, promedio, asistencia, grados, notas=NOTAS_MINIMAS, asistencias=ASISTENCIAS_MINIMAS):
+        self.notas = np.asarray(notas, dtype=float)
+        self.asistencias = np.asarray(asistencias, dtype=float)
+        self.grados, codigos = np.unique(np.asarray(grados).astype(str), return_inverse=True)
+
+        n_notas, n_asis = len(self.notas), len(self.asistencias)
+        promedio = np.asarray(promedio, dtype=float)
+        asistencia = np.asarray(asistencia, dtype=float)
+        # k = cantidad de umbrales que el estudiante cumple (umbral <= valor); sin dato no cumple ninguno
+        k_nota = np.where(np.isnan(promedio), 0, np.searchsorted(self.notas, promedio, side="right"))
+        k_asis = np.where(np.isnan(asistencia), 0, np.searchsorted(self.asistencias, asistencia, side="right"))
+
+        celdas = (codigos * (n_notas + 1) + k_nota) * (n_asis + 1) + k_asis
+        conteo = np.bincount(celdas, minlength=len(self.grados) * (n_notas + 1) * (n_asis + 1))
+        conteo = conteo.reshape(len(self.grados), n_notas + 1, n_asis + 1)
+
+        # aprobados[g, i, j] = estudiantes con k_nota > i y k_asis > j
+        acumulado = conteo[:, ::-1, ::-1].cumsum(axis=1).cumsum(axis=2)[:, ::-1, ::-1]
+        self.aprobados = acumulado[:, 1:, 1:]
+        self.totales = np.bincount(codigos, minlength=len(self.grados))
+
+    def tasas(self, grado=None):
+        """Matriz (notas × asistencias) con el % de aprobación de un grado o de toda la nómina"""
+        if grado is None:
+            aprobados, total = self.aprobados.sum(axis=0), self.totales.sum()
+        else:
+            g = self._indice_grado(grado)
+            aprobados, total = self.aprobados[g], self.totales[g]
+        return aprobados / max(total, 1) * 100
+
+    def consultar(self, nota_minima, asistencia_minima, grado=None):
+        """% de aprobación para un umbral concreto (se usa el siguiente punto de la grilla)"""
+        i = np.searchsorted(self.notas, nota_minima, side="left")
+        j = np.searchsorted(self.asistencias, asistencia_minima, side="left")
+        if i >= len(self.notas) or j >= len(self.asistencias):
+            return 0.0
+        return float(self.tasas(grado)[i, j])
+
+    def tabla(self, grado=None):
+        """Tasas como DataFrame con las notas mínimas en filas y la asistencia mínima en columnas"""
+        return pd.DataFrame(
+            self.tasas(grado),
+            index=pd.Index(self.notas.astype(int), name="Nota mínima"),
+            columns=pd.Index(self.asistencias.astype(int), name="Asistencia mínima (%)")
+        )
+
+    def _indice_grado(self, grado):
+        g = np.searchsorted(self.grados, str(grado))
+        if g >= len(self.grados) or self.grados[g] != str(grado):
+            raise KeyError(f"Grado no encontrado: {grado}")
+        return g
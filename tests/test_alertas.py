@@ -0,0 +1,77 @@
+"""Motor incremental de alertas frente a una reconstrucción desde cero"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from alertas import BIMESTRES, REGLAS, actualizar_motor, huella_columna, ranking_riesgo
+
+
+@pytest.fixture
+def nomina():
+    rng = np.random.default_rng(0)
+    estudiantes = 5000
+    return pd.DataFrame({
+        "DNI": (10_000_000 + np.arange(estudiantes)).astype(str),
+        **{b: rng.integers(0, 21, estudiantes).astype(float) for b in BIMESTRES},
+        "Asistencia": rng.integers(60, 101, estudiantes).astype(float)
+    })
+
+
+def comparar_con_reconstruccion(motor, nomina):
+    obtenidas = motor.evaluar(11, nomina["Asistencia"], 70)
+    esperadas = actualizar_motor(None, nomina).evaluar(11, nomina["Asistencia"], 70)
+    pd.testing.assert_frame_equal(obtenidas, esperadas)
+
+
+def test_carga_bimestre_a_bimestre(nomina):
+    motor = None
+    for k, bimestre in enumerate(BIMESTRES):
+        parcial = nomina[["DNI", *BIMESTRES[:k + 1], "Asistencia"]]
+        anterior = motor
+        motor = actualizar_motor(motor, parcial)
+        # Con los mismos DNI y bimestres sin cambios, el motor se actualiza en lugar de reconstruirse
+        assert anterior is None or motor is anterior
+        assert list(motor.huellas) == BIMESTRES[:k + 1]
+        comparar_con_reconstruccion(motor, parcial)
+
+
+def test_nomina_reordenada_reconstruye_el_motor(nomina):
+    motor = actualizar_motor(None, nomina)
+    reordenada = nomina.sample(frac=1, random_state=0).reset_index(drop=True)
+    nuevo = actualizar_motor(motor, reordenada)
+    assert nuevo is not motor
+    comparar_con_reconstruccion(nuevo, reordenada)
+
+
+def test_notas_intercambiadas_cambian_la_huella(nomina):
+    motor = actualizar_motor(None, nomina)
+    intercambio = nomina.copy()
+    j = int(np.flatnonzero(nomina["Bim1"].to_numpy() != nomina["Bim1"].iloc[0])[0])
+    intercambio.loc[[0, j], "Bim1"] = nomina.loc[[j, 0], "Bim1"].to_numpy()
+
+    assert huella_columna(intercambio["Bim1"].to_numpy()) != motor.huellas["Bim1"]
+    nuevo = actualizar_motor(motor, intercambio)
+    assert nuevo is not motor
+    comparar_con_reconstruccion(nuevo, intercambio)
+
+
+def test_misma_clave_no_recalcula_huellas(nomina, monkeypatch):
+    motor = actualizar_motor(None, nomina, clave="colegio:abc")
+    monkeypatch.setattr("alertas.huella_columna", lambda valores: pytest.fail("no debe recalcular huellas"))
+    assert actualizar_motor(motor, nomina, clave="colegio:abc") is motor
+
+
+def test_otra_clave_revisa_la_nomina(nomina):
+    motor = actualizar_motor(None, nomina[["DNI", "Bim1", "Asistencia"]], clave="colegio:bim1")
+    motor = actualizar_motor(motor, nomina, clave="colegio:bim4")
+    assert motor.clave == "colegio:bim4"
+    assert list(motor.huellas) == BIMESTRES
+    comparar_con_reconstruccion(motor, nomina)
+
+
+def test_ranking_riesgo_ordena_por_puntaje(nomina):
+    alertas = actualizar_motor(None, nomina[["DNI", "Bim1", "Bim2", "Asistencia"]]).evaluar(11, nomina["Asistencia"], 70)
+    ranking = ranking_riesgo(nomina, alertas)
+    assert ranking["Puntaje"].is_monotonic_decreasing
+    assert ranking[list(REGLAS)].any(axis=1).all()
+    assert len(ranking) == alertas[list(REGLAS)].any(axis=1).sum()
@@ -0,0 +1,142 @@
+"""Flujo por lotes de analisis_ia contra la API simulada (api_simulada.py)"""
+import json
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+import analisis_ia
+from analisis_ia import AlmacenAnalisis, ErrorAPIClaude, SeguidorLotes
+from api_simulada import crear_servidor
+from trabajos import ColaTrabajos
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """API simulada en un puerto libre, con los lotes terminados al crearse"""
+    servidor = crear_servidor(puerto=0, demora=0)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(analisis_ia, "API_URL", f"{servidor.base_url}/v1/messages")
+    monkeypatch.setattr(analisis_ia, "BATCHES_URL", f"{servidor.base_url}/v1/messages/batches")
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenAnalisis(str(tmp_path / "analisis.db"))
+
+
+def estudiantes(n):
+    return [(f"{70000000 + i}", f"Estudiante {i}", f"Estudiante: Estudiante {i}\nPromedio: {10 + i % 10}") for i in range(n)]
+
+
+def nomina(n):
+    return pd.DataFrame({
+        "DNI": [f"{70000000 + i}" for i in range(n)],
+        "Estudiante": [f"Estudiante {i}" for i in range(n)],
+        "Grado": "1° Primaria",
+        "Bim1": 12, "Bim2": 14, "Bim3": 15, "Bim4": 16,
+        "Promedio": 14.25, "Letra": "A", "Asistencia": 95, "Estado": "Aprobado", "Conducta": "Bueno"
+    })
+
+
+def estado_envio(almacen, envio_id):
+    with sqlite3.connect(almacen.ruta_db) as con:
+        return con.execute("SELECT estado FROM envios WHERE id = ?", (envio_id,)).fetchone()[0]
+
+
+def test_analizar_por_lotes_genera_y_luego_reutiliza(api, almacen, monkeypatch):
+    monkeypatch.setattr(analisis_ia, "MAX_SOLICITUDES_LOTE", 7)
+    assert analisis_ia.analizar_por_lotes("clave", estudiantes(20), almacen, intervalo=0) == (20, 0, 0)
+    assert analisis_ia.analizar_por_lotes("clave", estudiantes(20), almacen, intervalo=0) == (0, 0, 20)
+
+    guardados = almacen.buscar((dni, analisis_ia.huella_prompt(prompt)) for dni, _, prompt in estudiantes(20))
+    assert len(guardados) == 20
+    assert "Estudiante 3" in guardados[("70000003", analisis_ia.huella_prompt(estudiantes(20)[3][2]))]
+
+
+def test_analizar_por_lotes_cuenta_solicitudes_fallidas(api, almacen):
+    api.lotes.tasa_error = 0.3
+    generados, fallidos, reutilizados = analisis_ia.analizar_por_lotes("clave", estudiantes(50), almacen, intervalo=0)
+    assert fallidos > 0
+    assert generados + fallidos == 50 and reutilizados == 0
+
+
+def test_trabajo_en_cola_queda_en_espera_y_el_seguidor_lo_completa(api, almacen, tmp_path):
+    cola = ColaTrabajos(str(tmp_path / "trabajos.db"), trabajadores=1)
+    seguidor = SeguidorLotes(almacen, cola, iniciar=False)
+    trabajo_id = cola.enviar("analisis_ia", "Análisis", analisis_ia.trabajo_analisis_batches, "clave", nomina(5), seguidor)
+    cola._pool.shutdown(wait=True)
+    assert cola.estado(trabajo_id)["estado"] == "en_espera"
+
+    assert seguidor.revisar() == 0
+    assert cola.estado(trabajo_id)["estado"] == "terminado"
+    informe = cola.datos_resultado(trabajo_id).decode("utf-8")
+    assert "5 generados por lotes, 0 reutilizados, 0 con error" in informe
+    assert estado_envio(almacen, trabajo_id) == "terminado"
+
+
+def test_envio_retomado_espera_la_api_key(api, almacen):
+    SeguidorLotes(almacen, iniciar=False).enviar("clave", [(d, n, "", p) for d, n, p in estudiantes(3)], "envio-1")
+    # Tras un reinicio la API Key solo está en memoria de la sesión que la ingrese
+    seguidor = SeguidorLotes(almacen, iniciar=False)
+    assert seguidor.revisar() == 1
+    seguidor.recordar_clave("clave")
+    assert seguidor.revisar() == 0
+    assert almacen.resultado_envio("envio-1") == (3, 0)
+
+
+def test_falla_al_crear_un_lote_marca_el_envio_con_error(api, almacen, monkeypatch):
+    monkeypatch.setattr(analisis_ia, "MAX_SOLICITUDES_LOTE", 2)
+    crear_lote = analisis_ia.crear_lote
+    llamadas = []
+
+    def crear_lote_fallido(api_key, solicitudes, timeout=60):
+        llamadas.append(len(solicitudes))
+        if len(llamadas) == 2:
+            raise ErrorAPIClaude(500)
+        return crear_lote(api_key, solicitudes, timeout)
+
+    monkeypatch.setattr(analisis_ia, "crear_lote", crear_lote_fallido)
+    seguidor = SeguidorLotes(almacen, iniciar=False)
+    with pytest.raises(ErrorAPIClaude):
+        seguidor.enviar("clave", [(d, n, "", p) for d, n, p in estudiantes(5)], "envio-1")
+
+    assert estado_envio(almacen, "envio-1") == "error"
+    assert almacen.envios_en_curso() == []
+    assert seguidor.revisar() == 0
+
+
+def test_custom_id_desconocido_marca_el_envio_y_el_trabajo_con_error(api, almacen, tmp_path):
+    cola = ColaTrabajos(str(tmp_path / "trabajos.db"), trabajadores=1)
+    seguidor = SeguidorLotes(almacen, cola, iniciar=False)
+    trabajo_id = cola.enviar("analisis_ia", "Análisis", analisis_ia.trabajo_analisis_batches, "clave", nomina(3), seguidor)
+    cola._pool.shutdown(wait=True)
+    # El mapa guardado del lote no coincide con los custom_id que devuelve la API
+    with sqlite3.connect(almacen.ruta_db) as con:
+        con.execute("UPDATE lotes SET solicitudes = ?", (json.dumps({"otro": ["1", "X", "h"]}),))
+
+    assert seguidor.revisar() == 0
+    assert estado_envio(almacen, trabajo_id) == "error"
+    estado = cola.estado(trabajo_id)
+    assert estado["estado"] == "error" and "KeyError" in estado["error"]
+
+
+def test_errores_transitorios_se_reintentan(api, almacen, monkeypatch):
+    seguidor = SeguidorLotes(almacen, iniciar=False)
+    seguidor.enviar("clave", [(d, n, "", p) for d, n, p in estudiantes(3)], "envio-1")
+    consultar_lote = analisis_ia.consultar_lote
+
+    def sobrecargada(api_key, lote_id, timeout=30):
+        raise ErrorAPIClaude(529)
+
+    monkeypatch.setattr(analisis_ia, "consultar_lote", sobrecargada)
+    assert seguidor.revisar() == 1
+    assert estado_envio(almacen, "envio-1") == "en_curso"
+
+    monkeypatch.setattr(analisis_ia, "consultar_lote", consultar_lote)
+    assert seguidor.revisar() == 0
+    assert almacen.resultado_envio("envio-1") == (3, 0)
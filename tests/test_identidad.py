@@ -0,0 +1,137 @@
+"""Enlace de identidades entre nóminas sintéticas con ruido realista"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from identidad import DNI_REVISAR, duplicados_nomina, enlazar_nominas, normalizar_nombre
+
+
+_NOMBRES = [
+    "Juan", "José", "Luis", "Carlos", "Jorge", "Miguel", "Ángel", "Diego", "Jesús", "Víctor", "César", "Raúl",
+    "Óscar", "Héctor", "Iván", "Gerardo", "Guillermo", "Wilmer", "Jhon", "Kevin", "Piero", "Renzo", "Sebastián",
+    "Mateo", "Santiago", "Joaquín", "Thiago", "Gael", "Adrián", "Fabián", "María", "Rosa", "Ana", "Lucía",
+    "Sofía", "Valeria", "Camila", "Ximena", "Jimena", "Milagros", "Yesenia", "Gisela", "Rocío", "Cinthia",
+    "Génesis", "Luciana", "Valentina", "Isabella", "Mía", "Zoe", "Fernanda", "Nicole", "Daniela", "Gabriela",
+    "Andrea", "Angélica", "Beatriz", "Carmen", "Elena", "Flor", "Gloria", "Inés", "Juana", "Karen", "Liliana"
+]
+_APELLIDOS = [
+    "Quispe", "Flores", "Sánchez", "Rodríguez", "García", "Rojas", "Huamán", "Mamani", "Chávez", "Vásquez",
+    "Ramírez", "Torres", "Díaz", "Mendoza", "Castillo", "López", "Gonzales", "Pérez", "Ramos", "Espinoza",
+    "Gutiérrez", "Hernández", "Cruz", "Condori", "Vargas", "Castro", "Ruiz", "Romero", "Salazar", "Córdova",
+    "Paredes", "Ccahuana", "Llanos", "Yupanqui", "Huillca", "Ticona", "Apaza", "Cáceres", "Zapata", "Villanueva",
+    "Cárdenas", "Aguilar", "Medina", "Silva", "Soto", "Núñez", "Guerrero", "Jiménez", "Valverde", "Zegarra",
+    "Benavides", "Villegas", "Cuadros", "Gálvez", "Herrera", "Ayala", "Meza", "Palomino", "Cahuana", "Ñahui"
+]
+
+
+def _variante(nombres, rng, tasa_tilde, tasa_tipeo):
+    """Nombres con tildes perdidas y faltas de ortografía al azar (como los escribe otro docente)"""
+    nombres = pd.Series(nombres, dtype=object)
+    sin_tilde = rng.random(len(nombres)) < tasa_tilde
+    nombres[sin_tilde] = normalizar_nombre(nombres[sin_tilde]).str.title()
+    for i in np.flatnonzero(rng.random(len(nombres)) < tasa_tipeo):
+        palabras = nombres[i].split()
+        j = rng.integers(len(palabras))
+        p = palabras[j]
+        k = rng.integers(1, max(len(p) - 1, 2))
+        palabras[j] = p[:k] + p[k + 1:] if rng.random() < 0.5 else p[:k] + {"v": "b", "b": "v", "s": "z", "z": "s"}.get(p[k], p[k]) + p[k + 1:]
+        nombres[i] = " ".join(palabras)
+    return nombres
+
+
+def nominas_sinteticas(estudiantes, semilla=0):
+    """
+    Dos nóminas de años consecutivos con el mismo alumnado (90 %) y ruido realista.
+
+    En la segunda el DNI se escribe con otros formatos, a veces falta o
+    tiene un dígito mal, y los nombres pierden tildes o tienen faltas. Unos
+    pocos estudiantes tienen un homónimo con un DNI que difiere en un dígito.
+    La columna Persona es la identidad real, para medir el enlace.
+    """
+    rng = np.random.default_rng(semilla)
+    nombres = (
+        pd.Series(rng.choice(_NOMBRES, estudiantes)) + " "
+        + np.where(rng.random(estudiantes) < 0.4, pd.Series(rng.choice(_NOMBRES, estudiantes)) + " ", "")
+        + pd.Series(rng.choice(_APELLIDOS, estudiantes)) + " " + pd.Series(rng.choice(_APELLIDOS, estudiantes))
+    )
+    dni = pd.Series(rng.choice(np.arange(60_000_000, 80_000_000), estudiantes, replace=False)).astype(str)
+    # Homónimos (hermanos, primos) con DNI cercano: el homónimo toma el nombre y el DNI vecino de otro
+    homonimos = np.flatnonzero(rng.random(estudiantes) < 0.002)
+    homonimos = homonimos[homonimos + 1 < estudiantes]
+    vecino = (dni[homonimos].astype(np.int64) + 1).astype(str)
+    libre = ~vecino.isin(dni).to_numpy()
+    nombres[homonimos[libre] + 1] = nombres[homonimos[libre]].to_numpy()
+    dni[homonimos[libre] + 1] = vecino[libre].to_numpy()
+    anterior = pd.DataFrame({"Persona": np.arange(estudiantes), "Estudiante": nombres, "DNI": dni})
+
+    siguen = np.flatnonzero(rng.random(estudiantes) < 0.9)
+    nuevos = max(estudiantes - len(siguen), 0)
+    actual = anterior.iloc[siguen].reset_index(drop=True)
+    actual["Estudiante"] = _variante(actual["Estudiante"], rng, 0.3, 0.05)
+    formato = rng.choice(4, len(actual), p=[0.7, 0.1, 0.1, 0.1])
+    dni_actual = actual["DNI"].to_numpy(dtype=object)
+    dni_actual[formato == 1] = [f"{d[:2]}.{d[2:5]}.{d[5:]}" for d in dni_actual[formato == 1]]
+    dni_actual[formato == 2] = [f"{d[:2]} {d[2:5]} {d[5:]}" for d in dni_actual[formato == 2]]
+    dni_actual[formato == 3] = [f" {d} " for d in dni_actual[formato == 3]]
+    tipeo = np.flatnonzero(rng.random(len(actual)) < 0.02)
+    dni_actual[tipeo] = [d[:-1] + str((int(d[-1]) + 1) % 10) for d in actual["DNI"].to_numpy()[tipeo]]
+    dni_actual[rng.random(len(actual)) < 0.03] = ""
+    actual["DNI"] = dni_actual
+
+    ingresantes = pd.DataFrame({
+        "Persona": np.arange(estudiantes, estudiantes + nuevos),
+        "Estudiante": (pd.Series(rng.choice(_NOMBRES, nuevos)) + " " + pd.Series(rng.choice(_APELLIDOS, nuevos))
+                       + " " + pd.Series(rng.choice(_APELLIDOS, nuevos))).to_numpy(),
+        "DNI": rng.choice(np.arange(80_000_000, 90_000_000), nuevos, replace=False).astype(str)
+    })
+    actual = pd.concat([actual, ingresantes], ignore_index=True).sample(frac=1, random_state=semilla).reset_index(drop=True)
+    return anterior, actual
+
+
+@pytest.fixture(scope="module")
+def enlace():
+    anterior, actual = nominas_sinteticas(20_000)
+    registros, pares = enlazar_nominas({"anterior": anterior, "actual": actual})
+    registros["Persona"] = np.r_[anterior["Persona"].to_numpy(), actual["Persona"].to_numpy()]
+    return registros, pares
+
+
+def test_exhaustividad_entre_anios(enlace):
+    registros, _ = enlace
+    # Un estudiante de la nómina actual está bien enlazado si su grupo contiene su registro del año anterior
+    previo = registros[registros["Origen"] == "anterior"].set_index("Persona")["ID_Persona"]
+    actuales = registros[registros["Origen"] == "actual"]
+    sigue = actuales["Persona"].isin(previo.index)
+    acierto = sigue & (actuales["Persona"].map(previo) == actuales["ID_Persona"])
+    assert acierto.sum() / sigue.sum() >= 0.97
+
+
+def test_precision_entre_anios(enlace):
+    registros, _ = enlace
+    cruzados = registros.groupby("ID_Persona")["Origen"].transform("nunique") > 1
+    previo = registros[registros["Origen"] == "anterior"].set_index("Persona")["ID_Persona"]
+    actuales = registros[registros["Origen"] == "actual"]
+    enlazados = actuales[cruzados[actuales.index]]
+    assert (enlazados["Persona"].map(previo) == enlazados["ID_Persona"]).mean() >= 0.999
+
+
+def test_homonimos_con_dni_cercano_no_se_fusionan(enlace):
+    registros, pares = enlace
+    assert registros.groupby("ID_Persona")["Persona"].nunique().gt(1).sum() == 0
+    assert (pares["Decision"] == DNI_REVISAR).any()
+
+
+def test_duplicados_nomina_con_formato_y_tildes():
+    nomina = pd.DataFrame({
+        "Estudiante": ["María Pérez Quispe", "Maria Perez Quispe", "José Huamán Flores", "Ana Rojas Torres"],
+        "DNI": ["12.345.678", "12345678", "87654321", "11223344"],
+        "Grado": ["1° Primaria"] * 4
+    })
+    grupos = duplicados_nomina(nomina)
+    assert grupos["Fila"].tolist() == [0, 1]
+    assert grupos["Grupo"].nunique() == 1
+
+
+def test_duplicados_nomina_vacia():
+    vacia = pd.DataFrame({"Estudiante": pd.Series(dtype=object), "DNI": pd.Series(dtype=object)})
+    assert duplicados_nomina(vacia).empty
@@ -0,0 +1,30 @@
+"""Publicación de instantáneas desde varios hilos del mismo proceso"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from instantaneas import huella_guardada, publicar_instantanea, renovar_token, token_instantanea
+
+
+def test_publicaciones_concurrentes_no_comparten_el_temporal(tmp_path):
+    directorio = str(tmp_path)
+    token = renovar_token(directorio, "0123456:clave")
+
+    def publicar(i):
+        return publicar_instantanea(directorio, token, f"{i:016x}", lambda: f'<meta name="huella" content="{i:016x}">' + "x" * 200_000)
+
+    with ThreadPoolExecutor(8) as pool:
+        rutas = {ruta for ruta, _ in pool.map(publicar, range(32))}
+
+    assert len(rutas) == 1
+    assert int(huella_guardada(rutas.pop()), 16) in range(32)
+    assert sorted(os.listdir(directorio)) == sorted(["indice.json", f"{token}.html"])
+
+
+def test_renovaciones_concurrentes_dejan_un_indice_valido(tmp_path):
+    directorio = str(tmp_path)
+    colegios = [f"{i:07d}:clave" for i in range(16)]
+    with ThreadPoolExecutor(8) as pool:
+        tokens = dict(zip(colegios, pool.map(lambda colegio: renovar_token(directorio, colegio), colegios)))
+
+    assert {colegio: token_instantanea(directorio, colegio) for colegio in colegios} == tokens
+    assert os.listdir(directorio) == ["indice.json"]
@@ -0,0 +1,100 @@
+"""Servicio HTTP de calificación: respuestas, validación y carga concurrente en localhost"""
+import http.client
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from calificacion import BIMESTRES, calificar_arrays
+from servicio_calificacion import crear_servidor
+
+
+@pytest.fixture
+def servicio():
+    servidor = crear_servidor(puerto=0)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor.server_address
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def solicitar(direccion, metodo, ruta, cuerpo=None):
+    conexion = http.client.HTTPConnection(*direccion, timeout=30)
+    conexion.request(metodo, ruta, body=None if cuerpo is None else json.dumps(cuerpo).encode("utf-8"),
+                     headers={"Content-Type": "application/json"})
+    respuesta = conexion.getresponse()
+    datos = json.loads(respuesta.read())
+    conexion.close()
+    return respuesta.status, datos
+
+
+def estudiantes(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return [
+        {
+            "Grado": str(rng.choice(["2° Primaria", "4° Secundaria"])),
+            **{b: int(rng.integers(0, 21)) for b in BIMESTRES},
+            "Asistencia": int(rng.integers(60, 101))
+        }
+        for _ in range(n)
+    ]
+
+
+def test_califica_igual_que_calificar_arrays(servicio):
+    lista = estudiantes(50)
+    estado, datos = solicitar(servicio, "POST", "/calificar", {"estudiantes": lista, "parametros": {"nota_minima_prim": 12}})
+    assert estado == 200
+
+    esperado = calificar_arrays(
+        [e["Grado"] for e in lista], np.array([[e[b] for b in BIMESTRES] for e in lista], dtype=float),
+        np.array([e["Asistencia"] for e in lista], dtype=float), nota_minima_prim=12
+    )
+    assert [r["Estado"] for r in datos["estudiantes"]] == list(esperado["Estado"])
+    assert [r["Promedio"] for r in datos["estudiantes"]] == pytest.approx(list(esperado["Promedio"]))
+
+
+@pytest.mark.parametrize("cuerpo", [
+    {"estudiantes": "no es una lista"},
+    {"estudiantes": [1, 2]},
+    {"estudiantes": [{"Grado": "1° Primaria"}]},
+    {"estudiantes": [], "parametros": {"nota_minima_prim": "once"}},
+    {"estudiantes": [], "parametros": {"desconocido": 1}}
+])
+def test_solicitudes_invalidas_responden_400(servicio, cuerpo):
+    estado, datos = solicitar(servicio, "POST", "/calificar", cuerpo)
+    assert estado == 400 and datos["error"]
+
+
+def test_carga_concurrente_se_agrupa_en_micro_lotes(servicio):
+    cuerpo = json.dumps({"estudiantes": estudiantes(1)}).encode("utf-8")
+    resultados, lock = [], threading.Lock()
+    fin = time.monotonic() + 1.5
+
+    def cliente():
+        # Conexión persistente por cliente, como un SIS con keep-alive
+        conexion = http.client.HTTPConnection(*servicio, timeout=30)
+        propios = []
+        while time.monotonic() < fin:
+            conexion.request("POST", "/calificar", body=cuerpo, headers={"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            propios.append(respuesta.status)
+        conexion.close()
+        with lock:
+            resultados.extend(propios)
+
+    hilos = [threading.Thread(target=cliente) for _ in range(16)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert resultados and set(resultados) == {200}
+    _, metricas = solicitar(servicio, "GET", "/metricas")
+    assert metricas["errores"] == 0
+    assert metricas["solicitudes"] == len(resultados)
+    # Con 16 clientes a la vez, el agrupador junta varias solicitudes en un mismo lote
+    assert metricas["lote_maximo"] > 1
+    assert 0 < metricas["latencia_p50_ms"] <= metricas["latencia_p99_ms"]
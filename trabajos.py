@@ -0,0 +1,173 @@
+"""Cola local de trabajos en segundo plano (reportes PDF, análisis IA por lotes)"""
+import sqlite3
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+ESTADOS_ACTIVOS = ("pendiente", "en_curso", "en_espera")
+# Estados que ocupan el pool; "en_espera" lo completa otro proceso (p. ej. el seguidor de lotes) y sobrevive a un reinicio
+_ESTADOS_EN_POOL = ("pendiente", "en_curso")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    propietario TEXT,
+    tipo TEXT NOT NULL,
+    descripcion TEXT,
+    estado TEXT NOT NULL,
+    progreso REAL NOT NULL DEFAULT 0,
+    mensaje TEXT,
+    creado REAL NOT NULL,
+    terminado REAL,
+    nombre_archivo TEXT,
+    mime TEXT,
+    resultado BLOB,
+    error TEXT
+)
+"""
+
+_COLUMNAS_RESUMEN = "id, propietario, tipo, descripcion, estado, progreso, mensaje, creado, terminado, nombre_archivo, mime, error"
+
+
+class EnEspera:
+    """Valor de retorno de una tarea que seguirá fuera del pool (ver `ColaTrabajos`)"""
+
+    def __init__(self, mensaje=None, progreso=0.0):
+        self.mensaje = mensaje
+        self.progreso = progreso
+
+
+class ColaTrabajos:
+    """
+    Ejecuta tareas largas en un pool de hilos fuera del hilo del script de Streamlit.
+
+    El estado de cada trabajo (progreso, resultado, error) se guarda en una
+    tabla SQLite, así que sobrevive a los reruns de la página y puede
+    consultarse desde cualquier sesión. La función de cada trabajo recibe
+    como primer argumento un callback `progreso(fraccion, mensaje)` y debe
+    devolver una tupla `(datos_bytes, nombre_archivo, mime)`.
+
+    Una tarea que solo inicia algo que termina fuera del pool (un lote en la
+    API) devuelve `EnEspera`: el trabajo libera su hilo y queda en espera
+    hasta que quien lo siga llame a `completar` o `fallar` con su
+    identificador (`progreso.trabajo_id`).
+    """
+
+    def __init__(self, ruta_db="trabajos.db", trabajadores=2, retencion_horas=24):
+        self.ruta_db = ruta_db
+        self.retencion_horas = retencion_horas
+        self._pool = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="trabajo")
+        with self._conexion() as con:
+            con.execute(_ESQUEMA)
+            # Los trabajos que quedaron a medias en un reinicio del servidor no pueden retomarse
+            con.execute(
+                "UPDATE trabajos SET estado = 'interrumpido', terminado = ? WHERE estado IN (?, ?)",
+                (time.time(), *_ESTADOS_EN_POOL)
+            )
+        self._limpiar()
+
+    @contextmanager
+    def _conexion(self):
+        con = sqlite3.connect(self.ruta_db, timeout=30)
+        con.row_factory = sqlite3.Row
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def enviar(self, tipo, descripcion, funcion, *args, propietario=None, **kwargs):
+        """Encola un trabajo y devuelve su identificador"""
+        trabajo_id = uuid.uuid4().hex
+        with self._conexion() as con:
+            con.execute(
+                "INSERT INTO trabajos (id, propietario, tipo, descripcion, estado, creado) VALUES (?, ?, ?, ?, 'pendiente', ?)",
+                (trabajo_id, propietario, tipo, descripcion, time.time())
+            )
+        self._pool.submit(self._ejecutar, trabajo_id, funcion, args, kwargs)
+        return trabajo_id
+
+    def _ejecutar(self, trabajo_id, funcion, args, kwargs):
+        self._actualizar(trabajo_id, estado="en_curso")
+        ultimo = [0.0]
+
+        def progreso(fraccion, mensaje=None):
+            # Limita las escrituras a la base de datos a unas pocas por segundo
+            ahora = time.monotonic()
+            if ahora - ultimo[0] >= 0.5 or fraccion >= 1:
+                ultimo[0] = ahora
+                self._actualizar(trabajo_id, progreso=min(max(float(fraccion), 0.0), 1.0), mensaje=mensaje)
+
+        progreso.trabajo_id = trabajo_id
+        try:
+            resultado = funcion(progreso, *args, **kwargs)
+            if isinstance(resultado, EnEspera):
+                self._actualizar(trabajo_id, estado="en_espera", progreso=resultado.progreso, mensaje=resultado.mensaje)
+            else:
+                self.completar(trabajo_id, *resultado)
+        except Exception as e:
+            self.fallar(trabajo_id, f"{e}\n{traceback.format_exc(limit=3)}")
+
+    def avanzar(self, trabajo_id, fraccion, mensaje=None):
+        """Actualiza el progreso de un trabajo en espera"""
+        self._actualizar(trabajo_id, progreso=min(max(float(fraccion), 0.0), 1.0), mensaje=mensaje)
+
+    def completar(self, trabajo_id, datos, nombre_archivo, mime):
+        """Guarda el resultado de un trabajo y lo marca como terminado"""
+        self._actualizar(
+            trabajo_id, estado="terminado", progreso=1.0, terminado=time.time(),
+            resultado=sqlite3.Binary(datos), nombre_archivo=nombre_archivo, mime=mime
+        )
+
+    def fallar(self, trabajo_id, error):
+        """Marca un trabajo como fallido"""
+        self._actualizar(trabajo_id, estado="error", terminado=time.time(), error=error)
+
+    def _actualizar(self, trabajo_id, **campos):
+        asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._conexion() as con:
+            con.execute(f"UPDATE trabajos SET {asignaciones} WHERE id = ?", (*campos.values(), trabajo_id))
+
+    def _limpiar(self):
+        limite = time.time() - self.retencion_horas * 3600
+        with self._conexion() as con:
+            con.execute("DELETE FROM trabajos WHERE terminado IS NOT NULL AND terminado < ?", (limite,))
+
+    def estado(self, trabajo_id):
+        """Resumen del trabajo (sin el resultado binario) o None si no existe"""
+        with self._conexion() as con:
+            fila = con.execute(f"SELECT {_COLUMNAS_RESUMEN} FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        return dict(fila) if fila else None
+
+    def listar(self, propietario=None, limite=20):
+        """Trabajos más recientes, opcionalmente solo los de un propietario"""
+        consulta = f"SELECT {_COLUMNAS_RESUMEN} FROM trabajos"
+        parametros = ()
+        if propietario is not None:
+            consulta += " WHERE propietario = ?"
+            parametros = (propietario,)
+        consulta += " ORDER BY creado DESC LIMIT ?"
+        with self._conexion() as con:
+            filas = con.execute(consulta, (*parametros, limite)).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def resultado(self, trabajo_id):
+        """Devuelve `(datos_bytes, nombre_archivo, mime)` de un trabajo terminado, o None"""
+        with self._conexion() as con:
+            fila = con.execute(
+                "SELECT resultado, nombre_archivo, mime FROM trabajos WHERE id = ? AND estado = 'terminado'",
+                (trabajo_id,)
+            ).fetchone()
+        return (bytes(fila["resultado"]), fila["nombre_archivo"], fila["mime"]) if fila else None
+
+    def datos_resultado(self, trabajo_id):
+        """Solo los bytes del resultado (vacío si el trabajo ya no existe), para descargas diferidas"""
+        resultado = self.resultado(trabajo_id)
+        return resultado[0] if resultado else b""
+
+    def eliminar(self, trabajo_id):
+        """Borra un trabajo que ya no está activo"""
+        with self._conexion() as con:
+            con.execute("DELETE FROM trabajos WHERE id = ? AND estado NOT IN (?, ?, ?)", (trabajo_id, *ESTADOS_ACTIVOS))
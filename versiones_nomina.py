@@ -0,0 +1,328 @@
+"""Versiones de la nómina por colegio: carga incremental y reporte de cambios entre cargas sucesivas"""
+import hashlib
+import itertools
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from alertas import REGLAS, actualizar_motor, ranking_riesgo
+from calificacion import calificar_arrays, normalizar_dni
+from identidad import enlazar_nominas
+
+BIMESTRES = ["Bim1", "Bim2", "Bim3", "Bim4"]
+COLUMNAS_TEXTO = ["Estudiante", "Grado", "Seccion", "Conducta"]
+COLUMNAS_NUMERICAS = [*BIMESTRES, "Asistencia"]
+COLUMNAS_VERSION = COLUMNAS_TEXTO + COLUMNAS_NUMERICAS
+
+_ESQUEMA_FILAS = """
+CREATE TABLE IF NOT EXISTS filas (
+    colegio TEXT NOT NULL,
+    dni TEXT NOT NULL,
+    huella INTEGER NOT NULL,
+    estudiante TEXT,
+    grado TEXT,
+    seccion TEXT,
+    conducta TEXT,
+    bim1 REAL,
+    bim2 REAL,
+    bim3 REAL,
+    bim4 REAL,
+    asistencia REAL,
+    PRIMARY KEY (colegio, dni)
+) WITHOUT ROWID
+"""
+
+_ESQUEMA_VERSIONES = """
+CREATE TABLE IF NOT EXISTS versiones (
+    colegio TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    cargado REAL NOT NULL,
+    estudiantes INTEGER NOT NULL,
+    insertados INTEGER NOT NULL,
+    modificados INTEGER NOT NULL,
+    eliminados INTEGER NOT NULL,
+    huella TEXT,
+    PRIMARY KEY (colegio, version)
+)
+"""
+
+_COLUMNAS_SQL = ", ".join(c.lower() for c in COLUMNAS_VERSION)
+# Por encima de esta cantidad de DNI se lee el colegio completo en lugar de consultar por bloques
+_MAX_CONSULTA_DNI = 20_000
+
+
+def filas_canonicas(df):
+    """
+    Nómina reducida a las columnas versionadas, con tipos fijos e indexada por DNI normalizado.
+
+    Si un DNI se repite vale la última fila, como en una corrección al final
+    del archivo. Las filas sin DNI no se versionan.
+    """
+    datos = {}
+    for columna in COLUMNAS_TEXTO:
+        datos[columna] = df[columna].fillna("").astype(str).str.strip() if columna in df.columns else ""
+    for columna in COLUMNAS_NUMERICAS:
+        datos[columna] = pd.to_numeric(df[columna], errors="coerce").astype(float).round(2) if columna in df.columns else np.nan
+    canonicas = pd.DataFrame(datos, index=df.index)
+    canonicas.index = pd.Index(normalizar_dni(df["DNI"]).to_numpy(), name="DNI")
+    return canonicas[canonicas.index.notna() & ~canonicas.index.duplicated(keep="last")]
+
+
+def huellas_filas(canonicas):
+    """Hash de 64 bits de cada fila (DNI incluido), estable entre procesos"""
+    return pd.util.hash_pandas_object(canonicas, index=True).to_numpy().view(np.int64)
+
+
+def huella_version(huellas):
+    """Huella del contenido completo de una versión (no depende del orden de las filas)"""
+    return hashlib.sha1(np.sort(huellas).tobytes()).hexdigest()[:16]
+
+
+class CambiosNomina:
+    """
+    Diferencia entre una carga de la nómina y la versión anterior del colegio.
+
+    Solo guarda las filas que cambiaron: `actuales` (insertadas y modificadas,
+    valores nuevos), `anteriores` (modificadas, valores previos) y
+    `eliminadas`. Así el reporte cuesta en proporción al cambio y no al
+    tamaño de la nómina. `repetida` indica que la carga coincide con la
+    última versión, que se conserva sin crear otra.
+    """
+
+    def __init__(self, version, insertados, modificados, actuales, anteriores, eliminadas, sin_cambios, repetida=False):
+        self.version = version
+        self.repetida = repetida
+        self.insertados = insertados
+        self.modificados = modificados
+        self.actuales = actuales
+        self.anteriores = anteriores
+        self.eliminadas = eliminadas
+        self.sin_cambios = sin_cambios
+
+    @property
+    def primera(self):
+        """True si no había una versión anterior con la que comparar"""
+        return self.version == 1
+
+    def __len__(self):
+        return len(self.insertados) + len(self.modificados) + len(self.eliminadas)
+
+
+class VersionesNomina:
+    """
+    Última versión de la nómina de cada colegio en SQLite, una fila por DNI con su huella.
+
+    Al registrar una carga se comparan las huellas de sus filas con las
+    guardadas y solo se escriben las filas insertadas, modificadas o
+    eliminadas; la tabla `versiones` lleva el historial de cada carga.
+    Calcular las huellas de la carga y leer las guardadas (DNI y huella)
+    sigue costando en proporción a la nómina, no al cambio.
+    """
+
+    def __init__(self, ruta_db="versiones.db"):
+        self.ruta_db = ruta_db
+        with self._conexion() as con:
+            con.execute(_ESQUEMA_FILAS)
+            con.execute(_ESQUEMA_VERSIONES)
+            # Bases creadas antes de guardar la huella de cada versión
+            if "huella" not in {fila[1] for fila in con.execute("PRAGMA table_info(versiones)")}:
+                con.execute("ALTER TABLE versiones ADD COLUMN huella TEXT")
+
+    @contextmanager
+    def _conexion(self):
+        con = sqlite3.connect(self.ruta_db, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _filas(self, con, colegio, dnis):
+        """Valores guardados de los DNI indicados como DataFrame canónico"""
+        dnis = list(dnis)
+        if len(dnis) > _MAX_CONSULTA_DNI:
+            # Cambio masivo (p. ej. un bimestre nuevo): una sola lectura del colegio es más rápida
+            filas = con.execute(f"SELECT dni, {_COLUMNAS_SQL} FROM filas WHERE colegio = ?", (colegio,)).fetchall()
+        else:
+            filas = []
+            # SQLite limita la cantidad de parámetros por consulta
+            for i in range(0, len(dnis), 500):
+                bloque = dnis[i:i + 500]
+                filas += con.execute(
+                    f"SELECT dni, {_COLUMNAS_SQL} FROM filas WHERE colegio = ? AND dni IN ({', '.join('?' * len(bloque))})",
+                    [colegio, *bloque]
+                ).fetchall()
+        guardadas = pd.DataFrame(filas, columns=["DNI", *COLUMNAS_VERSION]).set_index("DNI")
+        guardadas[COLUMNAS_NUMERICAS] = guardadas[COLUMNAS_NUMERICAS].astype(float)
+        return guardadas.reindex(dnis) if len(dnis) > _MAX_CONSULTA_DNI else guardadas
+
+    def registrar(self, colegio, df):
+        """
+        Guarda la nómina como nueva versión del colegio y devuelve los cambios respecto a la anterior.
+
+        Si el contenido coincide con la última versión (la misma nómina
+        procesada otra vez) no se crea otra versión: se devuelve la última,
+        marcada como repetida y sin cambios.
+        """
+        canonicas = filas_canonicas(df)
+        huellas = huellas_filas(canonicas)
+        huella = huella_version(huellas)
+
+        with self._conexion() as con:
+            # Lectura y escritura en la misma transacción: dos cargas simultáneas no se pisan
+            con.execute("BEGIN IMMEDIATE")
+            ultima = con.execute(
+                "SELECT version, huella FROM versiones WHERE colegio = ? ORDER BY version DESC LIMIT 1", (colegio,)
+            ).fetchone()
+            if ultima and ultima[1] == huella:
+                vacio = canonicas.iloc[:0]
+                return CambiosNomina(
+                    version=ultima[0], insertados=vacio.index, modificados=vacio.index, actuales=vacio,
+                    anteriores=vacio, eliminadas=vacio, sin_cambios=len(canonicas), repetida=True
+                )
+            guardadas = con.execute("SELECT dni, huella FROM filas WHERE colegio = ?", (colegio,)).fetchall()
+            dni_previo = pd.Index([fila[0] for fila in guardadas])
+            huella_previa = np.fromiter((fila[1] for fila in guardadas), dtype=np.int64, count=len(guardadas))
+            del guardadas
+
+            posicion = dni_previo.get_indexer(canonicas.index)
+            nueva = posicion < 0
+            modificada = ~nueva & (np.append(huella_previa, 0)[posicion] != huellas)
+            # get_indexer en ambos sentidos (isin sobre índices de texto es mucho más lento)
+            eliminados = dni_previo[canonicas.index.get_indexer(dni_previo) < 0]
+            cambiadas = nueva | modificada
+
+            previas = self._filas(con, colegio, canonicas.index[modificada].append(eliminados))
+            actuales = canonicas[cambiadas]
+            # Columnas como listas de Python (las notas vacías como NULL): mucho más rápido que itertuples
+            columnas = [actuales[c].tolist() for c in COLUMNAS_TEXTO] + [
+                np.where(np.isnan(actuales[c].to_numpy()), None, actuales[c].to_numpy()).tolist()
+                for c in COLUMNAS_NUMERICAS
+            ]
+            con.executemany(
+                f"INSERT OR REPLACE INTO filas (colegio, dni, huella, {_COLUMNAS_SQL}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(COLUMNAS_VERSION))})",
+                zip(itertools.repeat(colegio), actuales.index.tolist(), huellas[cambiadas].tolist(), *columnas)
+            )
+            del columnas
+            con.executemany("DELETE FROM filas WHERE colegio = ? AND dni = ?", ((colegio, dni) for dni in eliminados))
+
+            version = con.execute(
+                "SELECT COALESCE(MAX(version), 0) + 1 FROM versiones WHERE colegio = ?", (colegio,)
+            ).fetchone()[0]
+            con.execute(
+                "INSERT INTO versiones (colegio, version, cargado, estudiantes, insertados, modificados, eliminados, huella) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (colegio, version, time.time(), len(canonicas), int(nueva.sum()), int(modificada.sum()), len(eliminados),
+                 huella)
+            )
+
+        return CambiosNomina(
+            version=version,
+            insertados=canonicas.index[nueva],
+            modificados=canonicas.index[modificada],
+            actuales=actuales,
+            anteriores=previas.loc[canonicas.index[modificada]].rename_axis("DNI"),
+            eliminadas=previas.loc[eliminados].rename_axis("DNI"),
+            sin_cambios=int((~cambiadas).sum())
+        )
+
+    def historial(self, colegio, limite=10):
+        """Últimas cargas registradas del colegio, de la más reciente a la más antigua"""
+        with self._conexion() as con:
+            filas = con.execute(
+                "SELECT version, cargado, estudiantes, insertados, modificados, eliminados FROM versiones "
+                "WHERE colegio = ? ORDER BY version DESC LIMIT ?",
+                (colegio, limite)
+            ).fetchall()
+        return pd.DataFrame(filas, columns=["Version", "Cargado", "Estudiantes", "Insertados", "Modificados", "Eliminados"])
+
+
+def _en_riesgo(filas, nota_minima_prim, nota_minima_sec, asistencia_minima):
+    """Alertas tempranas de un subconjunto de filas canónicas (mismas reglas que la pestaña de alertas)"""
+    filas = filas.reset_index()
+    nota_minima = calificar_arrays(
+        filas["Grado"].to_numpy(), filas[BIMESTRES].to_numpy(dtype=float), filas["Asistencia"].to_numpy(dtype=float),
+        nota_minima_prim, nota_minima_sec, asistencia_minima
+    )["Nota_Minima"]
+    alertas = actualizar_motor(None, filas).evaluar(nota_minima, filas["Asistencia"].to_numpy(), asistencia_minima)
+    return filas, alertas
+
+
+def reporte_cambios(cambios, nota_minima_prim, nota_minima_sec, asistencia_minima):
+    """
+    Reporte de una carga incremental con los umbrales vigentes.
+
+    Devuelve un diccionario con los bimestres recién cargados (celdas que
+    pasaron de vacías a tener nota), las correcciones de notas o asistencia
+    ya registradas, los cambios en los datos del estudiante, los estudiantes
+    que entran en riesgo, los retirados de la nómina y los reingresos (un
+    retirado y un nuevo que parecen la misma persona con otro DNI).
+    """
+    modificados = cambios.modificados
+    actuales, anteriores = cambios.actuales.loc[modificados], cambios.anteriores
+
+    # Comparación celda a celda solo entre las filas modificadas, en formato largo
+    nuevo_num, previo_num = actuales[COLUMNAS_NUMERICAS].to_numpy(), anteriores[COLUMNAS_NUMERICAS].to_numpy()
+    recien = ~np.isnan(nuevo_num) & np.isnan(previo_num)
+    # Una nota ya registrada que cambia o se borra es una corrección
+    corregida = ~np.isnan(previo_num) & (nuevo_num != previo_num)
+    fila, columna = np.nonzero(corregida)
+    correcciones = pd.DataFrame({
+        "DNI": modificados[fila],
+        "Estudiante": actuales["Estudiante"].to_numpy()[fila],
+        "Grado": actuales["Grado"].to_numpy()[fila],
+        "Campo": np.asarray(COLUMNAS_NUMERICAS)[columna],
+        "Anterior": previo_num[fila, columna],
+        "Nuevo": nuevo_num[fila, columna]
+    })
+    correcciones["Diferencia"] = (correcciones["Nuevo"] - correcciones["Anterior"]).round(2)
+
+    nuevo_txt, previo_txt = actuales[COLUMNAS_TEXTO].to_numpy(), anteriores[COLUMNAS_TEXTO].to_numpy()
+    fila, columna = np.nonzero(nuevo_txt != previo_txt)
+    datos = pd.DataFrame({
+        "DNI": modificados[fila],
+        "Campo": np.asarray(COLUMNAS_TEXTO)[columna],
+        "Anterior": previo_txt[fila, columna],
+        "Nuevo": nuevo_txt[fila, columna]
+    })
+
+    # Riesgo antes y después: solo se evalúan las filas que cambiaron
+    riesgo = pd.DataFrame()
+    if len(cambios.actuales):
+        filas, alertas = _en_riesgo(cambios.actuales, nota_minima_prim, nota_minima_sec, asistencia_minima)
+        en_riesgo = alertas[list(REGLAS)].any(axis=1).to_numpy()
+        antes = np.zeros(len(filas), dtype=bool)
+        if len(anteriores):
+            previas, alertas_previas = _en_riesgo(anteriores, nota_minima_prim, nota_minima_sec, asistencia_minima)
+            riesgo_previo = pd.Series(alertas_previas[list(REGLAS)].any(axis=1).to_numpy(), index=previas["DNI"])
+            antes = riesgo_previo.reindex(filas["DNI"]).fillna(False).to_numpy(dtype=bool)
+        nuevos = en_riesgo & ~antes
+        riesgo = ranking_riesgo(filas[nuevos], alertas[nuevos])
+        riesgo.insert(0, "Situacion", np.where(riesgo["DNI"].isin(cambios.insertados), "Nuevo en la nómina", "Entró en riesgo"))
+
+    # Retirado y nuevo a la vez: DNI mal escrito o ausente en una de las dos cargas
+    reingresos = pd.DataFrame(columns=["DNI_Anterior", "DNI_Nuevo", "Estudiante_Anterior", "Estudiante_Nuevo"])
+    if len(cambios.insertados) and len(cambios.eliminadas):
+        registros, _ = enlazar_nominas({
+            "anterior": cambios.eliminadas.reset_index(),
+            "actual": cambios.actuales.loc[cambios.insertados].reset_index()
+        })
+        columnas = ["ID_Persona", "DNI", "Estudiante"]
+        reingresos = registros.loc[registros["Origen"] == "anterior", columnas].merge(
+            registros.loc[registros["Origen"] == "actual", columnas], on="ID_Persona", suffixes=("_Anterior", "_Nuevo")
+        )[reingresos.columns]
+
+    return {
+        "bimestres_nuevos": {
+            c: int(n) for c, n in zip(COLUMNAS_NUMERICAS, recien.sum(axis=0)) if n and c in BIMESTRES
+        },
+        "correcciones": correcciones.sort_values(["Grado", "Estudiante", "Campo"], kind="stable").reset_index(drop=True),
+        "datos": datos,
+        "nuevos_en_riesgo": riesgo,
+        "eliminados": cambios.eliminadas.reset_index()[["DNI", "Estudiante", "Grado", "Seccion"]],
+        "reingresos": reingresos
+    }